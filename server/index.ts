@@ -38,8 +38,12 @@ app.use((req, res, next) => {
   next();
 });
 
-// Start Service A (Python Flask)
-const serviceA = spawn("python", ["services/service_a/src/main.py"], {
+// Start Service A (Python Flask) under gunicorn, with the same forked-worker
+// lifecycle as production (see services/service_a/gunicorn.conf.py)
+const serviceA = spawn("gunicorn", [
+  "-c", "services/service_a/gunicorn.conf.py",
+  "services.service_a.src.main:app"
+], {
   stdio: "inherit",
   env: {
     ...process.env,
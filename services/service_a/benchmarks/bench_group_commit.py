@@ -0,0 +1,108 @@
+"""Single-user create throughput and latency with and without group commit.
+
+Writer threads in one process (like one threaded gunicorn worker) call
+UserRepository.create_user against a fresh database file with the
+production SQLite pragmas. Password hashing uses a trivial setting so only
+the write path is measured:
+
+    python -m services.service_a.benchmarks.bench_group_commit --threads 1,16 \\
+        --rows 4000 --synchronous FULL --output group_commit.json
+
+``--synchronous FULL`` makes every commit fsync, which is what group commit
+amortises; the production profile's NORMAL only syncs at WAL checkpoints.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from typing import Dict, List, Optional
+from services.service_a.src.engine import PRODUCTION_PRAGMAS, install_pragmas
+from services.service_a.src.group_commit import DEFAULT_WINDOW_MS, GroupCommitWriter
+from services.service_a.src.hashing import SyncHasher
+from services.service_a.src.models import UserRepository, bulk_insert_statement, db
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DEFAULT_THREADS = '1,16'
+DEFAULT_ROWS = 4000
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+
+HASH_METHOD = 'pbkdf2:sha256:1'
+
+
+def _app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    return app
+
+
+def measure_creates(threads: int, rows: int, group_commit: bool, synchronous: str = DEFAULT_SYNCHRONOUS,
+                    window_ms: float = DEFAULT_WINDOW_MS) -> Dict[str, float]:
+    """Create ``rows`` users from ``threads`` threads; report rate and per-call latency."""
+    with tempfile.TemporaryDirectory() as directory:
+        app = _app(os.path.join(directory, 'users.sqlite'))
+        with app.app_context():
+            install_pragmas(db.engine, {**PRODUCTION_PRAGMAS, 'synchronous': synchronous})
+            db.create_all()
+            writer = GroupCommitWriter(db.engine, bulk_insert_statement(), window_ms=window_ms) \
+                if group_commit else None
+            repository = UserRepository(db, hasher=SyncHasher(HASH_METHOD), group_commit=writer)
+
+        def create(i: int) -> float:
+            with app.app_context():
+                start = time.perf_counter()
+                repository.create_user(f'user{i}', f'user{i}@example.com', 'password')
+                return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.perf_counter()
+            latencies = list(pool.map(create, range(rows)))
+            elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            if writer is not None:
+                writer.shutdown()
+            db.engine.dispose()
+
+    latencies.sort()
+    return {
+        'rows': rows,
+        'rows_per_s': round(rows / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', default=DEFAULT_THREADS, help='comma-separated writer thread counts')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='users created per run')
+    parser.add_argument('--synchronous', default=DEFAULT_SYNCHRONOUS, help='SQLite synchronous pragma')
+    parser.add_argument('--window-ms', type=float, default=DEFAULT_WINDOW_MS, help='group commit window')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = {'rows': args.rows, 'synchronous': args.synchronous, 'window_ms': args.window_ms, 'threads': {}}
+    for threads in (int(value) for value in args.threads.split(',')):
+        runs = {}
+        for mode, group_commit in (('per_request', False), ('group_commit', True)):
+            runs[mode] = measure_creates(threads, args.rows, group_commit, args.synchronous, args.window_ms)
+            print(f"[bench] {threads} threads, {mode}: {runs[mode]}", file=sys.stderr)
+        runs['speedup'] = round(runs['group_commit']['rows_per_s'] / runs['per_request']['rows_per_s'], 2)
+        results['threads'][str(threads)] = runs
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
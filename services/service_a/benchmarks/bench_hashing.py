@@ -0,0 +1,90 @@
+"""Password hashing throughput for each candidate hash setting.
+
+For every method string it reports the median latency of one hash, hashes
+per second on a single core, and hashes per second per core with every core
+busy (memory bandwidth makes the loaded number lower for scrypt):
+
+    python -m services.service_a.benchmarks.bench_hashing --iterations 20 \\
+        --budget-ms 250 --output hashing.json
+
+``--budget-ms`` also reports what startup calibration would pick here.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+from typing import Dict, List, Optional
+from services.service_a.src.hashing import (
+    SCRYPT_MAX_LOG2_N, SCRYPT_MIN_LOG2_N, PBKDF2_MIN_ITERATIONS, calibrate_hash_method
+)
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+DEFAULT_METHODS = tuple(f'scrypt:{2 ** log2_n}:8:1' for log2_n in range(SCRYPT_MIN_LOG2_N, SCRYPT_MAX_LOG2_N + 1)) \
+    + (f'pbkdf2:sha256:{PBKDF2_MIN_ITERATIONS}', f'pbkdf2:sha256:{PBKDF2_MIN_ITERATIONS * 2}')
+DEFAULT_ITERATIONS = 20
+
+PASSWORD = 'benchmark-password'
+
+
+def _hash(method: str) -> None:
+    generate_password_hash(PASSWORD, method=method)
+
+
+def measure_method(method: str, iterations: int, workers: int) -> Dict[str, float]:
+    _hash(method)  # warm-up
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _hash(method)
+        latencies.append(time.perf_counter() - start)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_hash, [method] * workers))  # start every worker first
+        start = time.perf_counter()
+        list(pool.map(_hash, [method] * (iterations * workers)))
+        loaded_elapsed = time.perf_counter() - start
+
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'hashes_per_s_single_core': round(iterations / sum(latencies), 2),
+        'hashes_per_s_per_core_loaded': round(iterations / loaded_elapsed, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--methods', default=','.join(DEFAULT_METHODS),
+                        help='comma-separated werkzeug method strings')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help='hashes per core for each method')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes for the loaded measurement')
+    parser.add_argument('--budget-ms', type=float, help='also report the calibrated method')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = {'cpu_count': os.cpu_count(), 'workers': args.workers, 'methods': {}}
+    for method in args.methods.split(','):
+        results['methods'][method] = measure_method(method, args.iterations, args.workers)
+        print(f"[bench] {method}: {results['methods'][method]}", file=sys.stderr)
+    if args.budget_ms:
+        results['calibrated'] = {
+            'budget_ms': args.budget_ms,
+            'scrypt': calibrate_hash_method(args.budget_ms, 'scrypt'),
+            'pbkdf2': calibrate_hash_method(args.budget_ms, 'pbkdf2'),
+        }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Performance benchmarks for service A routes and UserRepository.
+
+Seeds SQLite with N users, then times each operation through the Flask test
+client and through the repository directly, reporting throughput, p50/p99
+latency, peak traced memory and SQL statements per call:
+
+    python -m services.service_a.benchmarks.bench_service_a --sizes 1000,100000 \\
+        --output bench.json --baseline baseline.json --threshold 0.25
+
+With ``--baseline`` the run exits non-zero when an operation's p50 latency or
+throughput regresses by more than the threshold, or when it issues more SQL
+statements per call than the baseline. ``--save-baseline`` writes the current
+results as the new baseline.
+"""
+from flask import Flask
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from typing import Any, Callable, Dict, List, Optional
+from services.service_a.src.engine import init_engine_profile
+from services.service_a.src.models import db, User, UserRepository
+from services.service_a.src.routes import INTERNAL_API_KEY, register_routes
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_ITERATIONS = 200
+# Hashing dominates these; a handful of runs is enough for stable numbers
+SLOW_ITERATIONS = 10
+SEED_CHUNK_SIZE = 50000
+BATCH_SIZE = 500
+PAGE_SIZE = 100
+# Listing the whole table is only meaningful up to this many users
+MAX_FULL_LIST_SIZE = 100000
+MEMORY_ITERATIONS = 5
+
+PASSWORD = 'benchmark-password'
+INTERNAL_HEADERS = {'X-Internal-API-Key': INTERNAL_API_KEY}
+
+
+def build_app(database_uri: str, engine_profile: str = 'default') -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_ENGINE_PROFILE'] = engine_profile
+    db.init_app(app)
+    with app.app_context():
+        read_session = init_engine_profile(app, db)
+        db.create_all()
+        user_repository = UserRepository(db, read_session=read_session)
+        app.extensions['user_repository'] = user_repository
+        register_routes(app, user_repository)
+    return app
+
+
+def seed_users(size: int) -> None:
+    """Insert ``size`` users with one shared precomputed hash, bypassing the ORM."""
+    password_hash = generate_password_hash(PASSWORD)
+    with db.engine.begin() as conn:
+        for start in range(0, size, SEED_CHUNK_SIZE):
+            conn.exec_driver_sql(
+                "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                [(f"user{i}", f"user{i}@example.com", password_hash)
+                 for i in range(start, min(start + SEED_CHUNK_SIZE, size))])
+
+
+class QueryCounter:
+    def __init__(self, engines):
+        self.count = 0
+        self._engines = [engine for engine in engines if engine is not None]
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        for engine in self._engines:
+            event.listen(engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._on_execute)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def measure(fn: Callable[[int], Any], iterations: int, engines) -> Dict[str, float]:
+    fn(-1)  # warm-up
+    latencies = []
+    with QueryCounter(engines) as queries:
+        started = time.perf_counter()
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            fn(i)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+    # Separate pass: tracemalloc slows allocation-heavy code down a lot
+    tracemalloc.start()
+    for i in range(min(iterations, MEMORY_ITERATIONS)):
+        fn(iterations + i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'throughput_per_s': round(iterations / elapsed, 2),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 4),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 4),
+        'peak_memory_kib': round(peak / 1024, 1),
+        'queries_per_op': round(queries.count / iterations, 2),
+    }
+
+
+def build_operations(app: Flask, size: int, rng: random.Random) -> Dict[str, Callable[[int], Any]]:
+    client = app.test_client()
+    repository: UserRepository = app.extensions['user_repository']
+    # Transient copy so commits from the create benchmarks cannot expire it
+    stored = repository.get_user(1)
+    probe_user = User(username=stored.username, email=stored.email, password_hash=stored.password_hash)
+
+    def random_id() -> int:
+        return rng.randint(1, size)
+
+    def unique_name(prefix: str, i: int) -> str:
+        return f"{prefix}-{os.getpid()}-{time.perf_counter_ns()}-{i}"
+
+    def route_create(i: int) -> None:
+        name = unique_name('route', i)
+        client.post('/api/users', json={'username': name, 'email': f'{name}@example.com', 'password': PASSWORD})
+
+    def repo_create(i: int) -> None:
+        name = unique_name('repo', i)
+        repository.create_user(username=name, email=f'{name}@example.com', password=PASSWORD)
+
+    operations = {
+        'route_list_page': lambda i: client.get(
+            f'/api/users?after_id={rng.randint(0, max(0, size - PAGE_SIZE))}&limit={PAGE_SIZE}'),
+        'route_get_user': lambda i: client.get(f'/api/users/{random_id()}'),
+        'route_verify': lambda i: client.get(f'/internal/api/users/verify/{random_id()}',
+                                             headers=INTERNAL_HEADERS),
+        'route_batch': lambda i: client.post(
+            '/internal/api/users/batch', headers=INTERNAL_HEADERS,
+            json={'user_ids': [random_id() for _ in range(BATCH_SIZE)]}),
+        'route_create': route_create,
+        'route_search_prefix': lambda i: client.get(f'/api/users/search?q=user{random_id()}'),
+        'route_search_substring': lambda i: client.get(
+            f'/api/users/search?q={random_id():03d}&mode=substring'),
+        'repo_get_user': lambda i: repository.get_user(random_id()),
+        'repo_get_users_page': lambda i: repository.get_users_page(
+            after_id=rng.randint(0, max(0, size - PAGE_SIZE)), limit=PAGE_SIZE),
+        'repo_get_users_by_ids': lambda i: repository.get_users_by_ids(
+            [random_id() for _ in range(BATCH_SIZE)]),
+        'repo_create_user': repo_create,
+        'repo_verify_password': lambda i: repository.verify_password(probe_user, PASSWORD),
+    }
+    if size <= MAX_FULL_LIST_SIZE:
+        operations['route_list_all'] = lambda i: client.get('/api/users')
+        operations['repo_get_users'] = lambda i: repository.get_users()
+    return operations
+
+
+SLOW_OPERATIONS = {'route_create', 'repo_create_user', 'repo_verify_password', 'route_list_all', 'repo_get_users'}
+
+
+def run_size(size: int, storage: str, engine_profile: str, iterations: int,
+             only: Optional[List[str]] = None, seed: int = 1234) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if storage == 'memory':
+            database_uri = 'sqlite:///:memory:'
+        else:
+            database_uri = f"sqlite:///{os.path.join(tmpdir, 'users.sqlite')}"
+        app = build_app(database_uri, engine_profile)
+        results = {}
+        with app.app_context():
+            seed_started = time.perf_counter()
+            seed_users(size)
+            print(f"[bench] seeded {size} users in {time.perf_counter() - seed_started:.2f}s", file=sys.stderr)
+
+            engines = [db.engine, app.extensions.get('read_engine')]
+            for name, fn in build_operations(app, size, random.Random(seed)).items():
+                if only and name not in only:
+                    continue
+                op_iterations = min(iterations, SLOW_ITERATIONS) if name in SLOW_OPERATIONS else iterations
+                results[name] = measure(fn, op_iterations, engines)
+                print(f"[bench] size={size} {name}: {results[name]}", file=sys.stderr)
+                db.session.remove()
+            db.session.remove()
+            if 'read_engine' in app.extensions:
+                app.extensions['read_engine'].dispose()
+            db.engine.dispose()
+        return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a description of every regression beyond ``threshold`` (e.g. 0.25 = 25%)."""
+    regressions = []
+    for size, operations in results['sizes'].items():
+        for name, current in operations.items():
+            previous = baseline.get('sizes', {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            label = f"size={size} {name}"
+            if current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+                regressions.append(f"{label}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+            if current['throughput_per_s'] < previous['throughput_per_s'] * (1 - threshold):
+                regressions.append(
+                    f"{label}: throughput {previous['throughput_per_s']}/s -> {current['throughput_per_s']}/s")
+            if current['queries_per_op'] > previous['queries_per_op']:
+                regressions.append(
+                    f"{label}: queries/op {previous['queries_per_op']} -> {current['queries_per_op']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated user counts to seed')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--storage', choices=('memory', 'file'), default='file')
+    parser.add_argument('--engine-profile', choices=('default', 'production'), default='default')
+    parser.add_argument('--only', help='comma-separated operation names to run')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write results to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative regression before failing (default 0.25)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = args.only.split(',') if args.only else None
+    results = {
+        'storage': args.storage,
+        'engine_profile': args.engine_profile,
+        'python': sys.version.split()[0],
+        'sizes': {str(size): run_size(size, args.storage, args.engine_profile, args.iterations, only)
+                  for size in sizes},
+    }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + '\n')
+        print(f"[bench] baseline written to {args.baseline}", file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"[bench] REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Insert throughput of sharded storage by shard count.
+
+Each writer is a separate process (like a gunicorn worker) creating users
+in batches through ShardedUserRepository against fresh shard files.
+Password hashing uses a trivial setting so only storage is measured:
+
+    python -m services.service_a.benchmarks.bench_sharding --shards 1,2,4,8 \\
+        --writers 8 --rows 20000 --batch 100 --output sharding.json
+
+``--batch 1`` goes through create_user instead of create_users.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from services.service_a.src.hashing import SyncHasher
+from services.service_a.src.sharding import ShardSet, ShardedUserRepository
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_SHARDS = '1,2,4,8'
+DEFAULT_ROWS = 20000
+DEFAULT_BATCH = 100
+
+HASH_METHOD = 'pbkdf2:sha256:1'
+
+
+def _write(path: str, count: int, writer: int, rows: int, batch: int) -> None:
+    shards = ShardSet(path, count)
+    repository = ShardedUserRepository(shards, hasher=SyncHasher(HASH_METHOD))
+    for start in range(0, rows, batch):
+        names = [f'w{writer}-{i}' for i in range(start, min(start + batch, rows))]
+        if batch == 1:
+            repository.create_user(names[0], f'{names[0]}@example.com', 'password')
+        else:
+            repository.create_users([{'username': name, 'email': f'{name}@example.com', 'password': 'password'}
+                                     for name in names])
+    shards.dispose()
+
+
+def measure_shards(count: int, writers: int, rows: int, batch: int) -> Dict[str, float]:
+    """Insert ``rows`` users split across ``writers`` processes into ``count`` shards."""
+    with tempfile.TemporaryDirectory() as path:
+        ShardSet(path, count).dispose()  # create the files before the clock starts
+        per_writer = rows // writers
+        with ProcessPoolExecutor(max_workers=writers) as pool:
+            start = time.perf_counter()
+            futures = [pool.submit(_write, path, count, writer, per_writer, batch) for writer in range(writers)]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+    return {
+        'rows': per_writer * writers,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(per_writer * writers / elapsed, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shards', default=DEFAULT_SHARDS, help='comma-separated shard counts')
+    parser.add_argument('--writers', type=int, default=os.cpu_count() or 1, help='writer processes')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='users inserted per shard count')
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH, help='users per create call')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = {'writers': args.writers, 'batch': args.batch, 'shards': {}}
+    for count in (int(value) for value in args.shards.split(',')):
+        results['shards'][str(count)] = measure_shards(count, args.writers, args.rows, args.batch)
+        print(f"[bench] {count} shards: {results['shards'][str(count)]}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
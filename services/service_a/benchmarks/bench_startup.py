@@ -0,0 +1,106 @@
+"""Cold-start time of service A: process start to first response.
+
+Each sample starts a fresh interpreter that imports the app, sends one
+request through the test client and exits, the way a scale-to-zero
+container handles its first request. It runs against a database that is
+created by that first start (``fresh``) and one that already exists
+(``existing``):
+
+    python -m services.service_a.benchmarks.bench_startup --samples 10 --output startup.json
+
+``total_ms`` is wall time from spawning the process to receiving the
+response, measured by the parent; ``import_ms`` and ``first_request_ms``
+are measured inside the child.
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_APP = 'services.service_a.src.main:app'
+DEFAULT_PATH = '/api/users/1'
+DEFAULT_SAMPLES = 10
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+_CHILD = """
+import json, time
+start = time.perf_counter()
+from {module} import {attr} as app
+loaded = time.perf_counter()
+response = app.test_client().get({path!r})
+done = time.perf_counter()
+print(json.dumps({{'import_ms': (loaded - start) * 1000, 'first_request_ms': (done - loaded) * 1000,
+                  'status': response.status_code}}), flush=True)
+"""
+
+
+def run_once(app: str, path: str, database: str) -> Dict[str, float]:
+    module, attr = app.split(':')
+    env = dict(os.environ, SERVICE_A_DATABASE_URI=f'sqlite:///{database}', LOG_LEVEL='WARNING',
+               PYTHONPATH=PROJECT_ROOT)
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', _CHILD.format(module=module, attr=attr, path=path)],
+                             env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    # Stop the clock at the response, not at interpreter shutdown
+    line = child.stdout.readline()
+    total_ms = (time.perf_counter() - start) * 1000
+    child.communicate()
+    if child.returncode != 0:
+        raise RuntimeError(f'{app} exited with status {child.returncode}')
+    result = json.loads(line)
+    result['total_ms'] = total_ms
+    return result
+
+
+def _summarise(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    summary = {}
+    for key in ('total_ms', 'import_ms', 'first_request_ms'):
+        values = [sample[key] for sample in samples]
+        summary[f'{key}_p50'] = round(statistics.median(values), 1)
+        summary[f'{key}_min'] = round(min(values), 1)
+    summary['status'] = samples[-1]['status']
+    return summary
+
+
+def measure_startup(app: str = DEFAULT_APP, path: str = DEFAULT_PATH,
+                    samples: int = DEFAULT_SAMPLES) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        fresh = [run_once(app, path, os.path.join(directory, f'fresh-{i}.sqlite')) for i in range(samples)]
+        results['fresh'] = _summarise(fresh)
+        existing = os.path.join(directory, 'existing.sqlite')
+        run_once(app, path, existing)
+        results['existing'] = _summarise([run_once(app, path, existing) for _ in range(samples)])
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--app', default=DEFAULT_APP, help='module:attribute of the WSGI app')
+    parser.add_argument('--path', default=DEFAULT_PATH, help='path of the first request')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES, help='starts per scenario')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = {'app': args.app, 'path': args.path, 'samples': args.samples,
+               'scenarios': measure_startup(args.app, args.path, args.samples)}
+    for scenario, summary in results['scenarios'].items():
+        print(f"[bench] {scenario}: {summary}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -36,6 +36,7 @@ def app():
 
         # Create user repository
         user_repository = UserRepository(db)
+        app.extensions['user_repository'] = user_repository
         # Register routes
         register_routes(app, user_repository)
 
@@ -56,5 +57,4 @@ def client(app):
 def user_repository(app):
     """User repository instance for testing."""
     logger.debug("Creating user repository for tests")
-    with app.app_context():
-        return UserRepository(db)
\ No newline at end of file
+    return app.extensions['user_repository']
\ No newline at end of file
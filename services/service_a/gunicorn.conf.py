@@ -0,0 +1,42 @@
+"""Gunicorn settings for running service A in production.
+
+    gunicorn -c services/service_a/gunicorn.conf.py services.service_a.src.main:app
+
+The app is loaded once in the master and forked into SERVICE_A_WORKERS
+processes with SERVICE_A_THREADS threads each. SIGTERM (sent by the gateway
+on shutdown) stops accepting connections and lets in-flight requests finish
+within SERVICE_A_GRACEFUL_TIMEOUT seconds.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('SERVICE_A_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('SERVICE_A_WORKERS', multiprocessing.cpu_count()))
+# Admission control keeps at most 12 of these busy with expensive routes,
+# batch lookups and change feed long-polls by default (see admission.py),
+# leaving the rest for cheap reads
+threads = int(os.environ.get('SERVICE_A_THREADS', 14))
+worker_class = 'gthread'
+preload_app = True
+graceful_timeout = int(os.environ.get('SERVICE_A_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('SERVICE_A_TIMEOUT', 30))
+keepalive = 5
+
+# Every worker gets its own hashing pool; one process each keeps the total
+# number of hashing processes in line with the worker count.
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+
+def when_ready(server):
+    from services.service_a.src.serve import warm_up
+    warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    from services.service_a.src.serve import after_fork
+    after_fork(server.app.wsgi())
+
+
+def worker_exit(server, worker):
+    from services.service_a.src.serve import before_exit
+    before_exit(server.app.wsgi())
@@ -1,22 +1,18 @@
-"""Initialize the service_a package."""
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+"""Service A: user accounts.
 
-db = SQLAlchemy()
-migrate = Migrate()
+``create_app`` (app.py) builds the WSGI app and ``db`` (models.py) is the
+Flask-SQLAlchemy extension. Both load on first access, so importing a
+single submodule does not pull in Flask and SQLAlchemy.
+"""
 
-def create_app(test_config=None):
-    app = Flask(__name__)
+__all__ = ['create_app', 'db']
 
-    if test_config is None:
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.sqlite'
-    else:
-        app.config.update(test_config)
 
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-    db.init_app(app)
-    migrate.init_app(app, db)
-
-    return app
\ No newline at end of file
+def __getattr__(name):
+    if name == 'create_app':
+        from .app import create_app
+        return create_app
+    if name == 'db':
+        from .models import db
+        return db
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,207 @@
+"""Admission control for service A's expensive routes.
+
+Password hashing on POST /api/users, bulk creates, large internal batch
+lookups and exports can each occupy a request thread for a long time. With
+no limit, a burst of them takes every worker thread and cheap reads and
+verify calls queue behind them until the gateway times out.
+
+Each expensive route belongs to a class (ROUTE_CLASSES) with its own
+concurrency limit and a bounded wait queue. A request that finds the queue
+full, or cannot start before its deadline, is answered at once with 503 and
+``Retry-After`` instead of waiting. Routes without a class are never
+limited. Keep the sum of every class's limit and queue below the worker's
+thread count so cheap routes always find a free thread.
+
+Internal batch lookups are indexed reads that other services make on their
+own request path, so they have a class of their own rather than queueing
+behind a long export or bulk create in ``bulk``.
+
+Change feed long-polls are cheap but hold their thread for the whole wait,
+so they get a class of their own; with no queue, a long-poll beyond the
+limit is shed at once and its client polls again after ``Retry-After``.
+
+Callers pass their remaining time budget in milliseconds in the
+X-Request-Timeout-Ms header; it bounds the queue wait and is kept as the
+request deadline (remaining_budget) for long-running handlers.
+"""
+from flask import Flask, g, has_app_context, jsonify, request
+from .metrics import REGISTRY, MetricsRegistry
+from typing import Dict, Mapping, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+DEFAULT_MAX_WAIT_MS = 1000.0
+DEFAULT_RETRY_AFTER = 1
+
+# Endpoint name -> route class
+ROUTE_CLASSES: Dict[str, str] = {
+    'create_user': 'hashing',
+    'create_users_bulk': 'bulk',
+    'get_users_batch_internal': 'lookup',
+    'export_users_internal': 'bulk',
+    'get_user_changes_internal': 'longpoll',
+}
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` requests at once, with up to ``queue_size`` more waiting for a slot."""
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiting = 0
+        self.queued_total = 0
+        self.shed_total: Dict[str, int] = {'queue_full': 0, 'deadline': 0}
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot, waiting up to ``timeout`` seconds.
+
+        Returns None once admitted, otherwise why the request is shed:
+        ``queue_full`` or ``deadline``. A negative ``timeout`` means the
+        caller's deadline has already passed.
+        """
+        with self._cond:
+            reason = self._acquire(timeout)
+            if reason is not None:
+                self.shed_total[reason] += 1
+            return reason
+
+    def _acquire(self, timeout: float) -> Optional[str]:
+        if timeout < 0:
+            return 'deadline'
+        # Queued requests go first; a newcomer only takes a free slot directly
+        if self.in_flight < self.limit and self.waiting == 0:
+            self.in_flight += 1
+            return None
+        if self.waiting >= self.queue_size:
+            return 'queue_full'
+        if timeout <= 0:
+            return 'deadline'
+        end = time.monotonic() + timeout
+        self.waiting += 1
+        self.queued_total += 1
+        try:
+            while self.in_flight >= self.limit:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return 'deadline'
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return None
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'queued_total': self.queued_total,
+                'shed_total': dict(self.shed_total),
+            }
+
+
+def render_admission_metrics(limiters: Mapping[str, ConcurrencyLimiter]) -> str:
+    """Prometheus exposition of the limiters' gauges and shed/queued counters."""
+    stats = {name: limiter.stats() for name, limiter in limiters.items()}
+    lines = []
+    for key, kind in (('in_flight', 'gauge'), ('waiting', 'gauge'), ('queued_total', 'counter')):
+        metric = f'service_a_admission_{key}'
+        lines.append(f'# TYPE {metric} {kind}')
+        lines += [f'{metric}{{class="{name}"}} {values[key]}' for name, values in stats.items()]
+    lines.append('# TYPE service_a_admission_shed_total counter')
+    for name, values in stats.items():
+        lines += [f'service_a_admission_shed_total{{class="{name}",reason="{reason}"}} {count}'
+                  for reason, count in sorted(values['shed_total'].items())]
+    return '\n'.join(lines)
+
+
+def parse_budget(value: Optional[str]) -> Optional[float]:
+    """Seconds left from an X-Request-Timeout-Ms value; None when absent or malformed."""
+    if value is None:
+        return None
+    try:
+        return float(value) / 1000.0
+    except ValueError:
+        return None
+
+
+def remaining_budget(default: float) -> float:
+    """Seconds left before the current request's deadline, capped at ``default``."""
+    deadline = g.get('deadline') if has_app_context() else None
+    if deadline is None:
+        return default
+    return max(0.0, min(default, deadline - time.monotonic()))
+
+
+def init_admission_control(app: Flask, limits: Mapping[str, Tuple[int, int]],
+                           max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                           retry_after: int = DEFAULT_RETRY_AFTER,
+                           route_classes: Mapping[str, str] = ROUTE_CLASSES,
+                           registry: MetricsRegistry = REGISTRY) -> Dict[str, ConcurrencyLimiter]:
+    """Limit the routes in ``route_classes`` to ``limits[class] = (concurrency, queue size)``.
+
+    Requests without a deadline header wait at most ``max_wait_ms``. The
+    limiters are returned and stored in ``app.extensions['admission']``;
+    their in-flight, waiting, queued and shed counts are exported through
+    ``registry``.
+    """
+    limiters = {name: ConcurrencyLimiter(name, limit, queue_size)
+                for name, (limit, queue_size) in limits.items()}
+    max_wait = max_wait_ms / 1000.0
+
+    registry.add_collector(lambda: render_admission_metrics(limiters))
+
+    @app.before_request
+    def admit_request():
+        budget = parse_budget(request.headers.get(DEADLINE_HEADER))
+        if budget is not None:
+            g.deadline = time.monotonic() + budget
+        limiter = limiters.get(route_classes.get(request.endpoint))
+        if limiter is None:
+            return None
+
+        reason = limiter.acquire(max_wait if budget is None else min(max_wait, budget))
+        if reason is not None:
+            logger.warning("Shed %s %s (%s: %s)", request.method, request.path, limiter.name, reason)
+            response = jsonify({'error': 'Service overloaded, retry later'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        g.admission_limiter = limiter
+        return None
+
+    @app.after_request
+    def hold_admission_while_streaming(response):
+        limiter = g.get('admission_limiter')
+        if limiter is not None and response.is_streamed:
+            # Teardown runs before a streamed body (e.g. an export) is sent;
+            # keep the slot until the server closes the response
+            g.pop('admission_limiter')
+            response.call_on_close(limiter.release)
+        return response
+
+    @app.teardown_request
+    def release_admission(exception=None):
+        limiter = g.pop('admission_limiter', None)
+        if limiter is not None:
+            limiter.release()
+
+    app.extensions['admission'] = limiters
+    logger.info("Admission control enabled: %s",
+                {name: (limiter.limit, limiter.queue_size) for name, limiter in limiters.items()})
+    return limiters
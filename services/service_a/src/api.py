@@ -0,0 +1,165 @@
+"""Request validation and response bodies shared by both front ends.
+
+routes.py (Flask, WSGI) and asgi.py (Quart, ASGI) serve the same API. They
+differ only in how they await the repository and build responses; what a
+request may contain, which error it gets and what the body looks like are
+decided here, so the two cannot drift. Invalid requests raise ApiError,
+which each front end turns into ``{'error': message}`` with its status.
+"""
+from sqlalchemy.exc import IntegrityError, OperationalError
+from .changes import InvalidChangesRequest, parse_changes_args, parse_cursor
+from .group_commit import GroupCommitTimeout
+from .hashing import HashingQueueFull
+from .membership import Run
+from .models import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .search import InvalidSearch, SearchParams, parse_search_args
+from .serializers import InvalidFields, parse_fields, serialize_change, serialize_user
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Secret key for internal API authentication
+INTERNAL_API_KEY = os.environ.get('INTERNAL_API_KEY', 'dev_internal_key_123')
+
+MAX_BULK_CREATE = 100000
+
+
+class ApiError(Exception):
+    """A request answered with ``status`` and ``{'error': message}``."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def error_body(error: ApiError) -> Dict[str, str]:
+    return {'error': str(error)}
+
+
+def check_internal_key(headers: Mapping[str, str]) -> None:
+    auth_key = headers.get('X-Internal-API-Key')
+    if not auth_key or auth_key != INTERNAL_API_KEY:
+        raise ApiError(401, 'Unauthorized')
+
+
+def wants_stream(args: Mapping[str, str]) -> bool:
+    return args.get('stream', '').lower() in ('1', 'true')
+
+
+def parse_page_args(args: Mapping[str, str]) -> Optional[Tuple[Optional[int], int]]:
+    """``(after_id, limit)`` for a paginated listing, or None when neither is given."""
+    if 'after_id' not in args and 'limit' not in args:
+        return None
+    try:
+        after_id = args.get('after_id')
+        after_id = int(after_id) if after_id is not None else None
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'after_id and limit must be integers')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(400, f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return after_id, limit
+
+
+def parse_search(args: Mapping[str, str]) -> SearchParams:
+    try:
+        return parse_search_args(args)
+    except InvalidSearch as e:
+        raise ApiError(400, str(e))
+
+
+def parse_fields_arg(args: Mapping[str, str]) -> Tuple[str, ...]:
+    try:
+        return parse_fields(args.get('fields'))
+    except InvalidFields as e:
+        raise ApiError(400, str(e))
+
+
+def parse_changes(args: Mapping[str, str], parse_since: Callable[[str], Any] = parse_cursor):
+    try:
+        return parse_changes_args(args, parse_since)
+    except InvalidChangesRequest as e:
+        raise ApiError(400, str(e))
+
+
+def parse_ids_since(args: Mapping[str, str]) -> int:
+    try:
+        return int(args.get('since', 0))
+    except ValueError:
+        raise ApiError(400, 'since must be an integer')
+
+
+def parse_create_body(data: Any) -> Tuple[str, str, str]:
+    """``(username, email, password)`` from a create request body."""
+    if not isinstance(data, dict) or not all(
+            isinstance(data.get(field), str) and data.get(field)
+            for field in ('username', 'email', 'password')):
+        raise ApiError(400, 'username, email and password are required')
+    return data['username'], data['email'], data['password']
+
+
+def parse_bulk_body(data: Any) -> List[Any]:
+    rows = data.get('users') if isinstance(data, dict) else None
+    if not isinstance(rows, list):
+        raise ApiError(400, 'users must be a list')
+    if len(rows) > MAX_BULK_CREATE:
+        raise ApiError(413, f'At most {MAX_BULK_CREATE} users per request')
+    return rows
+
+
+def parse_batch_body(data: Any) -> List[int]:
+    user_ids = data.get('user_ids', []) if isinstance(data, dict) else None
+    if not isinstance(user_ids, list) or not all(type(user_id) is int for user_id in user_ids):
+        raise ApiError(400, 'user_ids must be a list of integers')
+    return user_ids
+
+
+def create_error(e: Exception) -> ApiError:
+    """The response for a failed create: 503 when the service is overloaded, else 400."""
+    if isinstance(e, (HashingQueueFull, GroupCommitTimeout)):
+        logger.warning("Rejected user creation: %s", e)
+        return ApiError(503, str(e))
+    if isinstance(e, OperationalError):
+        # e.g. the write lock was not free within busy_timeout
+        logger.error("Database error creating user: %s", e)
+        return ApiError(503, 'Database unavailable')
+    if isinstance(e, IntegrityError):
+        return ApiError(400, 'Username or email already exists')
+    logger.debug("Error creating user: %s", e)
+    return ApiError(400, str(e))
+
+
+def page_body(users: Iterable[Any], next_cursor: Optional[int]) -> Dict[str, Any]:
+    return {'users': [serialize_user(user) for user in users], 'next_cursor': next_cursor}
+
+
+def bulk_body(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'created': sum(result['status'] == 'created' for result in results),
+        'failed': sum(result['status'] != 'created' for result in results),
+        'results': results
+    }
+
+
+def verify_body(user: Any, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    return {**serialize_user(user, fields), 'verified': True}
+
+
+def batch_body(users: Iterable[Any], missing_ids: List[int], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    return {'users': [serialize_user(user, fields) for user in users], 'missing_ids': missing_ids}
+
+
+def ids_body(version: int, since: int, runs: Iterable[Run]) -> Dict[str, Any]:
+    return {'version': version, 'since': since, 'runs': [list(run) for run in runs]}
+
+
+def changes_body(changes: Iterable[Any], cursor: Any, has_more: bool) -> Dict[str, Any]:
+    return {'changes': [serialize_change(change) for change in changes], 'cursor': cursor, 'has_more': has_more}
+
+
+def users_array_chunk(users: List[Any], first: bool) -> str:
+    """One piece of a streamed JSON array of users; the caller sends '[' and ']'."""
+    return ('' if first else ',') + ','.join(json.dumps(serialize_user(user)) for user in users)
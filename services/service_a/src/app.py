@@ -0,0 +1,181 @@
+"""Application factory for service A's WSGI app.
+
+Startup does no database I/O: the schema check runs on the first request
+(or readiness probe), Flask-Migrate is only loaded when the app is created
+by the ``flask`` CLI, and sharded storage is only imported when configured.
+Each startup phase is timed into ``app.extensions['startup']`` and logged;
+GET /ready reports them once the schema check has passed.
+"""
+from contextlib import contextmanager
+from flask import Flask, jsonify
+from flask_cors import CORS
+from .admission import init_admission_control
+from .cache import TTLCache
+from .config import load_config
+from .engine import init_engine_profile
+from .group_commit import GroupCommitWriter
+from .hashing import create_hasher
+from .metrics import create_registry, init_metrics, instrument_engine
+from .models import UserRepository, bulk_insert_statement, db
+from .profiling import init_profiling, init_slow_request_log
+from .query_accounting import init_query_accounting
+from .routes import INTERNAL_API_KEY, register_routes
+from .schema import SchemaBootstrap
+from .transfer import register_commands
+from typing import Any, Dict, Iterator, Mapping, Optional
+import atexit
+import click
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Wall-clock duration of each named startup phase, in milliseconds."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def report(self) -> Dict[str, Any]:
+        return {'phases_ms': dict(self.phases), 'total_ms': round(sum(self.phases.values()), 2)}
+
+
+def _running_under_cli() -> bool:
+    return click.get_current_context(silent=True) is not None
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """Build the Flask app from the environment, with ``config`` overriding it."""
+    timer = StartupTimer()
+    app = Flask(__name__)
+    CORS(app)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+
+    with timer.phase('extensions'):
+        db.init_app(app)
+        if _running_under_cli():
+            # Alembic is slow to import and only `flask db` needs it
+            from flask_migrate import Migrate
+            Migrate(app, db)
+
+    # Per app, so apps created in one process never share counters or collectors
+    registry = create_registry()
+
+    with app.app_context():
+        with timer.phase('engines'):
+            read_session = init_engine_profile(app, db)
+            bootstrap = SchemaBootstrap(db.engine)
+            app.extensions['schema_bootstrap'] = bootstrap
+
+        with timer.phase('repository'):
+            hasher = create_hasher(app.config, registry)
+            atexit.register(hasher.shutdown)
+            user_cache = TTLCache(
+                max_size=app.config['USER_CACHE_SIZE'],
+                ttl=app.config['USER_CACHE_TTL'],
+                negative_ttl=app.config['USER_CACHE_NEGATIVE_TTL']
+            )
+            engines = [db.engine]
+            shards = None
+            if app.config['SERVICE_A_SHARDS'] > 1:
+                from .sharding import ShardSet, ShardedUserRepository
+                shards = ShardSet(app.config['SERVICE_A_SHARD_DIR'], app.config['SERVICE_A_SHARDS'])
+                shards.recover_pending()
+                atexit.register(shards.dispose)
+                if app.config['USER_GROUP_COMMIT']:
+                    # Creates are spread over one writer per shard, with no shared
+                    # write lock for a group commit writer to batch behind
+                    logger.warning("USER_GROUP_COMMIT is ignored with SERVICE_A_SHARDS=%d",
+                                   app.config['SERVICE_A_SHARDS'])
+                user_repository = ShardedUserRepository(shards, hasher=hasher, cache=user_cache)
+                engines += shards.all_engines()
+                logger.info("Using %d shards in %s", shards.count, shards.path)
+            else:
+                group_commit = None
+                if app.config['USER_GROUP_COMMIT']:
+                    max_batch = app.config['GROUP_COMMIT_MAX_BATCH']
+                    if app.config['ADMISSION_CONTROL']:
+                        # Only admitted creates hash at once, so a full batch
+                        # commits without waiting out the window
+                        max_batch = min(max_batch, app.config['ADMISSION_HASHING_CONCURRENCY'])
+                    group_commit = GroupCommitWriter(db.engine, bulk_insert_statement(),
+                                                     max_batch=max_batch,
+                                                     window_ms=app.config['GROUP_COMMIT_WINDOW_MS'],
+                                                     registry=registry)
+                    atexit.register(group_commit.shutdown)
+                user_repository = UserRepository(db, hasher=hasher, cache=user_cache, read_session=read_session,
+                                                 group_commit=group_commit)
+            app.extensions['user_repository'] = user_repository
+
+        with timer.phase('routes'):
+            register_routes(app, user_repository)
+            register_commands(app, db, shards)
+            if _running_under_cli():
+                from .sharding import register_shard_commands
+                register_shard_commands(app, db)
+            register_readiness(app, bootstrap, timer)
+            if app.config['ADMISSION_CONTROL']:
+                init_admission_control(app, {
+                    'hashing': (app.config['ADMISSION_HASHING_CONCURRENCY'], app.config['ADMISSION_HASHING_QUEUE']),
+                    'bulk': (app.config['ADMISSION_BULK_CONCURRENCY'], app.config['ADMISSION_BULK_QUEUE']),
+                    'lookup': (app.config['ADMISSION_LOOKUP_CONCURRENCY'], app.config['ADMISSION_LOOKUP_QUEUE']),
+                    'longpoll': (app.config['ADMISSION_LONGPOLL_CONCURRENCY'],
+                                 app.config['ADMISSION_LONGPOLL_QUEUE']),
+                }, max_wait_ms=app.config['ADMISSION_MAX_WAIT_MS'],
+                    retry_after=app.config['ADMISSION_RETRY_AFTER'], registry=registry)
+
+        with timer.phase('instrumentation'):
+            init_metrics(app, db.engine, registry=registry, user_repository=user_repository)
+            if 'read_engine' in app.extensions:
+                engines.append(app.extensions['read_engine'])
+            for engine in engines[1:]:
+                instrument_engine(engine, registry)
+            init_slow_request_log(app, engines, app.config['SLOW_REQUEST_THRESHOLD_MS'])
+            init_query_accounting(app, engines, user_repository,
+                                  headers=app.debug or app.config['QUERY_COUNT_HEADERS'],
+                                  repeat_threshold=app.config['QUERY_REPEAT_THRESHOLD'], registry=registry)
+            init_profiling(app, app.config['PROFILE_DIR'], app.config['PROFILE_SAMPLE_RATE'],
+                           api_key=INTERNAL_API_KEY)
+
+        if _running_under_cli():
+            # CLI commands use the database without a request to trigger the check
+            with timer.phase('schema'):
+                bootstrap.ensure()
+
+    app.extensions['startup'] = timer
+    logger.info("Service A app created in %.1f ms %s", timer.report()['total_ms'], timer.phases)
+    return app
+
+
+def register_readiness(app: Flask, bootstrap: SchemaBootstrap, timer: StartupTimer) -> None:
+    @app.before_request
+    def ensure_schema_ready() -> Any:
+        try:
+            bootstrap.ensure()
+        except Exception as e:
+            logger.warning("Schema check failed: %s", e)
+            return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+        return None
+
+    @app.route('/ready', methods=['GET'])
+    def ready() -> Any:
+        """Readiness probe: 200 once the schema check has passed (503 before that)."""
+        return jsonify({
+            'status': 'ready',
+            'startup': timer.report(),
+            'schema': {
+                'bootstrapped': bootstrap.bootstrapped,
+                'check_ms': round(bootstrap.duration_ms, 2)
+            }
+        })
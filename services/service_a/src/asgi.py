@@ -0,0 +1,262 @@
+"""ASGI serving mode for service A.
+
+Exposes the same routes as ``register_routes`` on a Quart app backed by
+AsyncUserRepository, so thousands of concurrent internal verify calls can be
+in flight on a single event loop. Run it with an ASGI server, e.g.:
+
+    hypercorn --bind 0.0.0.0:5001 "services.service_a.src.asgi:create_asgi_app()"
+
+Validation, error bodies and response bodies come from api.py and the SQL
+from models.py, shared with the WSGI app. Request and SQL metrics are served
+at /metrics as there. Admission control, per-request query accounting and
+profiling are built on the WSGI app's one-thread-per-request model and are
+not available here; a caller's X-Request-Timeout-Ms still caps long-polls.
+
+Requires the optional ``async`` dependencies (quart, aiosqlite).
+"""
+from quart import Quart, Response, g, jsonify, request
+from sqlalchemy.ext.asyncio import create_async_engine
+from functools import wraps
+from typing import Any, AsyncIterator, Callable, Optional
+from .admission import DEADLINE_HEADER, parse_budget
+from .api import (
+    ApiError, batch_body, bulk_body, changes_body, check_internal_key, create_error, error_body, ids_body,
+    page_body, parse_batch_body, parse_bulk_body, parse_changes, parse_create_body, parse_fields_arg,
+    parse_ids_since, parse_page_args, parse_search, users_array_chunk, verify_body, wants_stream
+)
+from .async_repository import AsyncUserRepository
+from .cache import TTLCache
+from .config import load_config
+from .engine import PRODUCTION_PRAGMAS, install_pragmas
+from .hashing import create_hasher
+from .metrics import MetricsRegistry, cache_collector, create_registry, instrument_engine, record_request
+from .models import STREAM_CHUNK_SIZE
+from .schema import ensure_schema
+from .transfer import EXPORT_CHUNK_SIZE, EXPORT_FILENAME, gzip_stream_async
+from .serializers import encode, negotiate, serialize_user
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def register_async_routes(app: Quart, user_repository: AsyncUserRepository) -> None:
+    """Serve the users API on ``app``; validation and bodies come from api.py, as in register_routes."""
+    def require_internal_auth() -> None:
+        check_internal_key(request.headers)
+
+    def versioned(view: Callable) -> Callable:
+        @wraps(view)
+        async def wrapper(*args, **kwargs) -> Any:
+            etag, last_modified = await user_repository.version_tag()
+            if request.if_none_match.contains(etag):
+                response = app.response_class('', status=304)
+            else:
+                response = await app.make_response(await view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+        return wrapper
+
+    def internal_response(payload: Any, status: int = 200) -> Response:
+        mimetype = negotiate(request.accept_mimetypes)
+        response = app.response_class(encode(payload, mimetype), status=status, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
+
+    @app.errorhandler(ApiError)
+    async def api_error(e: ApiError) -> Any:
+        return jsonify(error_body(e)), e.status
+
+    @app.before_request
+    async def before_request():
+        logger.debug("New request - method: %s, path: %s", request.method, request.path)
+
+    async def stream_users() -> AsyncIterator[bytes]:
+        yield b'['
+        first = True
+        chunk = []
+        async for user in user_repository.iter_users(STREAM_CHUNK_SIZE):
+            chunk.append(user)
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield users_array_chunk(chunk, first).encode()
+                first = False
+                chunk = []
+        if chunk:
+            yield users_array_chunk(chunk, first).encode()
+        yield b']'
+
+    @app.route('/api/users', methods=['GET'])
+    @app.route('/api/users/', methods=['GET'])
+    @versioned
+    async def get_users() -> Any:
+        if wants_stream(request.args):
+            return Response(stream_users(), mimetype='application/json')
+
+        page = parse_page_args(request.args)
+        if page is not None:
+            users, next_cursor = await user_repository.get_users_page(*page)
+            return jsonify(page_body(users, next_cursor))
+
+        users = await user_repository.get_users()
+        return jsonify([serialize_user(user) for user in users])
+
+    @app.route('/api/users/search', methods=['GET'])
+    @versioned
+    async def search_users() -> Any:
+        users, next_cursor = await user_repository.search_users(*parse_search(request.args))
+        return jsonify(page_body(users, next_cursor))
+
+    @app.route('/api/users/<int:user_id>', methods=['GET'])
+    @versioned
+    async def get_user(user_id: int) -> Any:
+        user = await user_repository.lookup_user(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        return jsonify(serialize_user(user))
+
+    @app.route('/api/users', methods=['POST'])
+    @app.route('/api/users/', methods=['POST'])
+    async def create_user() -> Any:
+        username, email, password = parse_create_body(await request.get_json(silent=True))
+        try:
+            user = await user_repository.create_user(username=username, email=email, password=password)
+        except Exception as e:
+            raise create_error(e)
+        return jsonify(serialize_user(user)), 201
+
+    @app.route('/api/users/bulk', methods=['POST'])
+    async def create_users_bulk() -> Any:
+        rows = parse_bulk_body(await request.get_json(silent=True))
+        try:
+            results = await user_repository.create_users(rows)
+        except Exception as e:
+            raise create_error(e)
+        return jsonify(bulk_body(results))
+
+    @app.route('/internal/api/users/verify/<int:user_id>', methods=['GET'])
+    async def verify_user_internal(user_id: int) -> Any:
+        require_internal_auth()
+        fields = parse_fields_arg(request.args)
+
+        user = await user_repository.lookup_user(user_id, fields)
+        if not user:
+            return internal_response({'error': 'User not found'}, 404)
+        return internal_response(verify_body(user, fields))
+
+    @app.route('/internal/api/users/batch', methods=['POST'])
+    async def get_users_batch_internal() -> Any:
+        require_internal_auth()
+        user_ids = parse_batch_body(await request.get_json(silent=True))
+        fields = parse_fields_arg(request.args)
+
+        users, missing_ids = await user_repository.get_users_by_ids(user_ids, fields)
+        return internal_response(batch_body(users, missing_ids, fields))
+
+    @app.route('/internal/api/users/ids', methods=['GET'])
+    async def get_user_ids_internal() -> Any:
+        require_internal_auth()
+        since = parse_ids_since(request.args)
+
+        version, runs = await user_repository.id_snapshot(since)
+        return internal_response(ids_body(version, since, runs))
+
+    @app.route('/internal/api/users/changes', methods=['GET'])
+    async def get_user_changes_internal() -> Any:
+        require_internal_auth()
+        since, limit, wait = parse_changes(request.args, user_repository.parse_changes_cursor)
+
+        # Answer before the caller's deadline rather than hold the long-poll past it
+        budget = parse_budget(request.headers.get(DEADLINE_HEADER))
+        if budget is not None:
+            wait = max(0.0, min(wait, budget))
+        return internal_response(changes_body(*await user_repository.get_changes(since, limit, wait)))
+
+    @app.route('/internal/api/users/export', methods=['GET'])
+    async def export_users_internal() -> Any:
+        require_internal_auth()
+
+        logger.info("Starting users export")
+        chunks = gzip_stream_async(user_repository.export_users(EXPORT_CHUNK_SIZE))
+        return Response(chunks, mimetype='application/gzip', headers={
+            'Content-Disposition': f'attachment; filename={EXPORT_FILENAME}'
+        })
+
+    @app.route('/internal/api/users/cache', methods=['GET'])
+    async def get_user_cache_stats_internal() -> Any:
+        require_internal_auth()
+
+        return jsonify(user_repository.cache.stats())
+
+
+def init_async_metrics(app: Quart, registry: MetricsRegistry,
+                       user_repository: Optional[AsyncUserRepository] = None) -> MetricsRegistry:
+    """ASGI counterpart of metrics.init_metrics: per-route request metrics, served at /metrics."""
+    app.extensions['metrics'] = registry
+    if user_repository is not None:
+        registry.add_collector(cache_collector(user_repository.cache))
+
+    @app.before_request
+    async def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    async def record_request_metrics(response):
+        start: Optional[float] = g.pop('metrics_start', None)
+        if start is not None:
+            record_request(registry, request.method, request.url_rule, response.status_code,
+                           time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    async def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return registry
+
+
+def create_asgi_app(database_uri: Optional[str] = None) -> Quart:
+    """Build the ASGI app. The URI defaults to SERVICE_A_DATABASE_URI or src/users.sqlite."""
+    app = Quart(__name__)
+    app.config.update(load_config())
+    if database_uri is None:
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    async_uri = database_uri.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+    registry = create_registry()
+    engine = create_async_engine(async_uri)
+    install_pragmas(engine.sync_engine, PRODUCTION_PRAGMAS)
+    instrument_engine(engine.sync_engine, registry)
+    hasher = create_hasher(app.config, registry)
+    user_repository = AsyncUserRepository(
+        engine,
+        hasher=hasher,
+        cache=TTLCache(
+            max_size=app.config['USER_CACHE_SIZE'],
+            ttl=app.config['USER_CACHE_TTL'],
+            negative_ttl=app.config['USER_CACHE_NEGATIVE_TTL']
+        )
+    )
+    app.extensions['user_repository'] = user_repository
+    register_async_routes(app, user_repository)
+    init_async_metrics(app, registry, user_repository)
+
+    @app.before_serving
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(ensure_schema)
+        logger.info("Async database schema checked")
+
+    @app.route('/ready', methods=['GET'])
+    async def ready() -> Any:
+        # The schema is checked before the server accepts connections
+        return jsonify({'status': 'ready'})
+
+    @app.after_serving
+    async def shutdown():
+        await engine.dispose()
+        hasher.shutdown()
+
+    return app
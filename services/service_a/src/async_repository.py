@@ -0,0 +1,280 @@
+"""Non-blocking counterpart of UserRepository for the ASGI serving mode.
+
+Queries run on SQLAlchemy's asyncio engine over aiosqlite, so a request
+waiting on SQLite does not hold a thread. Password hashing is CPU work and
+is pushed to an executor so it never runs on the event loop.
+"""
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .cache import TTLCache
+from .changes import CHANGES_POLL_INTERVAL, parse_changed_at, parse_cursor
+from .hashing import SyncHasher
+from .membership import Run, UserIdSet
+from .models import (
+    BULK_INSERT_CHUNK_SIZE, DEFAULT_PAGE_SIZE, SQLITE_MAX_IN_PARAMS, STREAM_CHUNK_SIZE,
+    CachedUser, User, UserChange, apply_changed_ids, bulk_insert_statement, bulk_values, changed_ids_select,
+    changes_select,
+    existing_users_select, export_select, filter_existing_rows, ids_by_username, in_request_order, new_ids_select,
+    page_select, projected_select, record_inserted, rehash_statement, search_select, split_changes, split_page,
+    validate_bulk_rows, version_select
+)
+from .serializers import USER_FIELDS
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUserRepository:
+    def __init__(self, engine: AsyncEngine, hasher=None, cache: Optional[TTLCache] = None,
+                 executor=None, user_ids: Optional[UserIdSet] = None):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        self.hasher = hasher or SyncHasher()
+        self.cache = cache if cache is not None else TTLCache()
+        self.user_ids = user_ids if user_ids is not None else UserIdSet()
+        self._changed = asyncio.Event()
+        self._pending_rehashes: Dict[int, asyncio.Task] = {}
+        # Change log id the cache and user_ids are current with, as in UserRepository
+        self._changes_through: Optional[int] = None
+        self._changes_lock = asyncio.Lock()
+        # None means the loop's default thread pool; threads only wait on the
+        # hashing pool (or hash inline with SyncHasher), never the event loop.
+        self.executor = executor
+        logger.debug("Initializing AsyncUserRepository")
+
+    async def _offload(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _notify_change(self) -> None:
+        # Wake current long-polls; later ones wait on the fresh event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def create_user(self, username: str, email: str, password: str) -> User:
+        logger.debug("Creating user in async repository - username: %s", username)
+        password_hash = await self._offload(self.hasher.hash_password, password)
+        async with self.sessionmaker() as session:
+            user = User(username=username, email=email, password_hash=password_hash)
+            session.add(user)
+            try:
+                await session.commit()
+            except Exception as e:
+                logger.error("Error in create_user: %s", e)
+                await session.rollback()
+                raise
+        self.cache.invalidate(user.id)
+        self.user_ids.add(user.id)
+        self._notify_change()
+        logger.debug("User created successfully - id: %s", user.id)
+        return user
+
+    async def create_users(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Async counterpart of UserRepository.create_users."""
+        logger.debug("Bulk creating %d users", len(rows))
+        results: List[Dict[str, Any]] = [{'index': i} for i in range(len(rows))]
+        pending = validate_bulk_rows(rows, results)
+
+        async with self.sessionmaker() as session:
+            existing_usernames, existing_emails = set(), set()
+            step = SQLITE_MAX_IN_PARAMS // 2
+            for start in range(0, len(pending), step):
+                chunk = pending[start:start + step]
+                stmt = existing_users_select([rows[i]['username'] for i in chunk],
+                                             [rows[i]['email'] for i in chunk])
+                for username, email in await session.execute(stmt):
+                    existing_usernames.add(username)
+                    existing_emails.add(email)
+            accepted = filter_existing_rows(rows, pending, existing_usernames, existing_emails, results)
+
+            password_hashes = await self._offload(
+                self.hasher.hash_passwords, [rows[i]['password'] for i in accepted])
+            values = bulk_values(rows, accepted, password_hashes)
+
+            stmt = bulk_insert_statement()
+            try:
+                for start in range(0, len(accepted), BULK_INSERT_CHUNK_SIZE):
+                    indexes = accepted[start:start + BULK_INSERT_CHUNK_SIZE]
+                    chunk_values = values[start:start + BULK_INSERT_CHUNK_SIZE]
+                    try:
+                        async with session.begin_nested():
+                            ids = ids_by_username(chunk_values, await session.execute(stmt, chunk_values))
+                    except IntegrityError:
+                        logger.debug("Bulk insert chunk conflicted, retrying row by row")
+                        ids = []
+                        for row in chunk_values:
+                            try:
+                                async with session.begin_nested():
+                                    ids.append((await session.execute(stmt, row)).one().id)
+                            except IntegrityError:
+                                ids.append(None)
+                    record_inserted(results, indexes, ids)
+                await session.commit()
+            except Exception as e:
+                logger.error("Error in create_users: %s", e)
+                await session.rollback()
+                raise
+
+        created = [result['id'] for result in results if result['status'] == 'created']
+        for user_id in created:
+            self.cache.invalidate(user_id)
+        self.user_ids.add_many(created)
+        if created:
+            self._notify_change()
+        return results
+
+    async def verify_password(self, user: User, password: str) -> bool:
+        """Async counterpart of UserRepository.verify_password."""
+        verified = await self._offload(self.hasher.verify_password, user.password_hash, password)
+        if verified and user.id is not None and self.hasher.needs_rehash(user.password_hash) \
+                and user.id not in self._pending_rehashes:
+            task = asyncio.create_task(self._rehash(user.id, user.password_hash, password))
+            self._pending_rehashes[user.id] = task
+            task.add_done_callback(lambda _: self._pending_rehashes.pop(user.id, None))
+        return verified
+
+    async def _rehash(self, user_id: int, old_hash: str, password: str) -> None:
+        try:
+            new_hash = await self._offload(self.hasher.hash_password, password)
+            async with self.engine.begin() as conn:
+                await conn.execute(rehash_statement(), {
+                    'user_id': user_id, 'old_hash': old_hash, 'new_hash': new_hash})
+        except Exception as e:
+            logger.warning("Background rehash for user %s failed: %s", user_id, e)
+
+    async def flush_rehashes(self) -> None:
+        await asyncio.gather(*self._pending_rehashes.values())
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        logger.debug("Getting user by id: %s", user_id)
+        async with self.sessionmaker() as session:
+            return await session.get(User, user_id)
+
+    async def id_snapshot(self, since: int = 0) -> Tuple[int, List[Run]]:
+        """Async counterpart of UserRepository.id_snapshot."""
+        async with self.sessionmaker() as session:
+            head = (await session.execute(version_select())).first()
+            if head is not None:
+                await self._catch_up(session, head.id)
+            synced_through = self.user_ids.synced_through
+            result = await session.stream_scalars(new_ids_select(synced_through))
+            async for chunk in result.partitions():
+                self.user_ids.add_many(chunk)
+                synced_through = chunk[-1]
+        self.user_ids.mark_synced(synced_through)
+        return synced_through, self.user_ids.runs(since, through=synced_through)
+
+    async def lookup_user(self, user_id: int, fields: Tuple[str, ...] = USER_FIELDS) -> Optional[Any]:
+        """Async counterpart of UserRepository.lookup_user."""
+        found, cached = self.cache.get(user_id)
+        if found:
+            return cached
+        async with self.sessionmaker() as session:
+            row = (await session.execute(projected_select(fields).where(User.id == user_id))).first()
+        if row is None:
+            self.cache.set(user_id, None)
+            return None
+        if fields != USER_FIELDS:
+            return row
+        cached = CachedUser(*row)
+        self.cache.set(user_id, cached)
+        return cached
+
+    async def get_users_by_ids(self, user_ids: List[int],
+                               fields: Tuple[str, ...] = USER_FIELDS) -> Tuple[List[Any], List[int]]:
+        unique_ids = list(dict.fromkeys(user_ids))
+        logger.debug("Getting %d users by id", len(unique_ids))
+        stmt = projected_select(fields)
+        found = {}
+        async with self.sessionmaker() as session:
+            for start in range(0, len(unique_ids), SQLITE_MAX_IN_PARAMS):
+                chunk = unique_ids[start:start + SQLITE_MAX_IN_PARAMS]
+                result = await session.execute(stmt.where(User.id.in_(chunk)))
+                for user in result:
+                    found[user.id] = user
+        return in_request_order(unique_ids, found)
+
+    async def get_users(self) -> List[User]:
+        async with self.sessionmaker() as session:
+            return list(await session.scalars(select(User)))
+
+    async def get_users_page(self, after_id: Optional[int] = None,
+                             limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        async with self.sessionmaker() as session:
+            users = list(await session.scalars(page_select(after_id, limit)))
+        return split_page(users, limit)
+
+    def parse_changes_cursor(self, value: str) -> int:
+        """Decode a ``since`` query argument for get_changes."""
+        return parse_cursor(value)
+
+    async def get_changes(self, since: int = 0, limit: int = DEFAULT_PAGE_SIZE,
+                          wait: float = 0) -> Tuple[List[UserChange], int, bool]:
+        """Async counterpart of UserRepository.get_changes."""
+        deadline = time.monotonic() + wait
+        while True:
+            changed = self._changed
+            async with self.sessionmaker() as session:
+                changes = list(await session.scalars(changes_select(since, limit)))
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, CHANGES_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+        return split_changes(changes, limit, since)
+
+    async def export_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        after_id = 0
+        while True:
+            async with self.sessionmaker() as session:
+                rows = (await session.execute(export_select(after_id, chunk_size))).all()
+            if not rows:
+                return
+            yield ('\n'.join(line for _, line in rows) + '\n').encode()
+            after_id = rows[-1][0]
+
+    async def search_users(self, query: str, mode: str = 'prefix', field: str = 'username',
+                           after_id: Optional[int] = None,
+                           limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        async with self.sessionmaker() as session:
+            users = list(await session.scalars(search_select(query, mode, field, after_id, limit)))
+        return split_page(users, limit)
+
+    async def iter_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[User]:
+        async with self.sessionmaker() as session:
+            result = await session.stream_scalars(
+                select(User).order_by(User.id).execution_options(yield_per=chunk_size))
+            async for user in result:
+                yield user
+
+    async def version_tag(self) -> Tuple[str, Optional[datetime]]:
+        """Async counterpart of UserRepository.version_tag."""
+        async with self.sessionmaker() as session:
+            row = (await session.execute(version_select())).first()
+            if row is None:
+                return 'users-0', None
+            await self._catch_up(session, row.id)
+        return f'users-{row.id}', parse_changed_at(row.changed_at)
+
+    async def _catch_up(self, session, head: int) -> None:
+        """Async counterpart of UserRepository._catch_up.
+
+        The lock is held while the entries are applied, so a request that
+        sees the new head never reads a cache entry it is about to drop.
+        """
+        async with self._changes_lock:
+            through = self._changes_through
+            if through is not None and head <= through:
+                return
+            if through is not None:
+                result = await session.stream(changed_ids_select(through, head))
+                async for chunk in result.partitions():
+                    apply_changed_ids(chunk, self.cache, self.user_ids)
+            # The first call only records where to start from
+            self._changes_through = head
@@ -0,0 +1,144 @@
+"""Change feed for the users table.
+
+Triggers on ``users`` append one ``user_changes`` row per insert and per
+update of ``username`` or ``email``, inside the same transaction as the
+write, so the log can never disagree with the table, whether the write came
+from UserRepository, a bulk insert or a manual fix-up.
+
+Change IDs are the feed cursor. SQLite commits writes one at a time, so
+IDs become visible in increasing order and reading ``id > cursor`` never
+skips a change. A sync costs one primary-key range read sized by the number
+of new changes, independent of the table size.
+
+The newest change ID is also the version of the users table behind the
+read routes' ETags: every process sees the same log, so every worker tags
+the same data alike, whoever wrote it.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Table, event
+from typing import Any, Callable, Mapping, NamedTuple
+import threading
+import time
+
+CHANGE_LOG_TABLE = 'user_changes'
+DEFAULT_CHANGES_LIMIT = 100
+MAX_CHANGES_LIMIT = 1000
+MAX_CHANGES_WAIT = 30.0
+# Long-polls wake up immediately for writes made by this process and re-check
+# at this interval for writes made by other workers.
+CHANGES_POLL_INTERVAL = 0.5
+
+_TIMESTAMP = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+CHANGED_AT_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+CHANGE_LOG_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS user_changes_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {log}(user_id, op, username, email, changed_at)
+        VALUES (new.id, 'create', new.username, new.email, {now});
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS user_changes_au AFTER UPDATE OF username, email ON {table} BEGIN
+        INSERT INTO {log}(user_id, op, username, email, changed_at)
+        VALUES (new.id, 'update', new.username, new.email, {now});
+    END""",
+)
+
+
+class InvalidChangesRequest(ValueError):
+    """Raised for malformed change feed parameters."""
+
+
+class ChangesParams(NamedTuple):
+    since: Any
+    limit: int
+    wait: float
+
+
+def parse_cursor(value: str) -> int:
+    """Validate a single-database cursor: the id of the last change seen."""
+    try:
+        since = int(value)
+    except ValueError:
+        raise InvalidChangesRequest('since must be an integer')
+    if since < 0:
+        raise InvalidChangesRequest('since must not be negative')
+    return since
+
+
+def parse_changes_args(args: Mapping[str, str],
+                       parse_since: Callable[[str], Any] = parse_cursor) -> ChangesParams:
+    """Validate ``since``, ``limit`` and ``wait`` query arguments.
+
+    ``since`` is decoded by ``parse_since``: the repository's own cursor
+    format (UserRepository.parse_changes_cursor).
+    """
+    since = parse_since(args.get('since', '0'))
+    try:
+        limit = int(args.get('limit', DEFAULT_CHANGES_LIMIT))
+        wait = float(args.get('wait', 0))
+    except ValueError:
+        raise InvalidChangesRequest('limit must be an integer and wait a number')
+    if not 1 <= limit <= MAX_CHANGES_LIMIT:
+        raise InvalidChangesRequest(f'limit must be between 1 and {MAX_CHANGES_LIMIT}')
+    if not 0 <= wait <= MAX_CHANGES_WAIT:
+        raise InvalidChangesRequest(f'wait must be between 0 and {MAX_CHANGES_WAIT:g} seconds')
+    return ChangesParams(since, limit, wait)
+
+
+def parse_changed_at(value: str) -> datetime:
+    """UTC time of a change log entry, truncated to the second like HTTP dates."""
+    return datetime.strptime(value, CHANGED_AT_FORMAT).replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def create_change_log_triggers(connection, table: Table) -> None:
+    """Create the triggers feeding ``user_changes`` if they are missing.
+
+    When the log is added to a populated database, existing users are
+    backfilled as ``create`` events so a consumer starting from cursor 0 still
+    sees every user.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    installed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'user_changes_ai'").scalar()
+    if not installed:
+        connection.exec_driver_sql(
+            f"INSERT INTO {CHANGE_LOG_TABLE}(user_id, op, username, email, changed_at) "
+            f"SELECT id, 'create', username, email, {_TIMESTAMP} FROM {table.name} ORDER BY id")
+    for ddl in CHANGE_LOG_TRIGGERS:
+        connection.exec_driver_sql(ddl.format(table=table.name, log=CHANGE_LOG_TABLE, now=_TIMESTAMP))
+
+
+def install_change_log(table: Table) -> None:
+    # On the metadata rather than the table: the triggers need both tables
+    event.listen(table.metadata, 'after_create',
+                 lambda target, connection, **kw: create_change_log_triggers(connection, table))
+
+
+class ChangeNotifier:
+    """Wakes long-polling readers when this process writes to the users table."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+
+    @property
+    def sequence(self) -> int:
+        with self._condition:
+            return self._sequence
+
+    def notify(self) -> None:
+        with self._condition:
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def wait(self, sequence: int, timeout: float) -> None:
+        """Block until a notify() after ``sequence`` was read, or ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._sequence == sequence:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
@@ -0,0 +1,77 @@
+"""Service A settings read from the environment.
+
+Shared by the WSGI factory (app.py) and the ASGI app; see
+ENVIRONMENT_SETUP.md for the variables.
+"""
+from typing import Any, Dict, Mapping, Optional
+import os
+
+BASEDIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_DATABASE_URI = 'sqlite:///' + os.path.join(BASEDIR, 'users.sqlite')
+
+
+def load_config(environ: Optional[Mapping[str, str]] = None) -> Dict[str, Any]:
+    env = os.environ if environ is None else environ
+    return {
+        # Database configuration
+        'SQLALCHEMY_DATABASE_URI': env.get('SERVICE_A_DATABASE_URI', DEFAULT_DATABASE_URI),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+
+        # 'production' enables WAL, tuned pragmas and a read-only pool for GET routes
+        'SQLITE_ENGINE_PROFILE': env.get('SQLITE_ENGINE_PROFILE', 'production'),
+        'SQLITE_READ_POOL_SIZE': int(env.get('SQLITE_READ_POOL_SIZE', 8)),
+
+        # Hash-partitioned storage: above 1, users live in this many SQLite files
+        # under SERVICE_A_SHARD_DIR (see sharding.py); 0 keeps the single database
+        'SERVICE_A_SHARDS': int(env.get('SERVICE_A_SHARDS', 0)),
+        'SERVICE_A_SHARD_DIR': env.get('SERVICE_A_SHARD_DIR', os.path.join(BASEDIR, 'shards')),
+
+        # Group commit: concurrent single-user creates share one transaction,
+        # holding a batch open up to the window while more are on their way.
+        # Single database only: ignored, with a startup warning, when sharded
+        'USER_GROUP_COMMIT': env.get('USER_GROUP_COMMIT', '').lower() in ('1', 'true'),
+        'GROUP_COMMIT_MAX_BATCH': int(env.get('GROUP_COMMIT_MAX_BATCH', 128)),
+        'GROUP_COMMIT_WINDOW_MS': float(env.get('GROUP_COMMIT_WINDOW_MS', 2)),
+
+        # Password hashing backend: 'process' hashes in a worker pool, 'sync' inline
+        'PASSWORD_HASHER': env.get('PASSWORD_HASHER', 'process'),
+        'PASSWORD_HASH_WORKERS': env.get('PASSWORD_HASH_WORKERS'),
+        'PASSWORD_HASH_QUEUE_LIMIT': env.get('PASSWORD_HASH_QUEUE_LIMIT', 256),
+        # Explicit werkzeug method (e.g. scrypt:32768:8:1), or a per-hash latency budget
+        # to calibrate one against at startup; outdated hashes are upgraded on verify
+        'PASSWORD_HASH_METHOD': env.get('PASSWORD_HASH_METHOD'),
+        'PASSWORD_HASH_BUDGET_MS': env.get('PASSWORD_HASH_BUDGET_MS'),
+        'PASSWORD_HASH_ALGORITHM': env.get('PASSWORD_HASH_ALGORITHM', 'scrypt'),
+
+        # Opt-in cProfile capture (X-Profile header from internal callers, or a
+        # sampled fraction of requests) and the always-on slow-request log
+        'PROFILE_DIR': env.get('PROFILE_DIR'),
+        'PROFILE_SAMPLE_RATE': float(env.get('PROFILE_SAMPLE_RATE', 0)),
+        'SLOW_REQUEST_THRESHOLD_MS': float(env.get('SLOW_REQUEST_THRESHOLD_MS', 500)),
+        # Per-request SQL counts in X-Query-* response headers (always on in
+        # debug mode) and the repeat count at which a statement is logged as N+1
+        'QUERY_COUNT_HEADERS': env.get('QUERY_COUNT_HEADERS', '').lower() in ('1', 'true'),
+        'QUERY_REPEAT_THRESHOLD': int(env.get('QUERY_REPEAT_THRESHOLD', 10)),
+
+        # Admission control for expensive routes (see admission.py): concurrency
+        # limit and wait-queue size per route class, and the longest a request
+        # without an X-Request-Timeout-Ms header waits for a slot
+        'ADMISSION_CONTROL': env.get('ADMISSION_CONTROL', 'true').lower() in ('1', 'true'),
+        'ADMISSION_HASHING_CONCURRENCY': int(env.get('ADMISSION_HASHING_CONCURRENCY', 2)),
+        'ADMISSION_HASHING_QUEUE': int(env.get('ADMISSION_HASHING_QUEUE', 2)),
+        'ADMISSION_BULK_CONCURRENCY': int(env.get('ADMISSION_BULK_CONCURRENCY', 1)),
+        'ADMISSION_BULK_QUEUE': int(env.get('ADMISSION_BULK_QUEUE', 1)),
+        'ADMISSION_LOOKUP_CONCURRENCY': int(env.get('ADMISSION_LOOKUP_CONCURRENCY', 2)),
+        'ADMISSION_LOOKUP_QUEUE': int(env.get('ADMISSION_LOOKUP_QUEUE', 2)),
+        'ADMISSION_LONGPOLL_CONCURRENCY': int(env.get('ADMISSION_LONGPOLL_CONCURRENCY', 2)),
+        'ADMISSION_LONGPOLL_QUEUE': int(env.get('ADMISSION_LONGPOLL_QUEUE', 0)),
+        'ADMISSION_MAX_WAIT_MS': float(env.get('ADMISSION_MAX_WAIT_MS', 1000)),
+        'ADMISSION_RETRY_AFTER': int(env.get('ADMISSION_RETRY_AFTER', 1)),
+
+        # User lookup cache used by GET /api/users/<id> and the internal verify path.
+        # Unknown IDs are not cached by default: a worker caching a miss would
+        # answer 404 for a user another worker has just created
+        'USER_CACHE_SIZE': int(env.get('USER_CACHE_SIZE', 10000)),
+        'USER_CACHE_TTL': float(env.get('USER_CACHE_TTL', 30)),
+        'USER_CACHE_NEGATIVE_TTL': float(env.get('USER_CACHE_NEGATIVE_TTL', 0)),
+    }
@@ -0,0 +1,101 @@
+"""SQLite engine profiles for service A.
+
+The ``production`` profile switches the database to WAL so readers no longer
+block behind a committing writer, applies tuned pragmas on every new
+connection, and gives read-only routes their own pool of read-only
+connections.
+"""
+from flask import Flask
+from flask.globals import app_ctx
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_PRAGMAS: Dict[str, object] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative values are KiB, i.e. 64 MiB
+    'busy_timeout': 5000,
+}
+
+# journal_mode can only be changed from a connection that may write
+READ_ONLY_SKIPPED_PRAGMAS = ('journal_mode',)
+
+DEFAULT_READ_POOL_SIZE = 8
+
+
+def install_pragmas(engine: Engine, pragmas: Dict[str, object]) -> None:
+    """Run ``PRAGMA name=value`` for each entry whenever ``engine`` opens a connection."""
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _is_memory_database(uri: str) -> bool:
+    database = make_url(uri).database
+    return not database or database == ':memory:' or 'mode=memory' in uri
+
+
+def create_read_engine(uri: str, pragmas: Dict[str, object],
+                       pool_size: int = DEFAULT_READ_POOL_SIZE) -> Engine:
+    """Create a pooled engine whose connections open the database read-only."""
+    path = make_url(uri).database
+    engine = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        connect_args={'check_same_thread': False},
+    )
+    read_pragmas = {name: value for name, value in pragmas.items() if name not in READ_ONLY_SKIPPED_PRAGMAS}
+    read_pragmas['query_only'] = 'ON'
+    install_pragmas(engine, read_pragmas)
+    return engine
+
+
+def init_engine_profile(app: Flask, db) -> Optional[scoped_session]:
+    """Apply the engine profile selected by ``SQLITE_ENGINE_PROFILE``.
+
+    Must run inside an app context after ``db.init_app(app)``. Returns a
+    scoped session on the read-only pool for the production profile with a
+    file database, otherwise None (reads then share the default session).
+    """
+    profile = app.config.get('SQLITE_ENGINE_PROFILE', 'default')
+    if profile == 'default':
+        return None
+    if profile != 'production':
+        raise ValueError(f"Unknown SQLITE_ENGINE_PROFILE: {profile}")
+
+    pragmas = {**PRODUCTION_PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {})}
+    # The writer engine may already hold pooled connections from before the
+    # listener existed; drop them so every connection gets the pragmas.
+    install_pragmas(db.engine, pragmas)
+    db.engine.dispose()
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if _is_memory_database(uri):
+        logger.info("In-memory database: using the default session for reads")
+        return None
+
+    read_engine = create_read_engine(
+        uri, pragmas, pool_size=int(app.config.get('SQLITE_READ_POOL_SIZE', DEFAULT_READ_POOL_SIZE)))
+    read_session = scoped_session(
+        sessionmaker(bind=read_engine), scopefunc=lambda: id(app_ctx._get_current_object()))
+    app.extensions['read_engine'] = read_engine
+
+    @app.teardown_appcontext
+    def remove_read_session(exception=None):
+        read_session.remove()
+
+    logger.info("SQLite production engine profile enabled with a read-only pool of %d",
+                read_engine.pool.size())
+    return read_session
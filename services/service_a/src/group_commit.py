@@ -0,0 +1,184 @@
+"""Group commit for single-user creates.
+
+With group commit off, every create_user call runs its own transaction.
+Under a burst of sign-ups, request threads then queue on SQLite's write
+lock and each pays for its own commit. GroupCommitWriter hands the inserts
+to one writer thread, which commits everything queued since its last
+commit in a single transaction.
+
+A lone request is written as soon as it arrives. The writer holds a batch
+open for up to ``window_ms`` only while other callers are still preparing
+their rows (hashing passwords), so a burst shares one commit without
+making an idle server slower. Rows go in with one multi-row INSERT; if that
+hits a unique constraint, the batch falls back to one savepoint per row, so
+each caller gets its own id or its own IntegrityError.
+
+Callers wait for their commit until the request deadline, and never longer
+than ``timeout``; a row still queued by then is withdrawn. Only admitted
+creates hash concurrently, so with admission control a batch never holds
+more rows than the hashing class's limit (create_app caps ``max_batch`` at it).
+"""
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from sqlalchemy.exc import IntegrityError
+from .admission import remaining_budget
+from .metrics import REGISTRY, MetricsRegistry, observe_group_commit
+from .models import ids_by_username
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 128
+DEFAULT_WINDOW_MS = 2.0
+# SQLite's busy_timeout (engine.PRODUCTION_PRAGMAS): a batch still waiting
+# for the write lock after that fails anyway
+DEFAULT_COMMIT_TIMEOUT = 5.0
+
+Pending = Tuple[Dict[str, Any], Future]
+
+
+class GroupCommitTimeout(RuntimeError):
+    """Raised when a row is not committed before the caller's deadline."""
+
+
+class GroupCommitWriter:
+    """Coalesces concurrent single-row inserts made with ``statement`` into shared transactions.
+
+    ``statement`` must be an INSERT ... RETURNING (username, id), see
+    bulk_insert_statement.
+    """
+
+    def __init__(self, engine, statement, max_batch: int = DEFAULT_MAX_BATCH,
+                 window_ms: float = DEFAULT_WINDOW_MS, registry: MetricsRegistry = REGISTRY,
+                 timeout: float = DEFAULT_COMMIT_TIMEOUT):
+        self.engine = engine
+        self.statement = statement
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.timeout = timeout
+        self.registry = registry
+        self._reset()
+
+    def _reset(self) -> None:
+        self._cond = threading.Condition()
+        self._queue: Deque[Pending] = deque()
+        self._preparing = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def insert(self, prepare: Callable[[], Dict[str, Any]]) -> int:
+        """Insert the row returned by ``prepare`` and return its id once committed.
+
+        ``prepare`` runs on the calling thread; while it runs the writer may
+        hold its current batch open for this row. Errors from ``prepare``
+        and the row's own IntegrityError are raised to this caller only.
+        GroupCommitTimeout is raised when the commit does not finish within
+        the request's remaining budget, capped at ``timeout``.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Group commit writer has been shut down")
+            if self._thread is None:
+                # Started on first use so forked workers each get their own thread
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+            self._preparing += 1
+        try:
+            row = prepare()
+        except BaseException:
+            with self._cond:
+                self._preparing -= 1
+                self._cond.notify()
+            raise
+        future: Future = Future()
+        with self._cond:
+            self._preparing -= 1
+            self._queue.append((row, future))
+            self._cond.notify()
+        timeout = remaining_budget(self.timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise GroupCommitTimeout(f"User was not written within {timeout:.2f}s") from None
+            raise GroupCommitTimeout(f"User is still being written after {timeout:.2f}s") from None
+
+    def _next_batch(self) -> List[Pending]:
+        with self._cond:
+            batch: List[Pending] = []
+            deadline = 0.0
+            while len(batch) < self.max_batch:
+                if self._queue:
+                    pending = self._queue.popleft()
+                    # False when the caller gave up and cancelled it
+                    if pending[1].set_running_or_notify_cancel():
+                        if not batch:
+                            deadline = time.monotonic() + self.window
+                        batch.append(pending)
+                    continue
+                if not batch:
+                    if self._closed:
+                        return []
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if self._preparing == 0 or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                with self.engine.begin() as conn:
+                    outcomes = self._write(conn, [row for row, _ in batch])
+            except Exception as e:
+                logger.error("Group commit of %d rows failed: %s", len(batch), e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            observe_group_commit(len(batch), time.perf_counter() - start, self.registry)
+            for outcome, (_, future) in zip(outcomes, batch):
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _write(self, conn, rows: List[Dict[str, Any]]) -> List[Union[int, IntegrityError]]:
+        try:
+            with conn.begin_nested():
+                return ids_by_username(rows, conn.execute(self.statement, rows))
+        except IntegrityError as e:
+            if len(rows) == 1:
+                return [e]
+        # A row in the batch clashes with a stored user or with another row
+        # in the batch; insert one by one so only the clashing callers fail.
+        logger.debug("Group commit batch of %d conflicted, retrying row by row", len(rows))
+        outcomes: List[Union[int, IntegrityError]] = []
+        for row in rows:
+            try:
+                with conn.begin_nested():
+                    outcomes.append(conn.execute(self.statement, row).one().id)
+            except IntegrityError as e:
+                outcomes.append(e)
+        return outcomes
+
+    def after_fork(self) -> None:
+        """Forget the parent's writer thread and queue; a new thread starts on first use."""
+        self._reset()
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Write what is already queued, then stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,233 @@
+"""Password hashing backends for service A.
+
+Hashing is deliberately slow and holds the GIL while it runs, so doing it on
+the request thread stalls every other request in the process. The process
+pool backend moves the work into worker processes; the synchronous backend
+keeps the original inline behaviour and is what tests use by default.
+
+Both hash with an explicit werkzeug method string such as
+``scrypt:32768:8:1``. The parameters are stored in every hash's prefix, so
+hashes made with older settings still verify and can be told apart for
+rehashing. ``PASSWORD_HASH_BUDGET_MS`` makes startup pick the strongest
+setting that stays within that per-hash latency on the current hardware.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from werkzeug.security import generate_password_hash, check_password_hash
+from .metrics import REGISTRY, MetricsRegistry, observe_hash_duration
+from typing import List, Optional
+import logging
+import os
+import statistics
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_LIMIT = 256
+DEFAULT_SUBMIT_TIMEOUT = 5.0
+
+# werkzeug's own default, used when nothing is configured
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+# Calibration never goes below the interactive-login settings from the scrypt
+# paper (16 MiB) or OWASP's PBKDF2-SHA256 minimum, nor above 128 MiB per hash.
+SCRYPT_MIN_LOG2_N = 14
+SCRYPT_MAX_LOG2_N = 17
+PBKDF2_MIN_ITERATIONS = 600000
+PBKDF2_MAX_ITERATIONS = 5000000
+CALIBRATION_SAMPLES = 3
+
+
+def hash_method_of(password_hash: str) -> str:
+    """The method string a hash was made with, e.g. ``scrypt:32768:8:1``."""
+    return password_hash.split('$', 1)[0]
+
+
+def measure_hash_seconds(method: str, samples: int = CALIBRATION_SAMPLES) -> float:
+    """Median wall time of one hash with ``method`` on this thread."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        generate_password_hash('calibration-password', method=method)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate_hash_method(budget_ms: float, algorithm: str = 'scrypt',
+                          samples: int = CALIBRATION_SAMPLES) -> str:
+    """Strongest ``algorithm`` setting whose hash time fits in ``budget_ms``.
+
+    Falls back to the minimum setting, with a warning, when even that is
+    over budget.
+    """
+    budget = budget_ms / 1000.0
+    if algorithm == 'scrypt':
+        method = f'scrypt:{2 ** SCRYPT_MIN_LOG2_N}:8:1'
+        for log2_n in range(SCRYPT_MIN_LOG2_N, SCRYPT_MAX_LOG2_N + 1):
+            candidate = f'scrypt:{2 ** log2_n}:8:1'
+            elapsed = measure_hash_seconds(candidate, samples)
+            if elapsed > budget:
+                if log2_n == SCRYPT_MIN_LOG2_N:
+                    logger.warning("Minimum hash setting %s takes %.0fms, over the %.0fms budget",
+                                   candidate, elapsed * 1000, budget_ms)
+                break
+            method = candidate
+    elif algorithm == 'pbkdf2':
+        # PBKDF2 cost is linear in iterations, so one measurement is enough
+        per_iteration = measure_hash_seconds(f'pbkdf2:sha256:{PBKDF2_MIN_ITERATIONS}', samples) \
+            / PBKDF2_MIN_ITERATIONS
+        iterations = int(budget / per_iteration) // 10000 * 10000
+        if iterations < PBKDF2_MIN_ITERATIONS:
+            logger.warning("Minimum hash setting pbkdf2:sha256:%d is over the %.0fms budget",
+                           PBKDF2_MIN_ITERATIONS, budget_ms)
+        method = f'pbkdf2:sha256:{min(max(iterations, PBKDF2_MIN_ITERATIONS), PBKDF2_MAX_ITERATIONS)}'
+    else:
+        raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+    logger.info("Calibrated password hashing to %s for a %.0fms budget", method, budget_ms)
+    return method
+
+
+def resolve_hash_method(config) -> str:
+    """Hash method from ``PASSWORD_HASH_METHOD``, calibrating it first if needed.
+
+    With ``PASSWORD_HASH_BUDGET_MS`` set and no explicit method, calibration
+    runs once and its result is written back to the config, so workers forked
+    later reuse it instead of calibrating again.
+    """
+    method = config.get('PASSWORD_HASH_METHOD')
+    if not method and config.get('PASSWORD_HASH_BUDGET_MS'):
+        method = calibrate_hash_method(float(config['PASSWORD_HASH_BUDGET_MS']),
+                                       config.get('PASSWORD_HASH_ALGORITHM', 'scrypt'))
+        config['PASSWORD_HASH_METHOD'] = method
+    return method or DEFAULT_HASH_METHOD
+
+
+class HashingQueueFull(RuntimeError):
+    """Raised when the hashing pool has no room for another job."""
+
+
+class SyncHasher:
+    """Hashes on the calling thread."""
+
+    def __init__(self, method: str = DEFAULT_HASH_METHOD, registry: MetricsRegistry = REGISTRY):
+        self.method = method
+        self.registry = registry
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return hash_method_of(password_hash) != self.method
+
+    def hash_password(self, password: str) -> str:
+        start = time.perf_counter()
+        password_hash = generate_password_hash(password, method=self.method)
+        observe_hash_duration(time.perf_counter() - start, self.registry)
+        return password_hash
+
+    def hash_passwords(self, passwords: List[str]) -> List[str]:
+        return [self.hash_password(password) for password in passwords]
+
+    def verify_password(self, password_hash: str, password: str) -> bool:
+        return check_password_hash(password_hash, password)
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+class ProcessPoolHasher:
+    """Hashes in a sized pool of worker processes.
+
+    At most ``max_queue`` hashes may be pending or running at once, counting
+    every password of a batch; callers that cannot get a slot within
+    ``submit_timeout`` seconds get HashingQueueFull instead of piling up
+    behind the pool.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_queue: int = DEFAULT_QUEUE_LIMIT,
+                 submit_timeout: float = DEFAULT_SUBMIT_TIMEOUT,
+                 method: str = DEFAULT_HASH_METHOD, registry: MetricsRegistry = REGISTRY):
+        self.method = method
+        self.registry = registry
+        self._generate = partial(generate_password_hash, method=method)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.submit_timeout = submit_timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._closed = False
+        logger.info("Started password hashing pool with %d workers", self.max_workers)
+
+    def _submit(self, fn, *args) -> Future:
+        """Submit one job once a queue slot is free; the slot is freed when the job finishes."""
+        if self._closed:
+            raise RuntimeError("Hashing pool has been shut down")
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            raise HashingQueueFull("Password hashing queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        return self._submit(fn, *args).result()
+
+    def hash_password(self, password: str) -> str:
+        start = time.perf_counter()
+        password_hash = self._run(self._generate, password)
+        observe_hash_duration(time.perf_counter() - start, self.registry)
+        return password_hash
+
+    def hash_passwords(self, passwords: List[str]) -> List[str]:
+        """Hash a batch, one queue slot per password.
+
+        A bulk request is held to the same queue limit as single hashes: it
+        waits for its own earlier hashes to free slots, and gets
+        HashingQueueFull (with its queued hashes cancelled) like anyone else.
+        """
+        start = time.perf_counter()
+        futures: List[Future] = []
+        try:
+            for password in passwords:
+                futures.append(self._submit(self._generate, password))
+            password_hashes = [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        if passwords:
+            # Record the wall-clock cost per hash of the parallel batch
+            per_hash = (time.perf_counter() - start) / len(passwords)
+            for _ in passwords:
+                observe_hash_duration(per_hash, self.registry)
+        return password_hashes
+
+    def verify_password(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return hash_method_of(password_hash) != self.method
+
+    def shutdown(self, wait: bool = True) -> None:
+        if not self._closed:
+            self._closed = True
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            logger.info("Password hashing pool shut down")
+
+
+def create_hasher(config, registry: MetricsRegistry = REGISTRY) -> 'SyncHasher | ProcessPoolHasher':
+    """Build the hasher selected by ``PASSWORD_HASHER`` in the app config, timing hashes into ``registry``."""
+    backend = config.get('PASSWORD_HASHER', 'sync')
+    method = resolve_hash_method(config)
+    if backend == 'process':
+        return ProcessPoolHasher(
+            max_workers=int(config.get('PASSWORD_HASH_WORKERS') or 0) or None,
+            max_queue=int(config.get('PASSWORD_HASH_QUEUE_LIMIT', DEFAULT_QUEUE_LIMIT)),
+            submit_timeout=float(config.get('PASSWORD_HASH_SUBMIT_TIMEOUT', DEFAULT_SUBMIT_TIMEOUT)),
+            method=method,
+            registry=registry,
+        )
+    if backend == 'sync':
+        return SyncHasher(method, registry)
+    raise ValueError(f"Unknown PASSWORD_HASHER backend: {backend}")
@@ -0,0 +1,114 @@
+"""Logging pipeline for service A.
+
+Request threads only merge the message arguments and enqueue the record; a
+QueueListener thread does the formatting and stream I/O. Debug records can be
+sampled so per-request debug logging stays affordable when it is switched on
+in production.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import itertools
+import logging
+import queue
+
+DEFAULT_QUEUE_SIZE = 10000
+
+_active_listener: Optional[QueueListener] = None
+
+
+class ColorFormatter(logging.Formatter):
+    grey = "\x1b[38;20m"
+    green = "\x1b[32;20m"
+    blue = "\x1b[34;20m"
+    reset = "\x1b[0m"
+    format_str = "%(asctime)s - [SERVICE-A] %(levelname)s: %(message)s"
+
+    def __init__(self):
+        super().__init__()
+        self._info_formatter = logging.Formatter(f"{self.green}{self.format_str}{self.reset}")
+        self._other_formatter = logging.Formatter(f"{self.blue}{self.format_str}{self.reset}")
+
+    def format(self, record):
+        formatter = self._info_formatter if record.levelno == logging.INFO else self._other_formatter
+        return formatter.format(record)
+
+
+class DebugSampler(logging.Filter):
+    """Let through one in every ``1 / rate`` DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if not self.every:
+            return False
+        return next(self._counter) % self.every == 0
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def configure_logging(level: str = 'INFO', debug_sample_rate: float = 1.0,
+                      queue_size: int = DEFAULT_QUEUE_SIZE,
+                      handler: Optional[logging.Handler] = None) -> QueueListener:
+    """Route the root logger through a queue and start its listener.
+
+    Returns the started listener; call ``stop()`` on it at shutdown to flush
+    pending records.
+    """
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(ColorFormatter())
+
+    log_queue: 'queue.Queue[logging.LogRecord]' = queue.Queue(maxsize=queue_size)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    if debug_sample_rate < 1:
+        queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    global _active_listener
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _active_listener = listener
+    return listener
+
+
+def restart_after_fork() -> Optional[QueueListener]:
+    """Give a forked child its own queue and listener thread.
+
+    Threads do not survive fork, so without this a worker process would keep
+    enqueueing records that nothing ever writes out.
+    """
+    global _active_listener
+    if _active_listener is None:
+        return None
+    log_queue: 'queue.Queue[logging.LogRecord]' = queue.Queue(maxsize=_active_listener.queue.maxsize)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue = log_queue
+    listener = QueueListener(log_queue, *_active_listener.handlers, respect_handler_level=True)
+    listener.start()
+    _active_listener = listener
+    return listener
+
+
+def stop_logging() -> None:
+    """Flush and stop the active listener; safe to call more than once."""
+    global _active_listener
+    if _active_listener is not None:
+        _active_listener.stop()
+        _active_listener = None
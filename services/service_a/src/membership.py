@@ -0,0 +1,85 @@
+"""Run-length encoded set of existing user IDs.
+
+User IDs are SQLite rowids handed out in increasing order and users are
+never deleted, so the whole set is usually a single ``[first, last]`` run.
+Callers holding a copy can answer "does user N exist?" without a request:
+a miss that is above the copy's version may just be newer than the copy,
+anything else is exact.
+
+The version of a snapshot is the highest committed ID it was synced to.
+SQLite commits writes one at a time and IDs only grow, so every ID up to
+that version that will ever exist is in the snapshot and a delta since
+version V is simply the runs above V. That holds across processes, so any
+worker can serve any delta.
+"""
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+import threading
+
+Run = Tuple[int, int]
+
+
+class UserIdSet:
+    """Thread-safe sorted list of disjoint, non-adjacent ``(start, end)`` runs."""
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        # Highest ID read back from the database; rows above it are fetched
+        # by UserRepository.id_snapshot before serving a snapshot.
+        self.synced_through = 0
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int) -> None:
+        with self._lock:
+            self._add(user_id)
+
+    def add_many(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._add(user_id)
+
+    def _add(self, user_id: int) -> None:
+        # Fast path: IDs almost always arrive in order and extend the last run
+        if self._ends and self._ends[-1] + 1 == user_id:
+            self._ends[-1] = user_id
+            return
+        i = bisect_left(self._ends, user_id)
+        if i < len(self._starts) and self._starts[i] <= user_id:
+            return
+        joins_left = i > 0 and self._ends[i - 1] + 1 == user_id
+        joins_right = i < len(self._starts) and self._starts[i] - 1 == user_id
+        if joins_left and joins_right:
+            self._ends[i - 1] = self._ends.pop(i)
+            del self._starts[i]
+        elif joins_left:
+            self._ends[i - 1] = user_id
+        elif joins_right:
+            self._starts[i] = user_id
+        else:
+            self._starts.insert(i, user_id)
+            self._ends.insert(i, user_id)
+
+    def mark_synced(self, user_id: int) -> None:
+        with self._lock:
+            self.synced_through = max(self.synced_through, user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        with self._lock:
+            i = bisect_left(self._ends, user_id)
+            return i < len(self._starts) and self._starts[i] <= user_id
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def runs(self, since: int = 0, through: Optional[int] = None) -> List[Run]:
+        """Runs of IDs in ``(since, through]``; ``through`` defaults to the highest ID."""
+        with self._lock:
+            i = bisect_left(self._ends, since + 1)
+            runs = []
+            for start, end in zip(self._starts[i:], self._ends[i:]):
+                if through is not None and start > through:
+                    break
+                runs.append((max(start, since + 1), end if through is None else min(end, through)))
+            return runs
@@ -0,0 +1,230 @@
+"""Prometheus-style metrics for service A.
+
+Samples are recorded into a fixed set of lock stripes picked by thread id, so
+concurrent request threads rarely contend on the same lock; stripes are only
+merged when /metrics is scraped.
+"""
+from bisect import bisect_left
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+STRIPES = 16
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Stripe:
+    __slots__ = ('lock', 'counters', 'histograms')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._stripes = [_Stripe() for _ in range(STRIPES)]
+        self._meta: Dict[str, Tuple[str, str, Sequence[float]]] = {}
+        self._collectors: List[Callable[[], str]] = []
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._meta.setdefault(name, ('counter', help_text, ()))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self._meta.setdefault(name, ('histogram', help_text, tuple(buckets)))
+
+    def add_collector(self, collector: Callable[[], str]) -> None:
+        """Register a callable returning extra exposition text at scrape time."""
+        self._collectors.append(collector)
+
+    def _stripe(self) -> _Stripe:
+        return self._stripes[threading.get_ident() % STRIPES]
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        stripe = self._stripe()
+        key = (name, labels)
+        with stripe.lock:
+            stripe.counters[key] = stripe.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()) -> None:
+        buckets = self._meta[name][2]
+        index = bisect_left(buckets, value)
+        stripe = self._stripe()
+        key = (name, labels)
+        with stripe.lock:
+            series = stripe.histograms.get(key)
+            if series is None:
+                series = stripe.histograms[key] = [0] * (len(buckets) + 2)
+            if index < len(buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def reset(self) -> None:
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.counters.clear()
+                stripe.histograms.clear()
+
+    def _merged(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+        counters: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key, value in stripe.counters.items():
+                    counters[key] = counters.get(key, 0) + value
+                for key, series in stripe.histograms.items():
+                    merged = histograms.setdefault(key, [0] * len(series))
+                    for i, value in enumerate(series):
+                        merged[i] += value
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self._merged()
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, series):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(series[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+        for collector in self._collectors:
+            lines.append(collector().rstrip('\n'))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def create_registry() -> MetricsRegistry:
+    """Build a registry with service A's standard metric definitions."""
+    registry = MetricsRegistry()
+    registry.counter('service_a_http_requests_total', 'HTTP requests by method, route and status.')
+    registry.histogram('service_a_http_request_duration_seconds', 'HTTP request latency by method, route and status.')
+    registry.counter('service_a_sql_statements_total', 'SQL statements executed, by statement type.')
+    registry.histogram('service_a_sql_statement_duration_seconds', 'SQL statement latency by statement type.',
+                       SQL_BUCKETS)
+    registry.counter('service_a_repository_sql_statements_total', 'SQL statements run by each UserRepository method.')
+    registry.counter('service_a_sql_repeated_statements_total',
+                     'Requests that ran one statement many times (likely N+1), by route.')
+    registry.histogram('service_a_password_hash_duration_seconds', 'Time spent computing password hashes.')
+    registry.histogram('service_a_group_commit_batch_size', 'User creates written per group commit.',
+                       BATCH_SIZE_BUCKETS)
+    registry.histogram('service_a_group_commit_duration_seconds', 'Time to write and commit one group commit batch.',
+                       SQL_BUCKETS)
+    return registry
+
+
+REGISTRY = create_registry()
+
+
+def observe_hash_duration(seconds: float, registry: MetricsRegistry = REGISTRY) -> None:
+    registry.observe('service_a_password_hash_duration_seconds', seconds)
+
+
+def observe_group_commit(size: int, seconds: float, registry: MetricsRegistry = REGISTRY) -> None:
+    registry.observe('service_a_group_commit_batch_size', size)
+    registry.observe('service_a_group_commit_duration_seconds', seconds)
+
+
+def instrument_engine(engine, registry: MetricsRegistry = REGISTRY) -> None:
+    """Count and time every statement executed on ``engine``."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        words = statement.split(None, 1)
+        labels = (('operation', words[0].upper() if words else 'UNKNOWN'),)
+        registry.inc('service_a_sql_statements_total', labels)
+        registry.observe('service_a_sql_statement_duration_seconds', elapsed, labels)
+
+
+def cache_collector(cache) -> Callable[[], str]:
+    """Collector exporting a TTLCache's hit, miss, eviction and size stats."""
+    def collect() -> str:
+        stats = cache.stats()
+        lines = []
+        for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            name = f'service_a_user_cache_{key}_total'
+            lines += [f'# TYPE {name} counter', f'{name} {stats[key]}']
+        lines += ['# TYPE service_a_user_cache_size gauge', f"service_a_user_cache_size {stats['size']}"]
+        return '\n'.join(lines)
+    return collect
+
+
+def record_request(registry: MetricsRegistry, method: str, url_rule, status: int, seconds: float) -> None:
+    """Count and time one request under its route pattern (``unmatched`` without one)."""
+    rule = url_rule.rule if url_rule is not None else 'unmatched'
+    labels = (('method', method), ('route', rule), ('status', str(status)))
+    registry.inc('service_a_http_requests_total', labels)
+    registry.observe('service_a_http_request_duration_seconds', seconds, labels)
+
+
+def init_metrics(app: Flask, engine=None, registry: Optional[MetricsRegistry] = None,
+                 user_repository=None) -> MetricsRegistry:
+    """Record per-route request metrics on ``app`` and serve them at /metrics.
+
+    Each app reports into its own registry, ``app.extensions['metrics']``;
+    one is created unless ``registry`` is given.
+    """
+    if registry is None:
+        registry = create_registry()
+    app.extensions['metrics'] = registry
+    if engine is not None:
+        instrument_engine(engine, registry)
+
+    if user_repository is not None:
+        registry.add_collector(cache_collector(user_repository.cache))
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start: Optional[float] = g.pop('metrics_start', None)
+        if start is not None:
+            record_request(registry, request.method, request.url_rule, response.status_code,
+                           time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return registry
@@ -1,14 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from typing import Optional, List
+from sqlalchemy import bindparam, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import check_password_hash
+from concurrent.futures import Future, ThreadPoolExecutor, wait as futures_wait
+from .cache import TTLCache
+from .changes import (
+    CHANGE_LOG_TABLE, CHANGES_POLL_INTERVAL, ChangeNotifier, install_change_log, parse_changed_at, parse_cursor
+)
+from .hashing import SyncHasher
+from .membership import Run, UserIdSet
+from .search import ascii_lower, fts_rowid_select, install_search_index, prefix_upper_bound
+from .serializers import USER_FIELDS
+from typing import Any, Dict, Iterator, NamedTuple, Optional, List, Tuple
+from datetime import datetime
 import logging
+import threading
+import time
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 db = SQLAlchemy()
 
+# SQLite builds before 3.32 cap a statement at 999 bound parameters, so
+# IN (...) lookups are issued in chunks that stay safely below that limit.
+SQLITE_MAX_IN_PARAMS = 900
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+
+# Rows per INSERT executemany; each chunk runs inside its own savepoint
+BULK_INSERT_CHUNK_SIZE = 1000
+
 class User(db.Model):
     __tablename__ = 'users'
 
@@ -17,49 +41,581 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
 
-    def __init__(self, username: str, email: str, password: str):
-        logger.debug(f"Creating new User instance with username: {username}")
+    # Case-insensitive prefix search scans these instead of the whole table
+    __table_args__ = (
+        db.Index('ix_users_username_lower', func.lower(username)),
+        db.Index('ix_users_email_lower', func.lower(email)),
+    )
+
+    def __init__(self, username: str, email: str, password: Optional[str] = None,
+                 password_hash: Optional[str] = None, hasher=None):
+        logger.debug("Creating new User instance with username: %s", username)
+        if (password is None) == (password_hash is None):
+            raise ValueError("Exactly one of password or password_hash is required")
         self.username = username
         self.email = email
-        self.password_hash = generate_password_hash(password)
+        if password_hash is None:
+            password_hash = (hasher or SyncHasher()).hash_password(password)
+        self.password_hash = password_hash
 
-    def verify_password(self, password: str) -> bool:
+    def verify_password(self, password: str, hasher=None) -> bool:
+        if hasher is not None:
+            return hasher.verify_password(self.password_hash, password)
         return check_password_hash(self.password_hash, password)
 
     @staticmethod
     def create(username: str, email: str, password: str) -> 'User':
-        logger.debug(f"Creating new user with username: {username}, email: {email}")
+        logger.debug("Creating new user with username: %s, email: %s", username, email)
         return User(username=username, email=email, password=password)
 
+install_search_index(User.__table__)
+install_change_log(User.__table__)
+
+
+class UserChange(db.Model):
+    """One create or update of a user, written by triggers on ``users``."""
+    __tablename__ = CHANGE_LOG_TABLE
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    username = db.Column(db.String(80), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    changed_at = db.Column(db.String(32), nullable=False)
+
+class CachedUser(NamedTuple):
+    """Immutable copy of a user's public fields, safe to share across sessions."""
+    id: int
+    username: str
+    email: str
+
+
+def validate_bulk_rows(rows: List[Any], results: List[Dict[str, Any]]) -> List[int]:
+    """Mark malformed and in-batch duplicate rows; return indexes of the rest."""
+    pending = []
+    seen_usernames, seen_emails = set(), set()
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict) or not all(
+                isinstance(row.get(field), str) and row.get(field)
+                for field in ('username', 'email', 'password')):
+            results[i].update(status='invalid', error='username, email and password are required')
+        elif row['username'] in seen_usernames:
+            results[i].update(status='conflict', error='Duplicate username in batch')
+        elif row['email'] in seen_emails:
+            results[i].update(status='conflict', error='Duplicate email in batch')
+        else:
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email'])
+            pending.append(i)
+    return pending
+
+
+def filter_existing_rows(rows: List[Dict[str, Any]], pending: List[int], existing_usernames: set,
+                         existing_emails: set, results: List[Dict[str, Any]]) -> List[int]:
+    """Mark rows clashing with stored users; return indexes still to insert."""
+    accepted = []
+    for i in pending:
+        if rows[i]['username'] in existing_usernames:
+            results[i].update(status='conflict', error='Username already exists')
+        elif rows[i]['email'] in existing_emails:
+            results[i].update(status='conflict', error='Email already exists')
+        else:
+            accepted.append(i)
+    return accepted
+
+
+def existing_users_select(usernames: List[str], emails: List[str]):
+    return select(User.username, User.email).where(
+        or_(User.username.in_(usernames), User.email.in_(emails)))
+
+
+def projected_select(fields: Tuple[str, ...]):
+    """SELECT only the requested public columns; id is always included."""
+    columns = [User.id] + [getattr(User, field) for field in fields if field != 'id']
+    return select(*columns)
+
+
+def search_select(query: str, mode: str, field: str, after_id: Optional[int], limit: int,
+                  anchor_key: Optional[str] = None):
+    """Keyset page of users whose ``field`` matches ``query``, one row past ``limit``.
+
+    ``prefix`` is a case-insensitive prefix match ordered by the lowered
+    field, so it is a single range scan over the lower() index that stops
+    after ``limit`` rows; the cursor is the id of the last row returned.
+    ``substring`` matches through the FTS5 shadow table in id order.
+
+    ``anchor_key`` is the lowered field of the ``after_id`` row when the
+    caller already has it; otherwise it is looked up in the same query.
+    """
+    column = getattr(User, field)
+    if mode == 'substring':
+        return select(User).where(
+            User.id.in_(fts_rowid_select(query, field, after_id, limit + 1))).order_by(User.id)
+
+    key = func.lower(column)
+    low = ascii_lower(query)
+    stmt = select(User)
+    upper = prefix_upper_bound(low)
+    if upper is not None:
+        stmt = stmt.where(key < upper)
+    if after_id is None:
+        stmt = stmt.where(key >= low)
+    else:
+        if anchor_key is None:
+            anchor = aliased(User)
+            anchor_key = select(func.lower(getattr(anchor, field))).where(
+                anchor.id == after_id).scalar_subquery()
+        # Seek straight to the previous page's last key instead of the prefix start
+        stmt = stmt.where(key >= func.max(low, anchor_key),
+                          tuple_(key, User.id) > tuple_(anchor_key, after_id))
+    return stmt.order_by(key, User.id).limit(limit + 1)
+
+
+def page_select(after_id: Optional[int], limit: int):
+    """One keyset page of users by id, one row past ``limit``."""
+    stmt = select(User)
+    if after_id is not None:
+        stmt = stmt.where(User.id > after_id)
+    # The extra row tells split_page whether another page exists
+    return stmt.order_by(User.id).limit(limit + 1)
+
+
+def split_page(users: List[Any], limit: int) -> Tuple[List[Any], Optional[int]]:
+    """``(page, next_cursor)`` from rows fetched one past ``limit``; the cursor is None on the last page."""
+    if len(users) > limit:
+        users = users[:limit]
+        return users, users[-1].id
+    return users, None
+
+
+def split_changes(changes: List[UserChange], limit: int, since: int) -> Tuple[List[UserChange], int, bool]:
+    """``(changes, cursor, has_more)`` from changes_select rows fetched after cursor ``since``."""
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return changes, (changes[-1].id if changes else since), has_more
+
+
+def in_request_order(unique_ids: List[int], found: Dict[int, Any]) -> Tuple[List[Any], List[int]]:
+    """The found users in the order of ``unique_ids``, and the ids that were not found."""
+    users = [found[user_id] for user_id in unique_ids if user_id in found]
+    missing_ids = [user_id for user_id in unique_ids if user_id not in found]
+    return users, missing_ids
+
+
+def new_ids_select(after_id: int):
+    return select(User.id).where(User.id > after_id).order_by(User.id).execution_options(
+        yield_per=STREAM_CHUNK_SIZE)
+
+
+def changes_select(since: int, limit: int):
+    """Changes after cursor ``since`` in commit order, one row past ``limit``."""
+    return select(UserChange).where(UserChange.id > since).order_by(UserChange.id).limit(limit + 1)
+
+
+def version_select():
+    """The newest change log entry: its id versions the users table."""
+    return select(UserChange.id, UserChange.changed_at).order_by(UserChange.id.desc()).limit(1)
+
+
+def changed_ids_select(after: int, through: int):
+    """(user_id, op) of the changes in ``(after, through]``, streamed."""
+    return select(UserChange.user_id, UserChange.op).where(
+        UserChange.id > after, UserChange.id <= through).execution_options(yield_per=STREAM_CHUNK_SIZE)
+
+
+def apply_changed_ids(rows, cache: TTLCache, user_ids: UserIdSet) -> None:
+    """Drop the cache entries of changed_ids_select rows and add created IDs to ``user_ids``."""
+    for user_id, op in rows:
+        cache.invalidate(user_id)
+        if op == 'create':
+            user_ids.add(user_id)
+
+
+def export_select(after_id: int, limit: int):
+    """One primary-key chunk of (id, NDJSON line) pairs with the line built by SQLite."""
+    line = func.json_object('id', User.id, 'username', User.username, 'email', User.email,
+                            'password_hash', User.password_hash)
+    return select(User.id, line).where(User.id > after_id).order_by(User.id).limit(limit)
+
+
+def rehash_statement():
+    return update(User).where(
+        User.id == bindparam('user_id'), User.password_hash == bindparam('old_hash')
+    ).values(password_hash=bindparam('new_hash'))
+
+
+def bulk_insert_statement():
+    # SQLite has no insert sentinel, so asking SQLAlchemy to keep parameter
+    # order runs one INSERT per row; results are matched up by username instead
+    return insert(User).returning(User.username, User.id)
+
+
+def ids_by_username(rows: List[Dict[str, Any]], returned) -> List[int]:
+    """IDs from a multi-row INSERT ... RETURNING (username, id), in the order of ``rows``."""
+    ids = {username: user_id for username, user_id in returned}
+    return [ids[row['username']] for row in rows]
+
+
+def bulk_values(rows: List[Dict[str, Any]], accepted: List[int], password_hashes: List[str]) -> List[Dict[str, str]]:
+    """bulk_insert_statement parameters for the ``accepted`` rows."""
+    return [{
+        'username': rows[i]['username'],
+        'email': rows[i]['email'],
+        'password_hash': password_hash
+    } for i, password_hash in zip(accepted, password_hashes)]
+
+
+def record_inserted(results: List[Dict[str, Any]], indexes: List[int], ids: List[Optional[int]]) -> None:
+    """Mark each row of a bulk insert chunk created, or conflicting where its id is None."""
+    for i, user_id in zip(indexes, ids):
+        if user_id is None:
+            results[i].update(status='conflict', error='Username or email already exists')
+        else:
+            results[i].update(status='created', id=user_id)
+
+
 class UserRepository:
-    def __init__(self, db):
+    def __init__(self, db, hasher=None, cache: Optional[TTLCache] = None, read_session=None,
+                 user_ids: Optional[UserIdSet] = None, notifier: Optional[ChangeNotifier] = None,
+                 group_commit=None):
         self.db = db
+        self._read_session = read_session
+        self.hasher = hasher or SyncHasher()
+        self.cache = cache if cache is not None else TTLCache()
+        self.user_ids = user_ids if user_ids is not None else UserIdSet()
+        self.notifier = notifier if notifier is not None else ChangeNotifier()
+        # GroupCommitWriter shared by concurrent create_user calls, or None
+        # for one transaction per call
+        self.group_commit = group_commit
+        self._rehash_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_rehashes: Dict[int, Future] = {}
+        self._rehash_lock = threading.Lock()
+        # Change log id this process's cache and user_ids are current with;
+        # None until the first version_tag or id_snapshot reads the head
+        self._changes_through: Optional[int] = None
+        self._changes_lock = threading.Lock()
         logger.debug("Initializing UserRepository with db instance")
 
     def create_user(self, username: str, email: str, password: str) -> User:
-        logger.debug(f"Creating user in repository - username: {username}")
+        logger.debug("Creating user in repository - username: %s", username)
+        if self.group_commit is not None:
+            return self._create_user_grouped(username, email, password)
         try:
-            user = User(username=username, email=email, password=password)
+            password_hash = self.hasher.hash_password(password)
+            user = User(username=username, email=email, password_hash=password_hash)
             self.db.session.add(user)
             logger.debug("Added user to session, about to commit")
             self.db.session.commit()
-            logger.debug(f"User created successfully - id: {user.id}")
+            self.cache.invalidate(user.id)
+            self.user_ids.add(user.id)
+            self._notify_change()
+            logger.debug("User created successfully - id: %s", user.id)
             return user
         except Exception as e:
-            logger.error(f"Error in create_user: {str(e)}")
+            logger.error("Error in create_user: %s", e)
+            self.db.session.rollback()
+            raise
+
+    def _create_user_grouped(self, username: str, email: str, password: str) -> User:
+        row = {'username': username, 'email': email}
+
+        def prepare() -> Dict[str, str]:
+            row['password_hash'] = self.hasher.hash_password(password)
+            return row
+
+        try:
+            user_id = self.group_commit.insert(prepare)
+        except Exception as e:
+            logger.error("Error in create_user: %s", e)
+            raise
+        user = User(**row)
+        user.id = user_id
+        self.cache.invalidate(user_id)
+        self.user_ids.add(user_id)
+        self._notify_change()
+        logger.debug("User created successfully - id: %s", user_id)
+        return user
+
+    def create_users(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many users in one transaction.
+
+        Each row needs ``username``, ``email`` and ``password``. Returns one
+        result per row, in input order, with ``status`` set to ``created``
+        (plus the new ``id``), ``conflict`` or ``invalid``.
+        """
+        logger.debug("Bulk creating %d users", len(rows))
+        results: List[Dict[str, Any]] = [{'index': i} for i in range(len(rows))]
+        pending = validate_bulk_rows(rows, results)
+        existing_usernames, existing_emails = self._find_existing(
+            [rows[i]['username'] for i in pending], [rows[i]['email'] for i in pending])
+        accepted = filter_existing_rows(rows, pending, existing_usernames, existing_emails, results)
+
+        password_hashes = self.hasher.hash_passwords([rows[i]['password'] for i in accepted])
+        values = bulk_values(rows, accepted, password_hashes)
+
+        try:
+            for start in range(0, len(accepted), BULK_INSERT_CHUNK_SIZE):
+                self._insert_chunk(accepted[start:start + BULK_INSERT_CHUNK_SIZE],
+                                   values[start:start + BULK_INSERT_CHUNK_SIZE], results)
+            self.db.session.commit()
+        except Exception as e:
+            logger.error("Error in create_users: %s", e)
             self.db.session.rollback()
             raise
 
+        created = [result['id'] for result in results if result['status'] == 'created']
+        for user_id in created:
+            self.cache.invalidate(user_id)
+        self.user_ids.add_many(created)
+        if created:
+            self._notify_change()
+        logger.debug("Bulk create finished - created: %d", len(created))
+        return results
+
+    def _find_existing(self, usernames: List[str], emails: List[str]) -> Tuple[set, set]:
+        existing_usernames, existing_emails = set(), set()
+        step = SQLITE_MAX_IN_PARAMS // 2
+        for start in range(0, len(usernames), step):
+            stmt = existing_users_select(usernames[start:start + step], emails[start:start + step])
+            for username, email in self.db.session.execute(stmt):
+                existing_usernames.add(username)
+                existing_emails.add(email)
+        return existing_usernames, existing_emails
+
+    def _insert_chunk(self, indexes: List[int], values: List[Dict[str, str]],
+                      results: List[Dict[str, Any]]) -> None:
+        stmt = bulk_insert_statement()
+        try:
+            with self.db.session.begin_nested():
+                ids = ids_by_username(values, self.db.session.execute(stmt, values))
+        except IntegrityError:
+            # A concurrent writer claimed a name after the up-front check;
+            # retry row by row so only the clashing rows are reported.
+            logger.debug("Bulk insert chunk conflicted, retrying row by row")
+            ids = []
+            for row in values:
+                try:
+                    with self.db.session.begin_nested():
+                        ids.append(self.db.session.execute(stmt, row).one().id)
+                except IntegrityError:
+                    ids.append(None)
+        record_inserted(results, indexes, ids)
+
+    @property
+    def read_session(self):
+        """Session for read-only queries: the read pool when configured, else db.session."""
+        return self._read_session if self._read_session is not None else self.db.session
+
+    def _notify_change(self) -> None:
+        self.notifier.notify()
+
+    def version_tag(self) -> Tuple[str, Optional[datetime]]:
+        """Return the current users-table ETag value and last-modified time.
+
+        Both come from the newest change log entry, so they move with every
+        write to the table, whichever process made it.
+        """
+        row = self.read_session.execute(version_select()).first()
+        if row is None:
+            return 'users-0', None
+        self._catch_up(row.id)
+        return f'users-{row.id}', parse_changed_at(row.changed_at)
+
+    def _catch_up(self, head: int) -> None:
+        """Apply change log entries up to ``head`` to this process's state.
+
+        Rows written elsewhere (other workers, ``flask import-users``) drop
+        their cache entries and add their IDs to ``user_ids``, including IDs
+        below ``user_ids.synced_through``. Only runs when the head moved.
+        """
+        with self._changes_lock:
+            through = self._changes_through
+            if through is not None and head <= through:
+                return
+            self._changes_through = head
+        if through is None:
+            # The first call only records where to start from
+            return
+        result = self.read_session.execute(changed_ids_select(through, head))
+        for chunk in result.partitions():
+            apply_changed_ids(chunk, self.cache, self.user_ids)
+
+    def verify_password(self, user: User, password: str) -> bool:
+        """Check ``password``; on success, upgrade a hash made with old settings.
+
+        The rehash runs on a background thread so the caller does not pay for
+        a second hash.
+        """
+        verified = user.verify_password(password, hasher=self.hasher)
+        if verified and user.id is not None and self.hasher.needs_rehash(user.password_hash):
+            self._schedule_rehash(user.id, user.password_hash, password)
+        return verified
+
+    def _engine_for(self, user_id: int):
+        """Engine that stores ``user_id``."""
+        return self.db.engine
+
+    def _schedule_rehash(self, user_id: int, old_hash: str, password: str) -> None:
+        engine = self._engine_for(user_id)
+        with self._rehash_lock:
+            if user_id in self._pending_rehashes:
+                return
+            if self._rehash_executor is None:
+                # Created on first use so forked workers each get their own thread
+                self._rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+            future = self._rehash_executor.submit(self._rehash, engine, user_id, old_hash, password)
+            self._pending_rehashes[user_id] = future
+        future.add_done_callback(lambda _: self._pending_rehashes.pop(user_id, None))
+
+    def _rehash(self, engine, user_id: int, old_hash: str, password: str) -> None:
+        try:
+            new_hash = self.hasher.hash_password(password)
+            # Only replace the hash that was verified; a concurrent password
+            # change wins.
+            with engine.begin() as conn:
+                updated = conn.execute(rehash_statement(), {
+                    'user_id': user_id, 'old_hash': old_hash, 'new_hash': new_hash}).rowcount
+            logger.debug("Rehashed password for user %s (updated: %s)", user_id, updated)
+        except Exception as e:
+            logger.warning("Background rehash for user %s failed: %s", user_id, e)
+
+    def flush_rehashes(self, timeout: Optional[float] = None) -> None:
+        """Wait for scheduled background rehashes to finish."""
+        futures_wait(list(self._pending_rehashes.values()), timeout=timeout)
+
     def get_user(self, user_id: int) -> Optional[User]:
-        logger.debug(f"Getting user by id: {user_id}")
-        return self.db.session.get(User, user_id)
+        logger.debug("Getting user by id: %s", user_id)
+        return self.read_session.get(User, user_id)
+
+    def id_snapshot(self, since: int = 0) -> Tuple[int, List[Run]]:
+        """Return ``(version, runs)`` of user IDs above ``since``.
+
+        IDs this process created are already in ``user_ids``; rows written by
+        other workers are picked up with an index range read of the IDs past
+        the last sync, so only the first call scans the table.
+        """
+        head = self.read_session.execute(version_select()).first()
+        if head is not None:
+            self._catch_up(head.id)
+        synced_through = self.user_ids.synced_through
+        result = self.read_session.scalars(new_ids_select(synced_through))
+        for chunk in result.partitions():
+            self.user_ids.add_many(chunk)
+            synced_through = chunk[-1]
+        self.user_ids.mark_synced(synced_through)
+        return synced_through, self.user_ids.runs(since, through=synced_through)
+
+    def lookup_user(self, user_id: int, fields: Tuple[str, ...] = USER_FIELDS) -> Optional[Any]:
+        """Cached read of a user's public fields.
+
+        A cache miss for the full field set loads and caches a CachedUser. A
+        miss for a narrower ``fields`` projection selects only those columns
+        and caches nothing but a negative result (when the cache keeps misses).
+        """
+        found, cached = self.cache.get(user_id)
+        if found:
+            return cached
+        row = self.read_session.execute(projected_select(fields).where(User.id == user_id)).first()
+        if row is None:
+            self.cache.set(user_id, None)
+            return None
+        if fields != USER_FIELDS:
+            return row
+        cached = CachedUser(*row)
+        self.cache.set(user_id, cached)
+        return cached
+
+    def get_users_by_ids(self, user_ids: List[int],
+                         fields: Tuple[str, ...] = USER_FIELDS) -> Tuple[List[Any], List[int]]:
+        """Fetch many users with chunked IN (...) queries.
+
+        Returns the found users in the order their IDs were requested (with
+        duplicates removed) together with the requested IDs that do not exist.
+        Users are rows of just ``fields`` (id always included): the password
+        hash and other unrequested columns are never read.
+        """
+        unique_ids = list(dict.fromkeys(user_ids))
+        logger.debug("Getting %d users by id", len(unique_ids))
+
+        stmt = projected_select(fields)
+        found = {}
+        for start in range(0, len(unique_ids), SQLITE_MAX_IN_PARAMS):
+            chunk = unique_ids[start:start + SQLITE_MAX_IN_PARAMS]
+            result = self.read_session.execute(stmt.where(User.id.in_(chunk)))
+            for user in result:
+                found[user.id] = user
+        return in_request_order(unique_ids, found)
 
     def get_users(self) -> List[User]:
         logger.debug("Getting all users - Start")
         try:
-            users = self.db.session.query(User).all()
-            logger.debug(f"Found {len(users)} users")
+            users = self.read_session.query(User).all()
+            logger.debug("Found %d users", len(users))
             return users
         except Exception as e:
-            logger.error(f"Error in get_users: {str(e)}")
-            return []
\ No newline at end of file
+            logger.error("Error in get_users: %s", e)
+            return []
+
+    def get_users_page(self, after_id: Optional[int] = None,
+                       limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        """Fetch one keyset page of users ordered by id.
+
+        Returns the page and the cursor to pass as ``after_id`` for the next
+        page, or None when there are no more users.
+        """
+        logger.debug("Getting users page - after_id: %s, limit: %d", after_id, limit)
+        return split_page(list(self.read_session.scalars(page_select(after_id, limit))), limit)
+
+    def parse_changes_cursor(self, value: str) -> int:
+        """Decode a ``since`` query argument for get_changes."""
+        return parse_cursor(value)
+
+    def get_changes(self, since: int = 0, limit: int = DEFAULT_PAGE_SIZE,
+                    wait: float = 0) -> Tuple[List[UserChange], int, bool]:
+        """Return ``(changes, cursor, has_more)`` for changes after cursor ``since``.
+
+        With ``wait`` and nothing new yet, long-polls for up to ``wait`` seconds.
+        ``cursor`` is what to pass as ``since`` next time.
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            sequence = self.notifier.sequence
+            changes = list(self.read_session.scalars(changes_select(since, limit)))
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            # End the read transaction so the next poll sees new commits
+            self.read_session.rollback()
+            self.notifier.wait(sequence, min(remaining, CHANGES_POLL_INTERVAL))
+        return split_changes(changes, limit, since)
+
+    def export_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the whole table, password hashes included, as NDJSON chunks.
+
+        Each chunk is a separate keyset query on the primary key, run on its
+        own pooled connection, so no read transaction stays open for the
+        length of the export.
+        """
+        engine = self.read_session.get_bind()
+        after_id = 0
+        while True:
+            # Core rows skip ORM result processing
+            with engine.connect() as conn:
+                rows = conn.execute(export_select(after_id, chunk_size)).all()
+            if not rows:
+                return
+            yield ('\n'.join(line for _, line in rows) + '\n').encode()
+            after_id = rows[-1][0]
+
+    def search_users(self, query: str, mode: str = 'prefix', field: str = 'username',
+                     after_id: Optional[int] = None,
+                     limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        """Search users by username or email; returns (page, next_cursor) like get_users_page."""
+        logger.debug("Searching users - mode: %s, field: %s, after_id: %s, limit: %d",
+                     mode, field, after_id, limit)
+        return split_page(list(self.read_session.scalars(search_select(query, mode, field, after_id, limit))), limit)
+
+    def iter_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[User]:
+        """Iterate over all users in id order, buffering at most ``chunk_size`` rows."""
+        logger.debug("Streaming all users - chunk_size: %d", chunk_size)
+        yield from self.read_session.query(User).order_by(User.id).yield_per(chunk_size)
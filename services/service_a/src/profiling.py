@@ -0,0 +1,190 @@
+"""Per-request profiling and slow-request logging for service A.
+
+Profiling is opt-in. With PROFILE_DIR set, a request runs under cProfile when
+it sends ``X-Profile: 1`` together with a valid ``X-Internal-API-Key``, or
+when PROFILE_SAMPLE_RATE picks it, and the stats are written to PROFILE_DIR
+(open them with ``python -m pstats`` or snakeviz). Without PROFILE_DIR the
+middleware is not installed at all.
+
+The slow-request log is always on: each SQL statement a request runs is
+timed, and a request slower than SLOW_REQUEST_THRESHOLD_MS logs one warning
+with its route, total time and every statement with its duration. Only the
+WSGI app is covered.
+"""
+from contextvars import ContextVar
+from flask import Flask, request
+from sqlalchemy import event
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+DEFAULT_SLOW_REQUEST_THRESHOLD_MS = 500.0
+# Statements beyond this are counted but not kept, so a runaway loop cannot
+# grow a request's trace without bound
+MAX_TRACED_STATEMENTS = 200
+MAX_LOGGED_STATEMENT_LENGTH = 300
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+class RequestTrace:
+    __slots__ = ('start', 'statements', 'dropped')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements: List[Tuple[str, float]] = []
+        self.dropped = 0
+
+    def add(self, statement: str, elapsed: float) -> None:
+        if len(self.statements) < MAX_TRACED_STATEMENTS:
+            self.statements.append((statement, elapsed))
+        else:
+            self.dropped += 1
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('service_a_request_trace', default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def trace_engine(engine) -> None:
+    """Time every statement ``engine`` runs on behalf of a traced request."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault('trace_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        starts = conn.info.get('trace_query_start')
+        if trace is not None and starts:
+            trace.add(statement, time.perf_counter() - starts.pop())
+
+
+def format_slow_request(method: str, route: str, status: int, trace: RequestTrace, elapsed: float) -> str:
+    sql_total = sum(duration for _, duration in trace.statements)
+    count = len(trace.statements) + trace.dropped
+    lines = [f"Slow request: {method} {route} -> {status} took {elapsed * 1000:.1f} ms "
+             f"({count} SQL statements, {sql_total * 1000:.1f} ms)"]
+    for statement, duration in trace.statements:
+        statement = ' '.join(statement.split())
+        if len(statement) > MAX_LOGGED_STATEMENT_LENGTH:
+            statement = statement[:MAX_LOGGED_STATEMENT_LENGTH] + '...'
+        lines.append(f"  {duration * 1000:8.2f} ms  {statement}")
+    if trace.dropped:
+        lines.append(f"  ... {trace.dropped} more statements not recorded")
+    return '\n'.join(lines)
+
+
+def init_slow_request_log(app: Flask, engines: Iterable,
+                          threshold_ms: float = DEFAULT_SLOW_REQUEST_THRESHOLD_MS) -> None:
+    """Log requests slower than ``threshold_ms`` with their SQL statements."""
+    for engine in engines:
+        trace_engine(engine)
+    threshold = threshold_ms / 1000
+
+    @app.before_request
+    def start_request_trace():
+        request.environ['service_a.trace_token'] = _current_trace.set(RequestTrace())
+
+    @app.after_request
+    def record_response_status(response):
+        request.environ['service_a.status'] = response.status_code
+        return response
+
+    # Teardown runs after a streamed body is finished, so its queries count
+    @app.teardown_request
+    def finish_request_trace(exc):
+        token = request.environ.pop('service_a.trace_token', None)
+        if token is None:
+            return
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - trace.start
+        if elapsed >= threshold:
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            status = request.environ.get('service_a.status', 500)
+            logger.warning(format_slow_request(request.method, route, status, trace, elapsed))
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that runs selected requests under cProfile.
+
+    The profiler is switched on while the app handles the request and while
+    each chunk of the response body is produced, so streamed responses are
+    profiled to the end.
+    """
+
+    def __init__(self, wsgi_app, directory: str, sample_rate: float = 0.0, api_key: Optional[str] = None,
+                 rand: Callable[[], float] = random.random):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.api_key = api_key
+        self._rand = rand
+
+    def _selected(self, environ) -> bool:
+        if environ.get('HTTP_X_PROFILE') not in (None, '', '0') and self.api_key \
+                and environ.get('HTTP_X_INTERNAL_API_KEY') == self.api_key:
+            return True
+        return self.sample_rate > 0 and self._rand() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self._selected(environ):
+            return self.wsgi_app(environ, start_response)
+        return self._profiled(environ, start_response)
+
+    def _profiled(self, environ, start_response) -> Iterator[bytes]:
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            result = self.wsgi_app(environ, start_response)
+        finally:
+            profiler.disable()
+        try:
+            iterator = iter(result)
+            while True:
+                profiler.enable()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    profiler.disable()
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            self._dump(profiler, environ, time.perf_counter() - start)
+
+    def _dump(self, profiler: cProfile.Profile, environ, elapsed: float) -> None:
+        path = _UNSAFE_FILENAME_CHARS.sub('_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        filename = (f"{time.strftime('%Y%m%dT%H%M%S')}-{environ.get('REQUEST_METHOD', 'GET')}-{path}"
+                    f"-{elapsed * 1000:.0f}ms-{uuid.uuid4().hex[:8]}.prof")
+        try:
+            profiler.dump_stats(os.path.join(self.directory, filename))
+            logger.info("Wrote request profile %s", filename)
+        except OSError as e:
+            logger.warning("Could not write request profile %s: %s", filename, e)
+
+
+def init_profiling(app: Flask, directory: Optional[str], sample_rate: float = 0.0,
+                   api_key: Optional[str] = None) -> None:
+    """Install ProfilingMiddleware on ``app`` when ``directory`` is set; otherwise do nothing."""
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, directory, sample_rate, api_key)
+    logger.info("Request profiling enabled - directory: %s, sample rate: %s", directory, sample_rate)
@@ -0,0 +1,225 @@
+"""SQL statement accounting for service A.
+
+An engine listener counts every statement run while a QueryLog is active:
+one per request (init_query_accounting) and one per QueryBudget block in
+tests. Statements are grouped by their normalised text, so the same
+statement executed again with different parameters, the shape of an N+1
+loop, shows up as one entry with a high count. IN lists and multi-row
+VALUES are collapsed so chunked lookups of different sizes group together.
+
+Public UserRepository methods can be wrapped (instrument_repository) so
+statements are also counted per repository method, both in the request's
+log and on the repository's metrics registry. With headers enabled (debug mode), every
+response carries its request's counts.
+"""
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from flask import Flask, request
+from functools import lru_cache, wraps
+from sqlalchemy import event
+from .metrics import REGISTRY, MetricsRegistry
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+import inspect
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+QUERY_METHODS_HEADER = 'X-Query-Methods'
+QUERY_REPEATED_HEADER = 'X-Query-Repeated'
+# A statement run this many times in one request is reported as a likely N+1
+DEFAULT_REPEAT_THRESHOLD = 10
+MAX_LOGGED_STATEMENT_LENGTH = 300
+
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_REPEATED_GROUPS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """Statement text with whitespace collapsed and placeholder lists reduced to ``(?)``."""
+    statement = _PLACEHOLDER_LIST.sub('(?)', ' '.join(statement.split()))
+    return _REPEATED_GROUPS.sub('(?)', statement)
+
+
+class QueryLog:
+    """Statement counts in total, per normalised statement and per repository method."""
+    __slots__ = ('total', 'statements', 'methods')
+
+    def __init__(self):
+        self.total = 0
+        self.statements: Counter = Counter()
+        self.methods: Counter = Counter()
+
+    def record(self, statement: str, method: Optional[str]) -> None:
+        self.total += 1
+        self.statements[normalize_statement(statement)] += 1
+        if method is not None:
+            self.methods[method] += 1
+
+    def repeated(self, threshold: int = DEFAULT_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements run at least ``threshold`` times, most frequent first."""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def describe(self) -> str:
+        lines = [f"{self.total} SQL statements"]
+        for statement, count in self.statements.most_common():
+            if len(statement) > MAX_LOGGED_STATEMENT_LENGTH:
+                statement = statement[:MAX_LOGGED_STATEMENT_LENGTH] + '...'
+            lines.append(f"  {count:5d} x {statement}")
+        return '\n'.join(lines)
+
+
+# Logs collecting statements in this context: a request's, plus any
+# QueryBudget blocks wrapped around it
+_active_logs: ContextVar[Tuple[QueryLog, ...]] = ContextVar('service_a_query_logs', default=())
+# The outermost repository method running, and the registry it reports to
+_current_method: ContextVar[Optional[Tuple[str, MetricsRegistry]]] = ContextVar(
+    'service_a_repository_method', default=None)
+
+
+def push_log(log: QueryLog):
+    """Start collecting into ``log``; pass the returned token to pop_log."""
+    return _active_logs.set(_active_logs.get() + (log,))
+
+
+def pop_log(token) -> None:
+    _active_logs.reset(token)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    current = _current_method.get()
+    method = None
+    if current is not None:
+        method, registry = current
+        registry.inc('service_a_repository_sql_statements_total', (('method', method),))
+    for log in _active_logs.get():
+        log.record(statement, method)
+
+
+def account_engine(engine) -> None:
+    """Count statements run on ``engine``; safe to call more than once."""
+    if not event.contains(engine, 'before_cursor_execute', _count_statement):
+        event.listen(engine, 'before_cursor_execute', _count_statement)
+
+
+def _accounted(name: str, method: Callable, registry: MetricsRegistry) -> Callable:
+    if inspect.isgeneratorfunction(method):
+        @wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            # The body runs on each next(), possibly from a streamed response
+            iterator = method(*args, **kwargs)
+            while True:
+                token = _current_method.set(_current_method.get() or (name, registry))
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current_method.reset(token)
+                yield item
+        return generator_wrapper
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        # Statements of nested repository calls count towards the outer method
+        token = _current_method.set(_current_method.get() or (name, registry))
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _current_method.reset(token)
+    return wrapper
+
+
+def instrument_repository(repository, registry: MetricsRegistry = REGISTRY) -> None:
+    """Attribute statements to the public method of ``repository`` that ran them, counted in ``registry``."""
+    for name, _ in inspect.getmembers(type(repository), inspect.isfunction):
+        if not name.startswith('_'):
+            setattr(repository, name, _accounted(name, getattr(repository, name), registry))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a QueryBudget block runs more statements than allowed."""
+
+
+class QueryBudget(ContextDecorator):
+    """Fail when the block (or decorated function) runs more than ``max_queries`` statements.
+
+    ``max_repeats`` also bounds how often any one statement may run, which
+    catches N+1 loops that stay under the total. The engines must be
+    accounted (account_engine). Usable as ``with QueryBudget(2) as log:``
+    or ``@QueryBudget(2)``.
+    """
+
+    def __init__(self, max_queries: int, max_repeats: Optional[int] = None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.log = QueryLog()
+        self._tokens: List[Any] = []
+
+    def __enter__(self) -> QueryLog:
+        self.log = QueryLog()
+        self._tokens.append(push_log(self.log))
+        return self.log
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pop_log(self._tokens.pop())
+        if exc_type is not None:
+            return
+        if self.log.total > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"Query budget of {self.max_queries} exceeded: {self.log.describe()}")
+        if self.max_repeats is not None and self.log.repeated(self.max_repeats + 1):
+            raise QueryBudgetExceeded(
+                f"A statement ran more than {self.max_repeats} times: {self.log.describe()}")
+
+
+def init_query_accounting(app: Flask, engines: Iterable, user_repository=None, headers: bool = False,
+                          repeat_threshold: int = DEFAULT_REPEAT_THRESHOLD,
+                          registry: MetricsRegistry = REGISTRY) -> None:
+    """Count each request's statements and warn about likely N+1 patterns.
+
+    With ``headers``, responses carry X-Query-Count, X-Query-Methods and,
+    when a statement repeated ``repeat_threshold`` times or more,
+    X-Query-Repeated with the highest repeat count. Streamed bodies are
+    counted in the log but not in the headers, which are sent first.
+    """
+    for engine in engines:
+        account_engine(engine)
+    if user_repository is not None:
+        instrument_repository(user_repository, registry)
+
+    @app.before_request
+    def start_query_log():
+        log = QueryLog()
+        request.environ['service_a.query_log'] = log
+        request.environ['service_a.query_log_token'] = push_log(log)
+
+    if headers:
+        @app.after_request
+        def add_query_headers(response):
+            log = request.environ.get('service_a.query_log')
+            if log is not None:
+                response.headers[QUERY_COUNT_HEADER] = str(log.total)
+                if log.methods:
+                    response.headers[QUERY_METHODS_HEADER] = ','.join(
+                        f'{method}={count}' for method, count in sorted(log.methods.items()))
+                repeated = log.repeated(repeat_threshold)
+                if repeated:
+                    response.headers[QUERY_REPEATED_HEADER] = str(repeated[0][1])
+            return response
+
+    @app.teardown_request
+    def finish_query_log(exc):
+        token = request.environ.pop('service_a.query_log_token', None)
+        if token is None:
+            return
+        pop_log(token)
+        log = request.environ.pop('service_a.query_log')
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        for statement, count in log.repeated(repeat_threshold):
+            registry.inc('service_a_sql_repeated_statements_total', (('route', route),))
+            logger.warning("Possible N+1: %s %s ran one statement %d times: %s", request.method, route,
+                           count, statement[:MAX_LOGGED_STATEMENT_LENGTH])
@@ -1,106 +1,186 @@
-from flask import Flask, request, jsonify
-from .models import UserRepository
-from typing import Any
-import os
+from flask import Flask, Response, request, jsonify, stream_with_context
+from .admission import remaining_budget
+from .api import (
+    INTERNAL_API_KEY, MAX_BULK_CREATE, ApiError, batch_body, bulk_body, changes_body, check_internal_key,
+    create_error, error_body, ids_body, page_body, parse_batch_body, parse_bulk_body, parse_changes,
+    parse_create_body, parse_fields_arg, parse_ids_since, parse_page_args, parse_search, users_array_chunk,
+    verify_body, wants_stream
+)
+from .serializers import encode, negotiate, serialize_user
+from .transfer import EXPORT_CHUNK_SIZE, EXPORT_FILENAME, gzip_stream
+from .models import UserRepository, STREAM_CHUNK_SIZE
+from functools import wraps
+from typing import Any, Callable, Iterator
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['INTERNAL_API_KEY', 'MAX_BULK_CREATE', 'register_routes']
 
-# Secret key for internal API authentication
-INTERNAL_API_KEY = os.environ.get('INTERNAL_API_KEY', 'dev_internal_key_123')
 
 def register_routes(app: Flask, user_repository: UserRepository) -> None:
-    def require_internal_auth():
-        auth_key = request.headers.get('X-Internal-API-Key')
-        if not auth_key or auth_key != INTERNAL_API_KEY:
-            return jsonify({'error': 'Unauthorized'}), 401
-        return None
+    """Serve the users API on ``app``; validation and bodies come from api.py."""
+    def require_internal_auth() -> None:
+        check_internal_key(request.headers)
+
+    def versioned(view: Callable) -> Callable:
+        """Tag successful responses with the users-table ETag and answer a
+        matching If-None-Match with 304 before the view runs."""
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            etag, last_modified = user_repository.version_tag()
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+        return wrapper
+
+    def internal_response(payload: Any, status: int = 200) -> Response:
+        """Encode an internal API payload as JSON or msgpack per the Accept header."""
+        mimetype = negotiate(request.accept_mimetypes)
+        response = app.response_class(encode(payload, mimetype), status=status, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
+
+    @app.errorhandler(ApiError)
+    def api_error(e: ApiError) -> Any:
+        return jsonify(error_body(e)), e.status
 
     @app.before_request
     def before_request():
-        print("\n[DEBUG] -------- New Request --------")
-        print(f"[DEBUG] Method: {request.method}, Path: {request.path}")
-        print(f"[DEBUG] Current request started")
+        logger.debug("New request - method: %s, path: %s", request.method, request.path)
+
+    def stream_users() -> Iterator[str]:
+        yield '['
+        first = True
+        chunk = []
+        for user in user_repository.iter_users(STREAM_CHUNK_SIZE):
+            chunk.append(user)
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield users_array_chunk(chunk, first)
+                first = False
+                chunk = []
+        if chunk:
+            yield users_array_chunk(chunk, first)
+        yield ']'
 
     @app.route('/api/users', methods=['GET'])
     @app.route('/api/users/', methods=['GET'])
+    @versioned
     def get_users() -> Any:
-        print("[DEBUG] Fetching all users")
+        if wants_stream(request.args):
+            logger.debug("Streaming all users")
+            return Response(stream_with_context(stream_users()), mimetype='application/json')
+
+        page = parse_page_args(request.args)
+        if page is not None:
+            users, next_cursor = user_repository.get_users_page(*page)
+            return jsonify(page_body(users, next_cursor))
+
+        logger.debug("Fetching all users")
         users = user_repository.get_users()
-        print(f"[DEBUG] Found {len(users)} users")
-        return jsonify([{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email
-        } for user in users])
+        logger.debug("Found %d users", len(users))
+        return jsonify([serialize_user(user) for user in users])
+
+    @app.route('/api/users/search', methods=['GET'])
+    @versioned
+    def search_users() -> Any:
+        users, next_cursor = user_repository.search_users(*parse_search(request.args))
+        return jsonify(page_body(users, next_cursor))
 
     @app.route('/api/users/<int:user_id>', methods=['GET'])
+    @versioned
     def get_user(user_id: int) -> Any:
-        user = user_repository.get_user(user_id)
+        user = user_repository.lookup_user(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email
-        })
+        return jsonify(serialize_user(user))
 
     @app.route('/api/users', methods=['POST'])
     @app.route('/api/users/', methods=['POST'])
     def create_user() -> Any:
-        data = request.get_json()
-        print(f"[DEBUG] Creating user with data: {data}")
+        username, email, password = parse_create_body(request.get_json(silent=True))
+        logger.debug("Creating user with username: %s", username)
+
+        try:
+            user = user_repository.create_user(username=username, email=email, password=password)
+        except Exception as e:
+            raise create_error(e)
+        logger.debug("Created user: %s, %s", user.id, user.username)
+        return jsonify(serialize_user(user)), 201
+
+    @app.route('/api/users/bulk', methods=['POST'])
+    def create_users_bulk() -> Any:
+        rows = parse_bulk_body(request.get_json(silent=True))
 
+        logger.debug("Bulk creating %d users", len(rows))
         try:
-            user = user_repository.create_user(
-                username=data['username'],
-                email=data['email'],
-                password=data['password']
-            )
-            print(f"[DEBUG] Created user: {user.id}, {user.username}")
-            return jsonify({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email
-            }), 201
+            results = user_repository.create_users(rows)
         except Exception as e:
-            print(f"[DEBUG] Error creating user: {str(e)}")
-            return jsonify({'error': str(e)}), 400
+            raise create_error(e)
+        return jsonify(bulk_body(results))
 
     # Private API endpoints for service-to-service communication
     @app.route('/internal/api/users/verify/<int:user_id>', methods=['GET'])
     def verify_user_internal(user_id: int) -> Any:
-        auth_error = require_internal_auth()
-        if auth_error:
-            return auth_error
+        require_internal_auth()
+        fields = parse_fields_arg(request.args)
 
-        print(f"[DEBUG] Internal API: Verifying user {user_id}")
-        user = user_repository.get_user(user_id)
+        logger.debug("Internal API: Verifying user %s", user_id)
+        user = user_repository.lookup_user(user_id, fields)
         if not user:
-            return jsonify({'error': 'User not found'}), 404
-
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'verified': True
-        })
+            return internal_response({'error': 'User not found'}, 404)
+        return internal_response(verify_body(user, fields))
 
     @app.route('/internal/api/users/batch', methods=['POST'])
     def get_users_batch_internal() -> Any:
-        auth_error = require_internal_auth()
-        if auth_error:
-            return auth_error
-
-        data = request.get_json()
-        user_ids = data.get('user_ids', [])
-        print(f"[DEBUG] Internal API: Fetching users batch {user_ids}")
-
-        users = []
-        for user_id in user_ids:
-            user = user_repository.get_user(user_id)
-            if user:
-                users.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email
-                })
-
-        return jsonify(users)
\ No newline at end of file
+        require_internal_auth()
+        user_ids = parse_batch_body(request.get_json(silent=True))
+        fields = parse_fields_arg(request.args)
+
+        logger.debug("Internal API: Fetching users batch of %d ids", len(user_ids))
+        users, missing_ids = user_repository.get_users_by_ids(user_ids, fields)
+        return internal_response(batch_body(users, missing_ids, fields))
+
+    @app.route('/internal/api/users/ids', methods=['GET'])
+    def get_user_ids_internal() -> Any:
+        """Existing user IDs as run-length ``[start, end]`` pairs.
+
+        ``?since=<version>`` returns only the runs added after that version.
+        """
+        require_internal_auth()
+        since = parse_ids_since(request.args)
+
+        version, runs = user_repository.id_snapshot(since)
+        return internal_response(ids_body(version, since, runs))
+
+    @app.route('/internal/api/users/changes', methods=['GET'])
+    def get_user_changes_internal() -> Any:
+        require_internal_auth()
+        since, limit, wait = parse_changes(request.args, user_repository.parse_changes_cursor)
+
+        # Answer before the caller's deadline rather than hold the long-poll past it
+        wait = remaining_budget(wait)
+        return internal_response(changes_body(*user_repository.get_changes(since, limit, wait)))
+
+    @app.route('/internal/api/users/export', methods=['GET'])
+    def export_users_internal() -> Any:
+        """Gzip-compressed NDJSON dump of the users table for backups."""
+        require_internal_auth()
+
+        logger.info("Starting users export")
+        chunks = gzip_stream(user_repository.export_users(EXPORT_CHUNK_SIZE))
+        return Response(stream_with_context(chunks), mimetype='application/gzip', headers={
+            'Content-Disposition': f'attachment; filename={EXPORT_FILENAME}'
+        })
+
+    @app.route('/internal/api/users/cache', methods=['GET'])
+    def get_user_cache_stats_internal() -> Any:
+        require_internal_auth()
+
+        return jsonify(user_repository.cache.stats())
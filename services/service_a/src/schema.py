@@ -0,0 +1,87 @@
+"""Schema bootstrap for service A's database.
+
+``create_all()`` reflects every table, and the search index and change log
+setup query sqlite_master, on every start. Instead, a fingerprint of the DDL
+this code expects is stamped into the database header
+(``PRAGMA user_version``) once the schema is in place. A start that finds
+the current fingerprint skips all of it for the cost of one pragma read;
+any other value (0 for a new or older database) runs the idempotent
+bootstrap and restamps.
+
+The WSGI app defers the check to its first request or readiness probe
+(SchemaBootstrap), so importing the app opens no database connection.
+"""
+from sqlalchemy import MetaData
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+from .changes import CHANGE_LOG_TRIGGERS, create_change_log_triggers
+from .models import User, db
+from .search import FTS_TABLE, SEARCH_TRIGGERS, create_search_index
+from typing import Optional
+import functools
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def schema_fingerprint(metadata: MetaData = db.metadata) -> int:
+    """Stable 31-bit hash of the tables, indexes and triggers the code expects."""
+    dialect = sqlite.dialect()
+    parts = []
+    for table in metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=dialect)))
+        parts.extend(sorted(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes))
+    parts.append(FTS_TABLE)
+    parts.extend(SEARCH_TRIGGERS.values())
+    parts.extend(CHANGE_LOG_TRIGGERS)
+    digest = hashlib.sha256('\n'.join(parts).encode()).digest()
+    # user_version is a signed 32-bit integer
+    return int.from_bytes(digest[:4], 'big') & 0x7FFFFFFF
+
+
+def ensure_schema(connection, metadata: MetaData = db.metadata) -> bool:
+    """Bring the schema up to date unless it is stamped as current.
+
+    Run it inside a transaction (``engine.begin()``). Returns True when the
+    bootstrap ran, False when the stamp matched.
+    """
+    fingerprint = schema_fingerprint(metadata)
+    if connection.dialect.name == 'sqlite' and \
+            connection.exec_driver_sql('PRAGMA user_version').scalar() == fingerprint:
+        return False
+    metadata.create_all(connection)
+    create_search_index(connection, User.__table__)
+    create_change_log_triggers(connection, User.__table__)
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'PRAGMA user_version = {fingerprint}')
+    logger.info("Database schema bootstrapped (fingerprint %08x)", fingerprint)
+    return True
+
+
+class SchemaBootstrap:
+    """Runs ensure_schema once per process, on first use."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.ready = False
+        self.bootstrapped: Optional[bool] = None
+        self.duration_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def ensure(self) -> None:
+        """Check the schema if that has not succeeded yet; failures raise and are retried next call."""
+        if self.ready:
+            return
+        with self._lock:
+            if self.ready:
+                return
+            start = time.perf_counter()
+            with self.engine.begin() as conn:
+                self.bootstrapped = ensure_schema(conn)
+            self.duration_ms = (time.perf_counter() - start) * 1000
+            self.ready = True
+            logger.info("Schema check finished in %.1f ms", self.duration_ms)
@@ -0,0 +1,167 @@
+"""User search support: FTS5 shadow table and query helpers.
+
+Prefix search runs on expression indexes over ``lower(username)`` and
+``lower(email)`` declared on the User model. Substring search goes through
+``users_fts``, an external-content FTS5 table over the users table that
+triggers keep in sync on every insert, update and delete, so bulk inserts
+that bypass the ORM are indexed too.
+
+The trigram tokenizer (SQLite 3.34+) matches any substring of three or more
+characters; on older SQLite builds the table falls back to word tokens.
+"""
+from sqlalchemy import Integer, Table, column, event, text
+from sqlalchemy.schema import CreateIndex
+from typing import Mapping, NamedTuple, Optional
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'users_fts'
+# Trigram queries shorter than this cannot match anything
+MIN_SUBSTRING_LENGTH = 3
+SEARCH_MODES = ('prefix', 'substring')
+SEARCH_FIELDS = ('username', 'email')
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+SEARCH_TRIGGERS = {
+    'users_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, username, email) VALUES (new.id, new.username, new.email);
+        END""",
+    'users_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, username, email)
+            VALUES ('delete', old.id, old.username, old.email);
+        END""",
+    'users_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, username, email)
+            VALUES ('delete', old.id, old.username, old.email);
+            INSERT INTO {fts}(rowid, username, email) VALUES (new.id, new.username, new.email);
+        END""",
+}
+
+
+class InvalidSearch(ValueError):
+    """Raised for malformed search parameters."""
+
+
+class SearchParams(NamedTuple):
+    query: str
+    mode: str
+    field: str
+    after_id: Optional[int]
+    limit: int
+
+
+def parse_search_args(args: Mapping[str, str]) -> SearchParams:
+    """Validate ``q``, ``mode``, ``field``, ``after_id`` and ``limit`` query arguments."""
+    query = args.get('q', '').strip()
+    mode = args.get('mode', 'prefix')
+    field = args.get('field', 'username')
+    if not query:
+        raise InvalidSearch('q is required')
+    if mode not in SEARCH_MODES:
+        raise InvalidSearch(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+    if field not in SEARCH_FIELDS:
+        raise InvalidSearch(f"field must be one of: {', '.join(SEARCH_FIELDS)}")
+    if mode == 'substring' and len(query) < MIN_SUBSTRING_LENGTH:
+        raise InvalidSearch(f'substring queries need at least {MIN_SUBSTRING_LENGTH} characters')
+    try:
+        after_id = args.get('after_id')
+        after_id = int(after_id) if after_id is not None else None
+        limit = int(args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        raise InvalidSearch('after_id and limit must be integers')
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise InvalidSearch(f'limit must be between 1 and {MAX_SEARCH_LIMIT}')
+    return SearchParams(query, mode, field, after_id, limit)
+
+
+def _tokenizer(connection) -> str:
+    version = tuple(int(part) for part in connection.exec_driver_sql(
+        'SELECT sqlite_version()').scalar().split('.'))
+    return 'trigram' if version >= (3, 34) else 'unicode61'
+
+
+def create_search_index(connection, table: Table) -> None:
+    """Create the FTS table, its sync triggers and the prefix indexes if missing.
+
+    Safe to run on every start; an FTS table created over existing rows is
+    rebuilt from the users table once.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    # Expression indexes cannot be reflected, so checkfirst would not see them
+    for index in table.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)).scalar()
+    if not exists:
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"username, email, content='{table.name}', content_rowid='id', "
+            f"tokenize='{_tokenizer(connection)}')")
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        logger.info("Created %s search index", FTS_TABLE)
+    for ddl in SEARCH_TRIGGERS.values():
+        connection.exec_driver_sql(ddl.format(table=table.name, fts=FTS_TABLE))
+
+
+def drop_search_index(connection) -> None:
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def install_search_index(table: Table) -> None:
+    """Create and drop the search index together with ``table``."""
+    event.listen(table, 'after_create', lambda target, connection, **kw: create_search_index(connection, target))
+    event.listen(table, 'before_drop', lambda target, connection, **kw: drop_search_index(connection))
+
+
+# SQLite's lower() only folds ASCII letters
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def ascii_lower(value: str) -> str:
+    """Lowercase ``value`` the way SQLite's lower() does, to match the lower() indexes."""
+    return value.translate(_ASCII_LOWER)
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with ``prefix``.
+
+    None when there is none, i.e. ``prefix`` is only U+10FFFF characters.
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # Lone surrogates cannot be encoded for SQLite; skip to the next scalar value
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+
+def fts_phrase(query: str) -> str:
+    """Quote ``query`` as a single FTS5 phrase so operators in it are literal."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def fts_rowid_select(query: str, field: str, after_id: Optional[int], limit: int):
+    """Rowids of ``field`` FTS matches for ``query`` in id order, one keyset page at a time.
+
+    FTS5 walks matches in rowid order, so the LIMIT stops the scan early even
+    for queries that match most of the table.
+    """
+    clause = f"{FTS_TABLE} MATCH :phrase"
+    params = {'phrase': f"{field} : {fts_phrase(query)}", 'limit': limit}
+    if after_id is not None:
+        clause += " AND rowid > :after_id"
+        params['after_id'] = after_id
+    return text(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {clause} ORDER BY rowid LIMIT :limit"
+    ).bindparams(**params).columns(column('rowid', Integer))
@@ -0,0 +1,64 @@
+"""Shared user serialization, field projection and response encoding.
+
+Internal callers can ask for a subset of the public user fields with
+``?fields=id,username`` and for a compact msgpack body with
+``Accept: application/msgpack``; JSON stays the default.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+USER_FIELDS: Tuple[str, ...] = ('id', 'username', 'email')
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Older clients still send the pre-registration name
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+
+class InvalidFields(ValueError):
+    """Raised for a ``fields`` parameter naming unknown fields."""
+
+
+def parse_fields(value: Optional[str]) -> Tuple[str, ...]:
+    """Turn ``"id,email"`` into a tuple of known user fields in canonical order."""
+    if not value:
+        return USER_FIELDS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(USER_FIELDS)
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in USER_FIELDS if field in requested)
+
+
+def serialize_user(user: Any, fields: Iterable[str] = USER_FIELDS) -> Dict[str, Any]:
+    """Public representation of a User, CachedUser or projected row."""
+    return {field: getattr(user, field) for field in fields}
+
+
+def serialize_change(change: Any) -> Dict[str, Any]:
+    """Change feed entry for a UserChange row."""
+    return {
+        'cursor': change.id,
+        'op': change.op,
+        'changed_at': change.changed_at,
+        'user': {'id': change.user_id, 'username': change.username, 'email': change.email}
+    }
+
+
+def negotiate(accept_mimetypes) -> str:
+    """Pick the response mimetype from a werkzeug Accept header object."""
+    if msgpack is None:
+        return JSON_MIMETYPE
+    best = accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return MSGPACK_MIMETYPE if best in MSGPACK_MIMETYPES else JSON_MIMETYPE
+
+
+def encode(payload: Any, mimetype: str) -> bytes:
+    if mimetype == MSGPACK_MIMETYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(',', ':')).encode()
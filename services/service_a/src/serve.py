@@ -0,0 +1,61 @@
+"""Process lifecycle hooks for running service A under a pre-forking server.
+
+The app is imported once in the master (``preload_app``) and workers are
+forked from it. Anything holding threads, sockets or child processes at fork
+time must be rebuilt in each worker: pooled SQLite connections, the logging
+listener thread, the password hashing pool, the shard query threads and the
+group commit writer. Per-process state is reset too, so a worker's user
+cache and /metrics counters start empty instead of carrying the master's.
+"""
+from flask import Flask
+from .hashing import SyncHasher, create_hasher
+from .logging_setup import restart_after_fork, stop_logging
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app: Flask) -> None:
+    """Run the schema check in the master so forked workers start ready."""
+    app.extensions['schema_bootstrap'].ensure()
+
+
+def after_fork(app: Flask) -> None:
+    """Re-create per-process resources inherited from the master."""
+    restart_after_fork()
+
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        # close=False leaves the parent's connections alone and just forgets
+        # them, so this worker opens fresh ones on first use.
+        db.engine.dispose(close=False)
+        if 'read_engine' in app.extensions:
+            app.extensions['read_engine'].dispose(close=False)
+
+    if 'metrics' in app.extensions:
+        app.extensions['metrics'].reset()
+
+    user_repository = app.extensions.get('user_repository')
+    if user_repository is not None:
+        user_repository.cache.reset()
+    if app.config.get('SERVICE_A_SHARDS', 1) > 1:
+        # Only imported when configured, as in create_app
+        from .sharding import ShardedUserRepository
+        if isinstance(user_repository, ShardedUserRepository):
+            user_repository.shards.after_fork()
+    if user_repository is not None and user_repository.group_commit is not None:
+        user_repository.group_commit.after_fork()
+    if user_repository is not None and not isinstance(user_repository.hasher, SyncHasher):
+        user_repository.hasher = create_hasher(app.config, user_repository.hasher.registry)
+
+    logger.info("Worker initialised after fork")
+
+
+def before_exit(app: Flask) -> None:
+    """Release worker resources once in-flight requests have drained."""
+    user_repository = app.extensions.get('user_repository')
+    if user_repository is not None:
+        if user_repository.group_commit is not None:
+            user_repository.group_commit.shutdown()
+        user_repository.hasher.shutdown()
+    stop_logging()
@@ -0,0 +1,733 @@
+"""Hash-partitioned user storage across several SQLite files.
+
+Each shard is its own SQLite database, with its own writer lock, holding the
+users whose ``id % shard_count`` is its index. A directory database next to
+the shards hands out user IDs (its AUTOINCREMENT key is the global ID
+allocator) and keeps one ``(user_id, username, email)`` row per user, so its
+UNIQUE indexes enforce uniqueness across shards.
+
+A create claims IDs and names in one short directory transaction, writes the
+users to their shards (concurrently when a batch spans several) and then
+marks the directory rows as committed. Writers only contend on the directory
+for those two small transactions; the users table with its search index is
+written per shard. Reads of one user go straight to its shard, and list
+reads scatter to every shard on a thread pool (sqlite3 releases the GIL
+while a query runs) and merge the results in id order.
+
+The directory does not depend on the shard count, so moving to another count
+only rewrites shard files. With writes stopped, run:
+
+    SERVICE_A_SHARDS=4 flask --app services.service_a.src.main rebalance-shards --to 8
+
+and restart with ``SERVICE_A_SHARDS=8``. Run from an unsharded deployment it
+copies the single database into shards and builds the directory. With
+``SERVICE_A_SHARDS`` set, ``flask import-users`` restores an export into the
+shards, claiming each imported user in the directory.
+
+Every shard keeps its own change log. The change feed reads all of them and
+merges the entries by time; its cursor is an opaque token holding one change
+log cursor per shard, so no shard's changes are skipped even when entries
+from different shards interleave. Tokens are tied to the shard count:
+after a rebalance, consumers start again from 0 and see every user as a
+``create``.
+
+Sharded mode serves the WSGI app only.
+"""
+from sqlalchemy import (
+    Column, Engine, Float, Index, Integer, MetaData, String, Table, create_engine, delete, func, insert,
+    select, text, update
+)
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import attrgetter
+from .cache import TTLCache
+from .changes import (
+    CHANGES_POLL_INTERVAL, ChangeNotifier, InvalidChangesRequest, create_change_log_triggers, parse_changed_at
+)
+from .engine import PRODUCTION_PRAGMAS, install_pragmas
+from .membership import Run, UserIdSet
+from .models import (
+    BULK_INSERT_CHUNK_SIZE, DEFAULT_PAGE_SIZE, SQLITE_MAX_IN_PARAMS, STREAM_CHUNK_SIZE, CachedUser,
+    User, UserChange, UserRepository, apply_changed_ids, bulk_values, changed_ids_select, changes_select,
+    export_select, filter_existing_rows, ids_by_username, in_request_order, page_select, projected_select,
+    search_select, split_page, validate_bulk_rows, version_select
+)
+from .search import ascii_lower, create_search_index
+from .serializers import USER_FIELDS
+from .transfer import IMPORT_CHUNK_SIZE
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+import click
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+DIRECTORY_FILENAME = 'directory.sqlite'
+REBALANCE_CHUNK_SIZE = 10000
+# Claims left pending this long by a crashed writer are released on startup
+PENDING_CLAIM_GRACE_SECONDS = 60.0
+
+# Directory claims for a chunk of exported rows (see transfer.py), then the
+# claimed subset of the chunk for one shard; both return the IDs written
+DIRECTORY_IMPORT_STATEMENT = text("""
+    INSERT OR IGNORE INTO user_directory (user_id, username, email, pending, claimed_at)
+    SELECT json_extract(value, '$.id'), json_extract(value, '$.username'),
+           json_extract(value, '$.email'), 1, :now
+    FROM json_each(:rows)
+    WHERE json_type(value, '$.id') = 'integer' AND json_extract(value, '$.password_hash') IS NOT NULL
+    RETURNING user_id
+""")
+SHARD_IMPORT_STATEMENT = text("""
+    INSERT OR IGNORE INTO users (id, username, email, password_hash)
+    SELECT json_extract(value, '$.id'), json_extract(value, '$.username'),
+           json_extract(value, '$.email'), json_extract(value, '$.password_hash')
+    FROM json_each(:rows)
+    WHERE json_extract(value, '$.id') IN (SELECT value FROM json_each(:ids))
+    RETURNING id
+""")
+
+directory_metadata = MetaData()
+
+user_directory = Table(
+    'user_directory', directory_metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    # Set from claim until the user row is committed on its shard
+    Column('pending', Integer, nullable=False, server_default='1'),
+    Column('claimed_at', Float, nullable=False),
+    Index('ix_user_directory_pending', 'user_id', sqlite_where=text('pending = 1')),
+    # IDs of released claims are never handed out again
+    sqlite_autoincrement=True,
+)
+
+def shard_filename(index: int, count: int) -> str:
+    return f'users-{index}-of-{count}.sqlite'
+
+
+def claim_statement():
+    return insert(user_directory).returning(user_directory.c.username, user_directory.c.user_id)
+
+
+def create_sqlite_engine(path: str, pragmas: Dict[str, object] = PRODUCTION_PRAGMAS) -> Engine:
+    engine = create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False})
+    install_pragmas(engine, pragmas)
+    return engine
+
+
+def create_shard_schema(engine: Engine) -> None:
+    """Create the users table, its search index and its change log on a shard if missing."""
+    User.__table__.create(engine, checkfirst=True)
+    UserChange.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        create_search_index(conn, User.__table__)
+        create_change_log_triggers(conn, User.__table__)
+
+
+def encode_feed_cursor(cursors: Sequence[int]) -> str:
+    """Change feed token for per-shard change log cursors."""
+    return '.'.join(str(cursor) for cursor in cursors)
+
+
+def decode_feed_cursor(token: Union[int, str], count: int) -> List[int]:
+    """Per-shard cursors from a change feed token; ``0`` starts every shard from the beginning."""
+    if str(token) == '0':
+        return [0] * count
+    try:
+        cursors = [int(part) for part in str(token).split('.')]
+    except ValueError:
+        raise InvalidChangesRequest('since must be a cursor returned by the change feed')
+    if len(cursors) != count:
+        raise InvalidChangesRequest('since is from another shard layout; start again from 0')
+    if any(cursor < 0 for cursor in cursors):
+        raise InvalidChangesRequest('since must not be negative')
+    return cursors
+
+
+class ShardedChange(NamedTuple):
+    """A shard's change log entry; ``id`` is the feed token just past it."""
+    id: str
+    user_id: int
+    op: str
+    username: str
+    email: str
+    changed_at: str
+
+
+class ShardSet:
+    """Engines for the directory and each shard under one directory path."""
+
+    def __init__(self, path: str, count: int, pragmas: Dict[str, object] = PRODUCTION_PRAGMAS):
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.count = count
+        self.directory_engine = create_sqlite_engine(os.path.join(path, DIRECTORY_FILENAME), pragmas)
+        directory_metadata.create_all(self.directory_engine)
+        self.engines = [create_sqlite_engine(os.path.join(path, shard_filename(i, count)), pragmas)
+                        for i in range(count)]
+        for engine in self.engines:
+            create_shard_schema(engine)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def shard_for(self, user_id: int) -> int:
+        return user_id % self.count
+
+    def engine_for(self, user_id: int) -> Engine:
+        return self.engines[user_id % self.count]
+
+    def all_engines(self) -> List[Engine]:
+        return [self.directory_engine] + self.engines
+
+    def scatter(self, fn: Callable[[int, Engine], T], shards: Optional[Iterable[int]] = None) -> List[T]:
+        """Run ``fn(index, engine)`` on each shard concurrently; results follow shard order."""
+        indexes = list(range(self.count) if shards is None else shards)
+        if len(indexes) <= 1:
+            return [fn(i, self.engines[i]) for i in indexes]
+        if self._executor is None:
+            # Created on first use so forked workers each get their own threads
+            self._executor = ThreadPoolExecutor(max_workers=self.count, thread_name_prefix='shard')
+        # Each task runs in a copy of the caller's context so request tracing follows it
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, i, self.engines[i])
+                   for i in indexes]
+        return [future.result() for future in futures]
+
+    def recover_pending(self, grace: float = PENDING_CLAIM_GRACE_SECONDS) -> Tuple[int, int]:
+        """Settle directory claims left pending by a writer that died mid-create.
+
+        Claims whose user row made it to the shard are confirmed; claims older
+        than ``grace`` seconds without one are released. Returns
+        ``(confirmed, released)``.
+        """
+        with self.directory_engine.connect() as conn:
+            claims = conn.execute(select(user_directory.c.user_id, user_directory.c.claimed_at).where(
+                user_directory.c.pending == 1)).all()
+        if not claims:
+            return 0, 0
+        stored = set()
+        for user_id, _ in claims:
+            with self.engine_for(user_id).connect() as conn:
+                if conn.scalar(select(User.id).where(User.id == user_id)) is not None:
+                    stored.add(user_id)
+        cutoff = time.time() - grace
+        stale = [user_id for user_id, claimed_at in claims if user_id not in stored and claimed_at < cutoff]
+        with self.directory_engine.begin() as conn:
+            if stored:
+                conn.execute(update(user_directory).where(
+                    user_directory.c.user_id.in_(sorted(stored))).values(pending=0))
+            if stale:
+                conn.execute(delete(user_directory).where(user_directory.c.user_id.in_(stale)))
+        logger.info("Recovered pending directory claims - confirmed: %d, released: %d",
+                    len(stored), len(stale))
+        return len(stored), len(stale)
+
+    def settle(self, confirmed: Sequence[int], released: Sequence[int]) -> None:
+        """Mark the ``confirmed`` directory claims committed and delete the ``released`` ones."""
+        with self.directory_engine.begin() as conn:
+            for start in range(0, len(confirmed), SQLITE_MAX_IN_PARAMS):
+                conn.execute(update(user_directory).where(user_directory.c.user_id.in_(
+                    confirmed[start:start + SQLITE_MAX_IN_PARAMS])).values(pending=0))
+            for start in range(0, len(released), SQLITE_MAX_IN_PARAMS):
+                conn.execute(delete(user_directory).where(user_directory.c.user_id.in_(
+                    released[start:start + SQLITE_MAX_IN_PARAMS])))
+
+    def after_fork(self) -> None:
+        for engine in self.all_engines():
+            engine.dispose(close=False)
+        self._executor = None
+
+    def dispose(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for engine in self.all_engines():
+            engine.dispose()
+
+
+class ShardedUserRepository(UserRepository):
+    """UserRepository over a ShardSet instead of a single Flask-SQLAlchemy database."""
+
+    def __init__(self, shards: ShardSet, hasher=None, cache: Optional[TTLCache] = None,
+                 user_ids: Optional[UserIdSet] = None, notifier: Optional[ChangeNotifier] = None):
+        super().__init__(None, hasher=hasher, cache=cache, user_ids=user_ids, notifier=notifier)
+        self.shards = shards
+        # One change log id per shard that the cache and user_ids are current
+        # with; None until the first version_tag or id_snapshot
+        self._shard_changes_through: Optional[List[int]] = None
+        logger.debug("Initializing ShardedUserRepository with %d shards", shards.count)
+
+    @property
+    def read_session(self):
+        raise AttributeError('ShardedUserRepository has no single read session')
+
+    def _engine_for(self, user_id: int) -> Engine:
+        return self.shards.engine_for(user_id)
+
+    def _claim(self, values: List[Dict[str, str]]) -> List[Optional[int]]:
+        """Reserve IDs, usernames and emails in the directory.
+
+        Returns the new ID for each row, or None where the name was taken.
+        """
+        now = time.time()
+        stmt = claim_statement()
+        ids: List[Optional[int]] = []
+        with self.shards.directory_engine.begin() as conn:
+            for start in range(0, len(values), BULK_INSERT_CHUNK_SIZE):
+                chunk = [{'username': row['username'], 'email': row['email'], 'claimed_at': now}
+                         for row in values[start:start + BULK_INSERT_CHUNK_SIZE]]
+                try:
+                    with conn.begin_nested():
+                        ids.extend(ids_by_username(chunk, conn.execute(stmt, chunk)))
+                    continue
+                except IntegrityError:
+                    # A concurrent writer claimed a name after the up-front check
+                    logger.debug("Directory claim chunk conflicted, retrying row by row")
+                for row in chunk:
+                    try:
+                        with conn.begin_nested():
+                            ids.append(conn.execute(stmt, row).one().user_id)
+                    except IntegrityError:
+                        ids.append(None)
+        return ids
+
+    def _settle(self, confirmed: Sequence[int], released: Sequence[int]) -> None:
+        self.shards.settle(confirmed, released)
+
+    def create_user(self, username: str, email: str, password: str) -> User:
+        logger.debug("Creating user in repository - username: %s", username)
+        password_hash = self.hasher.hash_password(password)
+        with self.shards.directory_engine.begin() as conn:
+            # Raises IntegrityError when the username or email is taken
+            user_id = conn.execute(claim_statement(), {
+                'username': username, 'email': email, 'claimed_at': time.time()}).one().user_id
+        user = User(username=username, email=email, password_hash=password_hash)
+        user.id = user_id
+        try:
+            with Session(self.shards.engine_for(user_id), expire_on_commit=False) as session:
+                session.add(user)
+                session.commit()
+        except Exception as e:
+            logger.error("Error in create_user: %s", e)
+            self._settle([], [user_id])
+            raise
+        self._settle([user_id], [])
+        self.cache.invalidate(user_id)
+        self.user_ids.add(user_id)
+        self._notify_change()
+        logger.debug("User created successfully - id: %s", user_id)
+        return user
+
+    def create_users(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many users; each shard inserts its share in one transaction.
+
+        Results match UserRepository.create_users. If a shard fails, users
+        already committed on other shards stay created and the error is raised.
+        """
+        logger.debug("Bulk creating %d users across %d shards", len(rows), self.shards.count)
+        results: List[Dict[str, Any]] = [{'index': i} for i in range(len(rows))]
+        pending = validate_bulk_rows(rows, results)
+        existing_usernames, existing_emails = self._find_existing(
+            [rows[i]['username'] for i in pending], [rows[i]['email'] for i in pending])
+        accepted = filter_existing_rows(rows, pending, existing_usernames, existing_emails, results)
+
+        password_hashes = self.hasher.hash_passwords([rows[i]['password'] for i in accepted])
+        values = bulk_values(rows, accepted, password_hashes)
+
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for i, row, user_id in zip(accepted, values, self._claim(values)):
+            if user_id is None:
+                results[i].update(status='conflict', error='Username or email already exists')
+                continue
+            results[i].update(status='created', id=user_id)
+            by_shard.setdefault(self.shards.shard_for(user_id), []).append(dict(row, id=user_id))
+
+        def insert_shard(index: int, engine: Engine) -> Optional[Exception]:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(User), by_shard[index])
+            except Exception as e:
+                return e
+            return None
+
+        errors = dict(zip(by_shard, self.shards.scatter(insert_shard, by_shard)))
+        created = [row['id'] for index, shard_rows in by_shard.items() if errors[index] is None
+                   for row in shard_rows]
+        failed = [row['id'] for index, shard_rows in by_shard.items() if errors[index] is not None
+                  for row in shard_rows]
+        self._settle(created, failed)
+
+        for user_id in created:
+            self.cache.invalidate(user_id)
+        self.user_ids.add_many(sorted(created))
+        if created:
+            self._notify_change()
+        error = next((e for e in errors.values() if e is not None), None)
+        if error is not None:
+            logger.error("Error in create_users: %s", error)
+            raise error
+        logger.debug("Bulk create finished - created: %d", len(created))
+        return results
+
+    def _find_existing(self, usernames: List[str], emails: List[str]) -> Tuple[set, set]:
+        existing_usernames, existing_emails = set(), set()
+        step = SQLITE_MAX_IN_PARAMS // 2
+        with self.shards.directory_engine.connect() as conn:
+            for start in range(0, len(usernames), step):
+                stmt = select(user_directory.c.username, user_directory.c.email).where(
+                    user_directory.c.username.in_(usernames[start:start + step])
+                    | user_directory.c.email.in_(emails[start:start + step]))
+                for username, email in conn.execute(stmt):
+                    existing_usernames.add(username)
+                    existing_emails.add(email)
+        return existing_usernames, existing_emails
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        logger.debug("Getting user by id: %s", user_id)
+        with Session(self.shards.engine_for(user_id)) as session:
+            return session.get(User, user_id)
+
+    def id_snapshot(self, since: int = 0) -> Tuple[int, List[Run]]:
+        """Return ``(version, runs)`` of user IDs above ``since`` from the directory.
+
+        The directory assigns IDs in commit order, so the single-database
+        argument holds as long as the version stays below the oldest claim
+        still being written to its shard.
+        """
+        self._catch_up_shards(self._heads())
+        synced_through = self.user_ids.synced_through
+        with self.shards.directory_engine.connect() as conn:
+            oldest_pending = conn.scalar(select(func.min(user_directory.c.user_id)).where(
+                user_directory.c.pending == 1))
+            stmt = select(user_directory.c.user_id).where(
+                user_directory.c.user_id > synced_through, user_directory.c.pending == 0)
+            if oldest_pending is not None:
+                stmt = stmt.where(user_directory.c.user_id < oldest_pending)
+            result = conn.execute(stmt.order_by(user_directory.c.user_id).execution_options(
+                yield_per=STREAM_CHUNK_SIZE)).scalars()
+            for chunk in result.partitions():
+                self.user_ids.add_many(chunk)
+                synced_through = chunk[-1]
+        self.user_ids.mark_synced(synced_through)
+        return synced_through, self.user_ids.runs(since, through=synced_through)
+
+    def lookup_user(self, user_id: int, fields: Tuple[str, ...] = USER_FIELDS) -> Optional[Any]:
+        found, cached = self.cache.get(user_id)
+        if found:
+            return cached
+        with self.shards.engine_for(user_id).connect() as conn:
+            row = conn.execute(projected_select(fields).where(User.id == user_id)).first()
+        if row is None:
+            self.cache.set(user_id, None)
+            return None
+        if fields != USER_FIELDS:
+            return row
+        cached = CachedUser(*row)
+        self.cache.set(user_id, cached)
+        return cached
+
+    def get_users_by_ids(self, user_ids: List[int],
+                         fields: Tuple[str, ...] = USER_FIELDS) -> Tuple[List[Any], List[int]]:
+        """Fetch many users, querying the shards that own them concurrently."""
+        unique_ids = list(dict.fromkeys(user_ids))
+        logger.debug("Getting %d users by id", len(unique_ids))
+        by_shard: Dict[int, List[int]] = {}
+        for user_id in unique_ids:
+            by_shard.setdefault(self.shards.shard_for(user_id), []).append(user_id)
+
+        stmt = projected_select(fields)
+
+        def fetch(index: int, engine: Engine) -> List[Any]:
+            ids = by_shard[index]
+            rows = []
+            with Session(engine) as session:
+                for start in range(0, len(ids), SQLITE_MAX_IN_PARAMS):
+                    result = session.execute(stmt.where(User.id.in_(ids[start:start + SQLITE_MAX_IN_PARAMS])))
+                    rows.extend(result)
+            return rows
+
+        found = {user.id: user for rows in self.shards.scatter(fetch, by_shard) for user in rows}
+        return in_request_order(unique_ids, found)
+
+    def _gather(self, stmt, key: Callable[[User], Any] = attrgetter('id')) -> Iterator[User]:
+        """Run ``stmt`` on every shard and merge the ordered results by ``key``."""
+        def fetch(index: int, engine: Engine) -> List[User]:
+            with Session(engine) as session:
+                return list(session.scalars(stmt))
+        return heapq.merge(*self.shards.scatter(fetch), key=key)
+
+    def get_users(self) -> List[User]:
+        logger.debug("Getting all users from %d shards", self.shards.count)
+        try:
+            users = list(self._gather(select(User).order_by(User.id)))
+            logger.debug("Found %d users", len(users))
+            return users
+        except Exception as e:
+            logger.error("Error in get_users: %s", e)
+            return []
+
+    def get_users_page(self, after_id: Optional[int] = None,
+                       limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        logger.debug("Getting users page - after_id: %s, limit: %d", after_id, limit)
+        # Each shard returns a full page; the merge keeps the lowest IDs
+        users = list(itertools.islice(self._gather(page_select(after_id, limit)), limit + 1))
+        return split_page(users, limit)
+
+    def _heads(self) -> List[Any]:
+        """The newest change log row of each shard, None for an empty log."""
+        def newest(index: int, engine: Engine) -> Any:
+            with engine.connect() as conn:
+                return conn.execute(version_select()).first()
+        return self.shards.scatter(newest)
+
+    def version_tag(self) -> Tuple[str, Optional[datetime]]:
+        """ETag value from the newest change on every shard: the change feed's head token."""
+        heads = self._heads()
+        self._catch_up_shards(heads)
+        changed = [parse_changed_at(head.changed_at) for head in heads if head is not None]
+        cursors = [head.id if head is not None else 0 for head in heads]
+        return f'users-{encode_feed_cursor(cursors)}', max(changed, default=None)
+
+    def _catch_up_shards(self, heads: List[Any]) -> None:
+        """UserRepository._catch_up for each shard's change log, up to its row in ``heads``."""
+        cursors = [head.id if head is not None else 0 for head in heads]
+        with self._changes_lock:
+            through = self._shard_changes_through
+            if through is not None and all(cursor <= seen for cursor, seen in zip(cursors, through)):
+                return
+            self._shard_changes_through = cursors if through is None else [
+                max(cursor, seen) for cursor, seen in zip(cursors, through)]
+        if through is None:
+            # The first call only records where to start from
+            return
+
+        def changed(index: int, engine: Engine) -> List[Any]:
+            with engine.connect() as conn:
+                return conn.execute(changed_ids_select(through[index], cursors[index])).all()
+
+        moved = [i for i in range(self.shards.count) if cursors[i] > through[i]]
+        for rows in self.shards.scatter(changed, moved):
+            apply_changed_ids(rows, self.cache, self.user_ids)
+
+    def parse_changes_cursor(self, value: str) -> str:
+        return encode_feed_cursor(decode_feed_cursor(value, self.shards.count))
+
+    def get_changes(self, since: Union[int, str] = 0, limit: int = DEFAULT_PAGE_SIZE,
+                    wait: float = 0) -> Tuple[List[ShardedChange], str, bool]:
+        """Return ``(changes, cursor, has_more)`` merged from every shard's change log.
+
+        ``since`` and ``cursor`` are feed tokens (see encode_feed_cursor).
+        Entries are ordered by time across shards and by commit within one;
+        each entry's ``id`` is the token to resume right after it.
+        """
+        cursors = decode_feed_cursor(since, self.shards.count)
+
+        def fetch(index: int, engine: Engine) -> List[Any]:
+            with engine.connect() as conn:
+                return conn.execute(changes_select(cursors[index], limit)).all()
+
+        deadline = time.monotonic() + wait
+        while True:
+            sequence = self.notifier.sequence
+            pages = self.shards.scatter(fetch)
+            remaining = deadline - time.monotonic()
+            if any(pages) or remaining <= 0:
+                break
+            self.notifier.wait(sequence, min(remaining, CHANGES_POLL_INTERVAL))
+
+        # heapq.merge keeps each shard's entries in commit order, so taking
+        # the first ``limit`` advances every shard's cursor over a prefix
+        merged = heapq.merge(*([(change.changed_at, index, change) for change in page]
+                               for index, page in enumerate(pages)), key=lambda entry: entry[:2])
+        changes = []
+        for _, index, change in itertools.islice(merged, limit):
+            cursors[index] = change.id
+            changes.append(ShardedChange(encode_feed_cursor(cursors), change.user_id, change.op,
+                                         change.username, change.email, change.changed_at))
+        return changes, encode_feed_cursor(cursors), sum(len(page) for page in pages) > limit
+
+    def export_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield every shard's users as NDJSON chunks, one shard after another."""
+        for engine in self.shards.engines:
+            after_id = 0
+            while True:
+                with engine.connect() as conn:
+                    rows = conn.execute(export_select(after_id, chunk_size)).all()
+                if not rows:
+                    break
+                yield ('\n'.join(line for _, line in rows) + '\n').encode()
+                after_id = rows[-1][0]
+
+    def search_users(self, query: str, mode: str = 'prefix', field: str = 'username',
+                     after_id: Optional[int] = None,
+                     limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[User], Optional[int]]:
+        logger.debug("Searching users - mode: %s, field: %s, after_id: %s, limit: %d",
+                     mode, field, after_id, limit)
+        anchor_key = None
+        key: Callable[[User], Any] = attrgetter('id')
+        if mode == 'prefix':
+            if after_id is not None:
+                # Only the anchor's own shard can resolve the cursor
+                with self.shards.engine_for(after_id).connect() as conn:
+                    anchor_key = conn.scalar(select(func.lower(getattr(User, field))).where(User.id == after_id))
+                if anchor_key is None:
+                    return [], None
+            # Merge on the same key the shards ordered by
+            key = lambda user: (ascii_lower(getattr(user, field)), user.id)  # noqa: E731
+        stmt = search_select(query, mode, field, after_id, limit, anchor_key=anchor_key)
+        users = list(itertools.islice(self._gather(stmt, key=key), limit + 1))
+        return split_page(users, limit)
+
+    def iter_users(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[User]:
+        """Iterate over all users in id order, merging one streaming cursor per shard."""
+        logger.debug("Streaming all users - chunk_size: %d", chunk_size)
+
+        def stream(engine: Engine) -> Iterator[User]:
+            with Session(engine) as session:
+                yield from session.scalars(select(User).order_by(User.id).execution_options(
+                    yield_per=chunk_size))
+
+        yield from heapq.merge(*(stream(engine) for engine in self.shards.engines), key=attrgetter('id'))
+
+
+def _copy_users(source: Engine, target: ShardSet, chunk_size: int, build_directory: bool) -> int:
+    stmt = select(User.id, User.username, User.email, User.password_hash).order_by(User.id).limit(chunk_size)
+    copied = after_id = 0
+    while True:
+        with source.connect() as conn:
+            rows = [dict(row) for row in conn.execute(stmt.where(User.id > after_id)).mappings()]
+        if not rows:
+            return copied
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_shard.setdefault(target.shard_for(row['id']), []).append(row)
+
+        def insert_shard(index: int, engine: Engine) -> None:
+            with engine.begin() as conn:
+                conn.execute(insert(User), by_shard[index])
+
+        target.scatter(insert_shard, by_shard)
+        if build_directory:
+            now = time.time()
+            with target.directory_engine.begin() as conn:
+                conn.execute(insert(user_directory), [{
+                    'user_id': row['id'], 'username': row['username'], 'email': row['email'],
+                    'pending': 0, 'claimed_at': now
+                } for row in rows])
+        copied += len(rows)
+        after_id = rows[-1]['id']
+        logger.debug("Copied %d users into %d shards", copied, target.count)
+
+
+def rebalance_shards(path: str, target_count: int, source_count: Optional[int] = None,
+                     source_engine: Optional[Engine] = None,
+                     chunk_size: int = REBALANCE_CHUNK_SIZE) -> int:
+    """Copy every user into a layout of ``target_count`` shards under ``path``.
+
+    The source is either the ``source_count`` layout in the same path, whose
+    directory is reused as is, or the single database behind
+    ``source_engine``, in which case the directory is built too. Writes must
+    be stopped while it runs. Source files are left untouched. Returns the
+    number of users copied.
+    """
+    if (source_count is None) == (source_engine is None):
+        raise ValueError('Exactly one of source_count or source_engine is required')
+    if source_count == target_count:
+        raise ValueError(f'The data is already in {target_count} shards')
+    existing = [name for name in (shard_filename(i, target_count) for i in range(target_count))
+                if os.path.exists(os.path.join(path, name))]
+    if existing:
+        raise FileExistsError(f"Target shard files already exist: {', '.join(existing)}")
+
+    target = ShardSet(path, target_count)
+    try:
+        if source_engine is not None:
+            with target.directory_engine.connect() as conn:
+                if conn.scalar(select(func.count()).select_from(user_directory)):
+                    raise ValueError(f'{DIRECTORY_FILENAME} in {path} is not empty')
+            return _copy_users(source_engine, target, chunk_size, build_directory=True)
+
+        source = ShardSet(path, source_count)
+        try:
+            copied = sum(_copy_users(engine, target, chunk_size, build_directory=False)
+                         for engine in source.engines)
+        finally:
+            source.dispose()
+        logger.info("Rebalanced %d users from %d to %d shards", copied, source_count, target_count)
+        return copied
+    finally:
+        target.dispose()
+
+
+def import_users_sharded(shards: ShardSet, lines: Iterable[str],
+                         chunk_size: int = IMPORT_CHUNK_SIZE) -> Tuple[int, int]:
+    """transfer.import_users for sharded storage.
+
+    Each chunk claims its IDs, usernames and emails in the directory, writes
+    the claimed rows to the shards their IDs map to and settles the claims,
+    like a bulk create. Rows whose ID or names are already taken, or that
+    lack a required field, are skipped. Returns ``(inserted, skipped)``.
+    """
+    inserted = skipped = 0
+    lines = (line for line in lines if line.strip())
+    while True:
+        chunk: List[str] = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return inserted, skipped
+        rows = '[' + ','.join(chunk) + ']'
+        with shards.directory_engine.begin() as conn:
+            claimed = list(conn.execute(DIRECTORY_IMPORT_STATEMENT, {'rows': rows, 'now': time.time()}).scalars())
+        by_shard: Dict[int, List[int]] = {}
+        for user_id in claimed:
+            by_shard.setdefault(shards.shard_for(user_id), []).append(user_id)
+
+        def insert_shard(index: int, engine: Engine) -> List[int]:
+            with engine.begin() as conn:
+                return list(conn.execute(SHARD_IMPORT_STATEMENT, {
+                    'rows': rows, 'ids': '[' + ','.join(map(str, by_shard[index])) + ']'}).scalars())
+
+        written: List[int] = []
+        try:
+            for ids in shards.scatter(insert_shard, by_shard):
+                written.extend(ids)
+        finally:
+            # Claims whose row was not written (or whose shard failed) are released
+            shards.settle(written, sorted(set(claimed) - set(written)))
+        inserted += len(written)
+        skipped += len(chunk) - len(written)
+        logger.debug("Imported chunk into shards - inserted: %d, skipped: %d",
+                     len(written), len(chunk) - len(written))
+
+
+def register_shard_commands(app, db) -> None:
+    @app.cli.command('rebalance-shards')
+    @click.option('--to', 'target_count', type=int, required=True, help='New number of shards.')
+    @click.option('--chunk-size', default=REBALANCE_CHUNK_SIZE, show_default=True,
+                  help='Users copied per batch.')
+    def rebalance_shards_command(target_count: int, chunk_size: int) -> None:
+        """Copy users into SERVICE_A_SHARD_DIR with a different shard count.
+
+        Stop writes first. The source is the SERVICE_A_SHARDS layout, or the
+        single database when sharding is off. Old files are left in place;
+        restart with SERVICE_A_SHARDS set to the new count afterwards.
+        """
+        if target_count < 2:
+            raise click.ClickException('--to must be at least 2; use export and import-users to unshard')
+        source_count = app.config.get('SERVICE_A_SHARDS') or 0
+        path = app.config['SERVICE_A_SHARD_DIR']
+        try:
+            if source_count > 1:
+                copied = rebalance_shards(path, target_count, source_count=source_count, chunk_size=chunk_size)
+            else:
+                copied = rebalance_shards(path, target_count, source_engine=db.engine, chunk_size=chunk_size)
+        except (ValueError, FileExistsError) as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Copied {copied} users into {target_count} shards in {path}")
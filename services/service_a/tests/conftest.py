@@ -12,6 +12,7 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 from services.service_a.src.models import db, UserRepository
+from services.service_a.src.query_accounting import QueryBudget, account_engine, instrument_repository
 from services.service_a.src.routes import register_routes
 
 @pytest.fixture
@@ -35,6 +36,7 @@ def app():
 
         # Create user repository
         user_repository = UserRepository(db)
+        app.extensions['user_repository'] = user_repository
         # Register routes
         register_routes(app, user_repository)
 
@@ -61,5 +63,12 @@ def runner(app):
 def user_repository(app):
     """User repository instance for testing."""
     logger.debug("Creating user repository for tests")
-    with app.app_context():
-        return UserRepository(db)
\ No newline at end of file
+    return app.extensions['user_repository']
+
+@pytest.fixture
+def query_budget(app, user_repository):
+    """QueryBudget for the app's engine: ``with query_budget(2) as log:`` fails the
+    test when the block runs more than 2 SQL statements."""
+    account_engine(db.engine)
+    instrument_repository(user_repository)
+    return QueryBudget
@@ -0,0 +1,189 @@
+import pytest
+import threading
+import time
+from flask import Flask
+from services.service_a.src.admission import (
+    DEADLINE_HEADER, ConcurrencyLimiter, init_admission_control, render_admission_metrics
+)
+from services.service_a.src.hashing import SyncHasher
+from services.service_a.src.metrics import create_registry
+from services.service_a.src.models import UserRepository, db
+from services.service_a.src.routes import INTERNAL_API_KEY, register_routes
+
+
+class BlockingHasher(SyncHasher):
+    """Hashes only once ``release`` is set, to hold requests in flight."""
+
+    def __init__(self):
+        super().__init__('pbkdf2:sha256:1000')
+        self.release = threading.Event()
+
+    def hash_password(self, password):
+        assert self.release.wait(10)
+        return super().hash_password(password)
+
+
+@pytest.fixture
+def admission_app(tmp_path):
+    """App allowing one create at a time with room for one more to wait, one bulk
+    request, one batch lookup and one long-poll."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'users.sqlite'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user_repository = UserRepository(db, hasher=BlockingHasher())
+        app.extensions['user_repository'] = user_repository
+        register_routes(app, user_repository)
+        init_admission_control(app, {'hashing': (1, 1), 'bulk': (1, 0), 'lookup': (1, 0),
+                                     'longpoll': (1, 0)},
+                               max_wait_ms=5000, registry=create_registry())
+        yield app
+        user_repository.hasher.release.set()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def _post_user(app, name, headers=None):
+    return app.test_client().post('/api/users', headers=headers, json={
+        'username': name, 'email': f'{name}@example.com', 'password': 'password123'})
+
+
+def _post_in_background(app, name, statuses):
+    thread = threading.Thread(target=lambda: statuses.append(_post_user(app, name).status_code))
+    thread.start()
+    return thread
+
+
+def test_limiter_sheds_when_queue_full_or_deadline_passes():
+    """Test a busy limiter queues up to its size and sheds the rest"""
+    limiter = ConcurrencyLimiter('hashing', limit=1, queue_size=1)
+    assert limiter.acquire(0) is None
+    assert limiter.acquire(0.01) == 'deadline'
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(limiter.acquire(5)))
+    waiter.start()
+    _wait_for(lambda: limiter.waiting == 1)
+    assert limiter.acquire(5) == 'queue_full'
+    limiter.release()
+    waiter.join()
+
+    assert admitted == [None]
+    assert limiter.acquire(-1) == 'deadline'
+    assert limiter.stats() == {'limit': 1, 'queue_size': 1, 'in_flight': 1, 'waiting': 0,
+                               'queued_total': 2, 'shed_total': {'queue_full': 1, 'deadline': 2}}
+
+
+def test_overload_sheds_creates_and_keeps_reads_fast(admission_app):
+    """Test creates beyond the limit and queue get a fast 503 while reads still succeed"""
+    limiters = admission_app.extensions['admission']
+    statuses = []
+    threads = [_post_in_background(admission_app, 'first', statuses)]
+    _wait_for(lambda: limiters['hashing'].in_flight == 1)
+    threads.append(_post_in_background(admission_app, 'second', statuses))
+    _wait_for(lambda: limiters['hashing'].waiting == 1)
+
+    start = time.perf_counter()
+    response = _post_user(admission_app, 'third')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert admission_app.test_client().get('/api/users').status_code == 200
+    assert time.perf_counter() - start < 1
+
+    admission_app.extensions['user_repository'].hasher.release.set()
+    for thread in threads:
+        thread.join()
+    assert statuses == [201, 201]
+
+    metrics = render_admission_metrics(limiters)
+    assert 'service_a_admission_shed_total{class="hashing",reason="queue_full"} 1' in metrics
+    assert 'service_a_admission_queued_total{class="hashing"} 1' in metrics
+    assert 'service_a_admission_in_flight{class="hashing"} 0' in metrics
+
+
+def test_request_deadline_bounds_queue_wait(admission_app):
+    """Test a queued request is shed once its X-Request-Timeout-Ms budget runs out"""
+    limiters = admission_app.extensions['admission']
+    statuses = []
+    thread = _post_in_background(admission_app, 'first', statuses)
+    _wait_for(lambda: limiters['hashing'].in_flight == 1)
+
+    start = time.perf_counter()
+    response = _post_user(admission_app, 'second', headers={DEADLINE_HEADER: '50'})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 503
+    assert 0.05 <= elapsed < 1
+    assert limiters['hashing'].stats()['shed_total']['deadline'] == 1
+
+    admission_app.extensions['user_repository'].hasher.release.set()
+    thread.join()
+    assert statuses == [201]
+
+
+def test_request_deadline_caps_changes_long_poll(admission_app):
+    """Test a long-poll returns when the caller's deadline is reached, not after ``wait``"""
+    start = time.perf_counter()
+    response = admission_app.test_client().get('/internal/api/users/changes?wait=10', headers={
+        'X-Internal-API-Key': INTERNAL_API_KEY, DEADLINE_HEADER: '100'})
+    assert response.status_code == 200
+    assert response.json['changes'] == []
+    assert time.perf_counter() - start < 2
+
+
+def test_long_polls_limited_to_their_own_class(admission_app):
+    """Test change feed long-polls past their limit are shed at once instead of holding threads"""
+    limiters = admission_app.extensions['admission']
+    user_repository = admission_app.extensions['user_repository']
+    headers = {'X-Internal-API-Key': INTERNAL_API_KEY}
+    statuses = []
+    thread = threading.Thread(target=lambda: statuses.append(admission_app.test_client().get(
+        '/internal/api/users/changes?wait=5', headers=headers).status_code))
+    thread.start()
+    _wait_for(lambda: limiters['longpoll'].in_flight == 1)
+
+    start = time.perf_counter()
+    response = admission_app.test_client().get('/internal/api/users/changes?wait=5', headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert admission_app.test_client().get('/api/users').status_code == 200
+    assert time.perf_counter() - start < 1
+
+    user_repository.hasher.release.set()
+    user_repository.create_user('testuser', 'test@example.com', 'password123')
+    thread.join()
+    assert statuses == [200]
+    assert limiters['longpoll'].stats()['shed_total']['queue_full'] == 1
+
+
+def test_batch_lookups_not_shed_behind_an_export(admission_app):
+    """Test a streaming export holding the bulk class leaves internal batch lookups admitted"""
+    limiters = admission_app.extensions['admission']
+    user_repository = admission_app.extensions['user_repository']
+    user_repository.hasher.release.set()
+    user = user_repository.create_user('testuser', 'test@example.com', 'password123')
+    headers = {'X-Internal-API-Key': INTERNAL_API_KEY}
+    client = admission_app.test_client()
+
+    export = client.get('/internal/api/users/export', headers=headers, buffered=False)
+    assert export.status_code == 200
+    assert limiters['bulk'].in_flight == 1
+
+    response = client.post('/internal/api/users/batch', headers=headers, json={'user_ids': [user.id]})
+    assert response.status_code == 200
+    assert [u['id'] for u in response.json['users']] == [user.id]
+    assert client.post('/api/users/bulk', json={'users': []}).status_code == 503
+
+    export.close()
+    assert limiters['bulk'].in_flight == 0
+    assert limiters['lookup'].stats()['shed_total'] == {'queue_full': 0, 'deadline': 0}
@@ -0,0 +1,150 @@
+import click
+import os
+import subprocess
+import sys
+from sqlalchemy import create_engine
+from services.service_a.src.app import create_app
+from services.service_a.src.models import db
+from services.service_a.src.schema import ensure_schema, schema_fingerprint
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
+def _config(tmp_path):
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'users.sqlite'}",
+        'PASSWORD_HASHER': 'sync',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'TESTING': True,
+    }
+
+
+def _dispose(app):
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+        if 'read_engine' in app.extensions:
+            app.extensions['read_engine'].dispose()
+
+
+def test_create_app_defers_schema_check_to_first_request(tmp_path):
+    """Test startup opens no database and /ready reports the timed startup phases"""
+    app = create_app(_config(tmp_path))
+    try:
+        assert not (tmp_path / 'users.sqlite').exists()
+        assert app.extensions['schema_bootstrap'].ready is False
+        assert 'migrate' not in app.extensions
+
+        response = app.test_client().get('/ready')
+        assert response.status_code == 200
+        assert response.json['status'] == 'ready'
+        assert response.json['schema']['bootstrapped'] is True
+        assert set(response.json['startup']['phases_ms']) == {
+            'extensions', 'engines', 'repository', 'routes', 'instrumentation'}
+
+        client = app.test_client()
+        assert client.post('/api/users', json={
+            'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'}).status_code == 201
+    finally:
+        _dispose(app)
+
+    restarted = create_app(_config(tmp_path))
+    try:
+        response = restarted.test_client().get('/ready')
+        assert response.json['schema']['bootstrapped'] is False
+        assert restarted.test_client().get('/api/users/1').json['username'] == 'testuser'
+    finally:
+        _dispose(restarted)
+
+
+def test_create_app_under_cli_loads_migrate_and_checks_schema(tmp_path):
+    """Test apps built by the flask CLI get Flask-Migrate and a checked schema up front"""
+    with click.Context(click.Command('flask')):
+        app = create_app(_config(tmp_path))
+    try:
+        assert 'migrate' in app.extensions
+        assert app.extensions['schema_bootstrap'].ready is True
+        assert 'schema' in app.extensions['startup'].phases
+    finally:
+        _dispose(app)
+
+
+def test_ready_returns_503_when_schema_check_fails(tmp_path):
+    """Test readiness and requests fail fast while the database is unusable"""
+    config = _config(tmp_path)
+    config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'missing' / 'users.sqlite'}"
+    app = create_app(config)
+    try:
+        client = app.test_client()
+        assert client.get('/ready').status_code == 503
+        assert client.get('/api/users').status_code == 503
+        (tmp_path / 'missing').mkdir()
+        assert client.get('/ready').status_code == 200
+    finally:
+        _dispose(app)
+
+
+def test_ensure_schema_stamps_fingerprint(tmp_path):
+    """Test the bootstrap runs once per schema fingerprint"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.sqlite'}")
+    try:
+        with engine.begin() as conn:
+            assert ensure_schema(conn) is True
+        with engine.begin() as conn:
+            assert conn.exec_driver_sql('PRAGMA user_version').scalar() == schema_fingerprint()
+            assert ensure_schema(conn) is False
+            conn.exec_driver_sql('PRAGMA user_version = 1')
+        with engine.begin() as conn:
+            assert ensure_schema(conn) is True
+    finally:
+        engine.dispose()
+
+
+def test_apps_report_into_their_own_metrics_registry(tmp_path):
+    """Test a second app in the same process neither repeats metric families nor shares counts"""
+    first = create_app(_config(tmp_path))
+    second = create_app(_config(tmp_path))
+    try:
+        assert first.extensions['metrics'] is not second.extensions['metrics']
+        first.test_client().get('/api/users/1')
+        text = second.test_client().get('/metrics').data.decode()
+        assert text.count('# TYPE service_a_user_cache_hits_total counter') == 1
+        assert text.count('# TYPE service_a_http_requests_total counter') == 1
+        assert 'route="/api/users/<int:user_id>"' not in text
+        assert 'route="/api/users/<int:user_id>"' in first.test_client().get('/metrics').data.decode()
+    finally:
+        _dispose(first)
+        _dispose(second)
+
+
+def test_group_commit_batch_capped_by_hashing_admission(tmp_path):
+    """Test a group commit batch is sized to the creates admission lets hash at once"""
+    config = dict(_config(tmp_path), USER_GROUP_COMMIT=True, ADMISSION_HASHING_CONCURRENCY=4)
+    app = create_app(config)
+    try:
+        assert app.extensions['user_repository'].group_commit.max_batch == 4
+    finally:
+        app.extensions['user_repository'].group_commit.shutdown()
+        _dispose(app)
+
+
+def test_group_commit_ignored_with_warning_when_sharded(tmp_path, caplog):
+    """Test sharded mode logs that USER_GROUP_COMMIT does not apply instead of dropping it silently"""
+    config = dict(_config(tmp_path), USER_GROUP_COMMIT=True, SERVICE_A_SHARDS=2,
+                  SERVICE_A_SHARD_DIR=str(tmp_path / 'shards'))
+    app = create_app(config)
+    try:
+        assert app.extensions['user_repository'].group_commit is None
+        assert 'USER_GROUP_COMMIT is ignored with SERVICE_A_SHARDS=2' in caplog.text
+    finally:
+        app.extensions['user_repository'].shards.dispose()
+        _dispose(app)
+
+
+def test_package_import_is_lazy():
+    """Test importing a submodule does not load Flask-SQLAlchemy through the package"""
+    code = ('import sys, services.service_a.src.cache; '
+            'print("flask_sqlalchemy" in sys.modules, "flask_migrate" in sys.modules)')
+    output = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.split() == ['False', 'False']
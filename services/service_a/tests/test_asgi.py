@@ -0,0 +1,251 @@
+"""Run the route tests against the ASGI serving mode.
+
+The route tests are imported from test_routes and collected again here with
+``app`` and ``client`` overridden: the database lives in a temp file so the
+synchronous ``user_repository`` fixture used for seeding and the async
+repository behind the ASGI app see the same rows.
+"""
+import asyncio
+import json
+import pytest
+from urllib.parse import parse_qsl
+
+pytest.importorskip('quart')
+pytest.importorskip('aiosqlite')
+
+from flask import Flask
+from quart import Quart
+from sqlalchemy.ext.asyncio import create_async_engine
+from services.service_a.src.asgi import register_async_routes
+from services.service_a.src.async_repository import AsyncUserRepository
+from services.service_a.src.models import db, UserRepository
+from services.service_a.src.routes import register_routes
+from services.service_a.tests.test_routes import (  # noqa: F401
+    test_get_users_empty, test_get_users, test_get_user, test_get_user_not_found,
+    test_create_user, test_create_user_duplicate_username, test_internal_verify_user,
+    test_internal_verify_user_unauthorized, test_internal_users_batch,
+    test_internal_users_batch_invalid_ids, test_get_users_paginated,
+    test_get_users_paginated_invalid_limit, test_get_users_stream, test_get_users_stream_empty,
+    test_create_users_bulk, test_create_users_bulk_invalid_body, test_internal_user_cache_stats,
+    test_get_users_etag_not_modified, test_get_user_etag_changes_after_write,
+    test_get_user_not_found_has_no_etag, test_internal_verify_user_fields,
+    test_internal_users_batch_fields, test_internal_users_batch_msgpack, test_search_users_prefix,
+    test_search_users_prefix_paginated, test_search_users_prefix_non_ascii,
+    test_search_users_prefix_max_code_point,
+    test_search_users_substring, test_search_users_invalid_params,
+    test_internal_user_ids_snapshot_and_delta, test_internal_user_ids_requires_auth,
+    test_internal_user_changes_feed, test_internal_user_changes_invalid_params,
+    test_internal_users_export
+)
+
+
+class _Response:
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+
+    @property
+    def json(self):
+        return json.loads(self.data) if self.data else None
+
+
+class SyncQuartClient:
+    """Blocking facade over Quart's test client with the Flask client's call shape."""
+
+    def __init__(self, app: Quart, loop: asyncio.AbstractEventLoop):
+        self._client = app.test_client()
+        self._loop = loop
+
+    def _open(self, method, path, data=None, content_type=None, headers=None):
+        path, _, query = path.partition('?')
+        headers = dict(headers or {})
+        if content_type:
+            headers['Content-Type'] = content_type
+
+        async def call():
+            response = await self._client.open(
+                path, method=method, data=data, headers=headers,
+                query_string=dict(parse_qsl(query, keep_blank_values=True)))
+            return _Response(response.status_code, response.headers, await response.get_data())
+
+        return self._loop.run_until_complete(call())
+
+    def get(self, path, **kwargs):
+        return self._open('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self._open('POST', path, **kwargs)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Flask app on a temp-file database, used only for seeding through UserRepository."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'users.sqlite'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user_repository = UserRepository(db)
+        app.extensions['user_repository'] = user_repository
+        register_routes(app, user_repository)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    """ASGI app sharing the database and cache with the seeding repository."""
+    loop = asyncio.new_event_loop()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'users.sqlite'}")
+    seed_repository = app.extensions['user_repository']
+    async_repository = AsyncUserRepository(engine, cache=seed_repository.cache)
+
+    quart_app = Quart(__name__)
+    register_async_routes(quart_app, async_repository)
+    yield SyncQuartClient(quart_app, loop)
+
+    loop.run_until_complete(engine.dispose())
+    loop.close()
+
+
+def test_async_repository_verify_password(app, tmp_path):
+    """Test password verification is offloaded and returns the right answer"""
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'users.sqlite'}")
+        repository = AsyncUserRepository(engine)
+        try:
+            user = await repository.create_user("testuser", "test@example.com", "password123")
+            assert await repository.verify_password(user, "password123") is True
+            assert await repository.verify_password(user, "wrongpassword") is False
+            found, missing = await repository.get_users_by_ids([user.id, 999])
+            assert [u.id for u in found] == [user.id]
+            assert missing == [999]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_async_verify_calls_run_concurrently(app, client, user_repository):
+    """Test many concurrent verify calls complete on one event loop"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    async def burst():
+        return await asyncio.gather(*(
+            client._client.get(f'/internal/api/users/verify/{user.id}',
+                               headers={'X-Internal-API-Key': 'dev_internal_key_123'})
+            for _ in range(200)
+        ))
+
+    responses = client._loop.run_until_complete(burst())
+    assert all(response.status_code == 200 for response in responses)
+
+
+AUTH = {'X-Internal-API-Key': 'dev_internal_key_123'}
+
+# (method, path, JSON body, headers): each is answered identically by both apps
+PARITY_REQUESTS = [
+    ('GET', '/api/users', None, {}),
+    ('GET', '/api/users?limit=1', None, {}),
+    ('GET', '/api/users?limit=0', None, {}),
+    ('GET', '/api/users?after_id=x', None, {}),
+    ('GET', '/api/users/1', None, {}),
+    ('GET', '/api/users/999', None, {}),
+    ('GET', '/api/users/search?q=ali', None, {}),
+    ('GET', '/api/users/search?q=ali&mode=regex', None, {}),
+    ('POST', '/api/users', {'username': 'alice', 'email': 'other@example.com', 'password': 'password123'}, {}),
+    ('POST', '/api/users', {'username': 'carol'}, {}),
+    ('POST', '/api/users', ['not', 'an', 'object'], {}),
+    ('POST', '/api/users/bulk', {'users': 'nope'}, {}),
+    ('POST', '/api/users/bulk', {'users': [{'username': 'bob', 'email': 'b@example.com', 'password': 'pw'}]}, {}),
+    ('GET', '/internal/api/users/verify/1', None, {}),
+    ('GET', '/internal/api/users/verify/1', None, AUTH),
+    ('GET', '/internal/api/users/verify/1?fields=email', None, AUTH),
+    ('GET', '/internal/api/users/verify/1?fields=password_hash', None, AUTH),
+    ('GET', '/internal/api/users/verify/999', None, AUTH),
+    ('POST', '/internal/api/users/batch', {'user_ids': [2, 1, 999, 1]}, AUTH),
+    ('POST', '/internal/api/users/batch', {'user_ids': ['1']}, AUTH),
+    ('POST', '/internal/api/users/batch', None, AUTH),
+    ('GET', '/internal/api/users/ids', None, AUTH),
+    ('GET', '/internal/api/users/ids?since=x', None, AUTH),
+    ('GET', '/internal/api/users/changes', None, AUTH),
+    ('GET', '/internal/api/users/changes?limit=1', None, AUTH),
+    ('GET', '/internal/api/users/changes?since=x', None, AUTH),
+    ('GET', '/internal/api/users/changes?wait=5', None, {**AUTH, 'X-Request-Timeout-Ms': '0'}),
+]
+
+
+@pytest.mark.parametrize('method,path,body,headers', PARITY_REQUESTS)
+def test_wsgi_and_asgi_answer_alike(app, client, user_repository, method, path, body, headers):
+    """Test the Flask and Quart apps give the same status and body for the same request"""
+    user_repository.create_user('alice', 'alice@example.com', 'password123')
+    user_repository.create_user('bob', 'bob@example.com', 'password123')
+    kwargs = {'headers': headers}
+    if body is not None:
+        kwargs.update(data=json.dumps(body), content_type='application/json')
+    flask_client = app.test_client()
+
+    wsgi = flask_client.open(path, method=method, **kwargs)
+    asgi = client._open(method, path, **kwargs)
+
+    assert (asgi.status_code, asgi.json) == (wsgi.status_code, wsgi.json)
+
+
+def test_asgi_app_serves_request_metrics(tmp_path):
+    """Test the ASGI app records requests and SQL statements into its own /metrics"""
+    from services.service_a.src.asgi import create_asgi_app
+    quart_app = create_asgi_app(f"sqlite:///{tmp_path / 'asgi.sqlite'}")
+
+    async def scenario():
+        async with quart_app.test_app() as test_app:
+            test_client = test_app.test_client()
+            assert (await test_client.get('/api/users/1')).status_code == 404
+            return await (await test_client.get('/metrics')).get_data(as_text=True)
+
+    text = asyncio.run(scenario())
+    assert 'service_a_http_requests_total{method="GET",route="/api/users/<int:user_id>",status="404"} 1' in text
+    assert 'service_a_sql_statements_total{operation="SELECT"}' in text
+    assert 'service_a_user_cache_misses_total 1' in text
+
+
+def test_import_users_reaches_running_asgi_app(app, runner, user_repository, tmp_path, monkeypatch):
+    """Test the ASGI app drops cached misses and adds IDs the import wrote below its sync point"""
+    from services.service_a.src.asgi import create_asgi_app
+    from services.service_a.src.transfer import gzip_stream, register_commands
+    user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(2)
+    ])
+    backup = tmp_path / 'users.ndjson.gz'
+    backup.write_bytes(b''.join(gzip_stream(user_repository.export_users(2))))
+    db.session.execute(db.text("DELETE FROM users WHERE id = 1"))
+    db.session.commit()
+    monkeypatch.setenv('USER_CACHE_NEGATIVE_TTL', '60')
+    quart_app = create_asgi_app(f"sqlite:///{tmp_path / 'users.sqlite'}")
+
+    async def snapshot(test_client):
+        ids = await test_client.get('/internal/api/users/ids', headers=AUTH)
+        verify = await test_client.get('/internal/api/users/verify/1', headers=AUTH)
+        return (await ids.get_json())['runs'], verify.status_code
+
+    async def scenario():
+        async with quart_app.test_app() as test_app:
+            test_client = test_app.test_client()
+            before = await snapshot(test_client)
+            await asyncio.get_running_loop().run_in_executor(None, lambda: runner.invoke(
+                args=['import-users', str(backup)]))
+            return before, await snapshot(test_client)
+
+    register_commands(app, db)
+    before, after = asyncio.run(scenario())
+    assert before == ([[2, 2]], 404)
+    assert after == ([[1, 2]], 200)
@@ -0,0 +1,52 @@
+from services.service_a.benchmarks.bench_group_commit import measure_creates
+from services.service_a.benchmarks.bench_hashing import measure_method
+from services.service_a.benchmarks.bench_service_a import compare, run_size
+from services.service_a.benchmarks.bench_sharding import measure_shards
+from services.service_a.benchmarks.bench_startup import measure_startup
+
+def test_benchmark_smoke_run():
+    """Test a tiny benchmark run reports every metric per operation"""
+    results = run_size(50, 'memory', 'default', iterations=3,
+                       only=['repo_get_user', 'repo_get_users_by_ids', 'route_batch'])
+    assert set(results) == {'repo_get_user', 'repo_get_users_by_ids', 'route_batch'}
+    for metrics in results.values():
+        assert metrics['throughput_per_s'] > 0
+        assert metrics['p99_ms'] >= metrics['p50_ms']
+        assert metrics['peak_memory_kib'] >= 0
+    assert results['repo_get_users_by_ids']['queries_per_op'] == 1
+
+def test_benchmark_compare_flags_regressions():
+    """Test latency, throughput and query-count regressions beyond the threshold"""
+    baseline = {'sizes': {'1000': {'op': {'p50_ms': 1.0, 'throughput_per_s': 100.0, 'queries_per_op': 1.0}}}}
+    steady = {'sizes': {'1000': {'op': {'p50_ms': 1.1, 'throughput_per_s': 95.0, 'queries_per_op': 1.0}}}}
+    slower = {'sizes': {'1000': {'op': {'p50_ms': 2.0, 'throughput_per_s': 50.0, 'queries_per_op': 3.0}}}}
+
+    assert compare(steady, baseline, threshold=0.25) == []
+    assert len(compare(slower, baseline, threshold=0.25)) == 3
+
+def test_hashing_benchmark_reports_per_core_rates():
+    """Test the hashing benchmark measures single-core and loaded rates"""
+    metrics = measure_method('pbkdf2:sha256:1000', iterations=2, workers=1)
+    assert metrics['hashes_per_s_single_core'] > 0
+    assert metrics['hashes_per_s_per_core_loaded'] > 0
+
+def test_sharding_benchmark_reports_insert_rate():
+    """Test the sharding benchmark inserts every row and reports a rate"""
+    metrics = measure_shards(2, writers=1, rows=20, batch=10)
+    assert metrics['rows'] == 20
+    assert metrics['rows_per_s'] > 0
+
+def test_group_commit_benchmark_reports_create_rate():
+    """Test the group commit benchmark creates every row in both modes"""
+    for group_commit in (False, True):
+        metrics = measure_creates(threads=4, rows=40, group_commit=group_commit)
+        assert metrics['rows'] == 40
+        assert metrics['p99_ms'] >= metrics['p50_ms'] > 0
+
+def test_startup_benchmark_reports_first_response():
+    """Test the startup benchmark times fresh and existing databases to a first response"""
+    results = measure_startup('services.service_a.src.main:app', '/ready', samples=1)
+    assert set(results) == {'fresh', 'existing'}
+    for summary in results.values():
+        assert summary['status'] == 200
+        assert summary['total_ms_p50'] >= summary['import_ms_p50'] > 0
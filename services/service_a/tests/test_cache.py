@@ -0,0 +1,63 @@
+from services.service_a.src.cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_cache_hit_and_miss():
+    """Test basic get/set with hit and miss counters"""
+    cache = TTLCache(max_size=10)
+    assert cache.get(1) == (False, None)
+    cache.set(1, 'one')
+    assert cache.get(1) == (True, 'one')
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_cache_lru_eviction():
+    """Test the least recently used entry is evicted when full"""
+    cache = TTLCache(max_size=2)
+    cache.set(1, 'one')
+    cache.set(2, 'two')
+    cache.get(1)
+    cache.set(3, 'three')
+    assert cache.get(2) == (False, None)
+    assert cache.get(1) == (True, 'one')
+    assert cache.stats()['evictions'] == 1
+
+def test_cache_ttl_expiry():
+    """Test positive and negative entries expire after their TTLs"""
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, negative_ttl=1, clock=clock)
+    cache.set(1, 'one')
+    cache.set(2, None)
+    assert cache.get(2) == (True, None)
+
+    clock.now = 5
+    assert cache.get(1) == (True, 'one')
+    assert cache.get(2) == (False, None)
+
+    clock.now = 11
+    assert cache.get(1) == (False, None)
+    assert cache.stats()['expirations'] == 2
+
+def test_cache_invalidate():
+    """Test invalidation removes a single entry"""
+    cache = TTLCache()
+    cache.set(1, 'one')
+    cache.invalidate(1)
+    assert cache.get(1) == (False, None)
+    assert cache.stats()['invalidations'] == 1
+
+def test_cache_zero_negative_ttl_stores_no_misses():
+    """Test a negative TTL of 0 leaves unknown keys uncached and drops a stale entry"""
+    cache = TTLCache(negative_ttl=0)
+    cache.set(1, None)
+    assert cache.get(1) == (False, None)
+    cache.set(2, 'two')
+    cache.set(2, None)
+    assert cache.get(2) == (False, None)
+    assert cache.stats()['size'] == 0
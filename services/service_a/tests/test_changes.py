@@ -0,0 +1,50 @@
+import threading
+import time
+from services.service_a.src.changes import ChangeNotifier, parse_changes_args
+
+def test_parse_changes_args_defaults():
+    """Test defaults for the change feed parameters"""
+    assert parse_changes_args({}) == (0, 100, 0.0)
+    assert parse_changes_args({'since': '7', 'limit': '5', 'wait': '1.5'}) == (7, 5, 1.5)
+
+def test_change_notifier_wakes_waiters():
+    """Test a notify() ends a wait early"""
+    notifier = ChangeNotifier()
+    sequence = notifier.sequence
+    timer = threading.Timer(0.05, notifier.notify)
+    timer.start()
+    started = time.monotonic()
+    notifier.wait(sequence, 5)
+    assert time.monotonic() - started < 2
+    timer.join()
+
+def test_change_notifier_does_not_miss_earlier_notify():
+    """Test a notify() between reading the sequence and waiting is not lost"""
+    notifier = ChangeNotifier()
+    sequence = notifier.sequence
+    notifier.notify()
+    started = time.monotonic()
+    notifier.wait(sequence, 5)
+    assert time.monotonic() - started < 1
+
+def test_change_notifier_times_out():
+    """Test wait() returns after the timeout without a notify()"""
+    notifier = ChangeNotifier()
+    started = time.monotonic()
+    notifier.wait(notifier.sequence, 0.05)
+    assert time.monotonic() - started >= 0.05
+
+def test_change_log_backfills_existing_users(app, user_repository):
+    """Test adding the change log to a populated database records existing users"""
+    from services.service_a.src.changes import create_change_log_triggers
+    from services.service_a.src.models import db, User
+    user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TRIGGER user_changes_ai")
+        conn.exec_driver_sql("DROP TRIGGER user_changes_au")
+        conn.exec_driver_sql("DELETE FROM user_changes")
+        create_change_log_triggers(conn, User.__table__)
+        create_change_log_triggers(conn, User.__table__)
+
+    changes, cursor, has_more = user_repository.get_changes()
+    assert [(c.op, c.username) for c in changes] == [('create', 'testuser')]
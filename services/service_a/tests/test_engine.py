@@ -0,0 +1,56 @@
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from services.service_a.src.engine import init_engine_profile
+from services.service_a.src.models import db, UserRepository
+
+@pytest.fixture
+def production_app(tmp_path):
+    """App on a temp-file database with the production engine profile."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'users.sqlite'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_ENGINE_PROFILE'] = 'production'
+    db.init_app(app)
+
+    with app.app_context():
+        read_session = init_engine_profile(app, db)
+        db.create_all()
+        app.extensions['user_repository'] = UserRepository(db, read_session=read_session)
+        yield app
+        db.session.remove()
+        read_session.remove()
+        app.extensions['read_engine'].dispose()
+        db.engine.dispose()
+
+def test_production_profile_sets_pragmas(production_app):
+    """Test WAL and tuned pragmas are applied on connect"""
+    assert db.session.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+    assert db.session.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+def test_production_profile_reads_use_read_only_pool(production_app):
+    """Test repository reads go through the read-only session and see commits"""
+    repository = production_app.extensions['user_repository']
+    user = repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    assert repository.read_session is not db.session
+    assert repository.get_user(user.id).username == "testuser"
+    with pytest.raises(OperationalError):
+        repository.read_session.execute(text("DELETE FROM users"))
+
+def test_default_profile_shares_session(app):
+    """Test the default profile leaves reads on db.session"""
+    with app.app_context():
+        assert init_engine_profile(app, db) is None
+
+def test_unknown_profile_rejected(app):
+    """Test an unknown profile name is a configuration error"""
+    app.config['SQLITE_ENGINE_PROFILE'] = 'turbo'
+    with pytest.raises(ValueError):
+        init_engine_profile(app, db)
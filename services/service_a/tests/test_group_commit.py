@@ -0,0 +1,159 @@
+import pytest
+import threading
+import time
+from flask import Flask, g
+from sqlalchemy.exc import IntegrityError
+from services.service_a.src.admission import init_admission_control
+from services.service_a.src.group_commit import GroupCommitTimeout, GroupCommitWriter
+from services.service_a.src.hashing import SyncHasher
+from services.service_a.src.metrics import create_registry
+from services.service_a.src.models import User, UserRepository, bulk_insert_statement, db
+from services.service_a.src.routes import register_routes
+
+HASHER = SyncHasher('pbkdf2:sha256:1000')
+
+
+@pytest.fixture
+def group_app(tmp_path):
+    """App whose repository writes single creates through a group commit writer."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'users.sqlite'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        writer = GroupCommitWriter(db.engine, bulk_insert_statement(), window_ms=50)
+        user_repository = UserRepository(db, hasher=HASHER, group_commit=writer)
+        app.extensions['user_repository'] = user_repository
+        register_routes(app, user_repository)
+        yield app
+        writer.shutdown()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _record_batches(writer):
+    sizes = []
+    write = writer._write
+
+    def recording_write(conn, rows):
+        sizes.append(len(rows))
+        return write(conn, rows)
+    writer._write = recording_write
+    return sizes
+
+
+def _create_concurrently(user_repository, names):
+    """Create one user per name from parallel threads that finish hashing together."""
+    barrier = threading.Barrier(len(names))
+    outcomes = {}
+
+    class BarrierHasher(SyncHasher):
+        def hash_password(self, password):
+            barrier.wait()
+            return HASHER.hash_password(password)
+
+    user_repository.hasher = BarrierHasher(HASHER.method)
+
+    def create(i, name):
+        try:
+            outcomes[i] = user_repository.create_user(name, f'{name}-{i}@example.com', 'password123')
+        except Exception as e:
+            outcomes[i] = e
+    threads = [threading.Thread(target=create, args=(i, name)) for i, name in enumerate(names)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [outcomes[i] for i in range(len(names))]
+
+
+def test_concurrent_creates_share_commits(group_app):
+    """Test a burst of creates is written in fewer transactions than requests"""
+    user_repository = group_app.extensions['user_repository']
+    sizes = _record_batches(user_repository.group_commit)
+
+    users = _create_concurrently(user_repository, [f'user{i}' for i in range(16)])
+
+    assert all(isinstance(user, User) for user in users)
+    assert len({user.id for user in users}) == 16
+    assert sum(sizes) == 16 and len(sizes) < 16
+    response = group_app.test_client().get(f'/api/users/{users[3].id}')
+    assert response.json['username'] == 'user3'
+
+
+def test_conflicting_create_fails_alone(group_app):
+    """Test a unique conflict in a batch is reported only to its own caller"""
+    user_repository = group_app.extensions['user_repository']
+    user_repository.create_user('taken', 'taken@example.com', 'password123')
+    sizes = _record_batches(user_repository.group_commit)
+
+    outcomes = _create_concurrently(user_repository, ['a', 'taken', 'b', 'b', 'c'])
+
+    assert isinstance(outcomes[1], IntegrityError)
+    assert isinstance(outcomes[2], User) != isinstance(outcomes[3], User)
+    assert sum(isinstance(outcome, User) for outcome in outcomes) == 3
+    assert sum(sizes) == 5
+    with group_app.app_context():
+        assert db.session.query(User).count() == 4
+
+
+def test_create_route_through_group_commit(group_app):
+    """Test the create route behaves the same with group commit enabled"""
+    client = group_app.test_client()
+    payload = {'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'}
+
+    response = client.post('/api/users', json=payload)
+    assert response.status_code == 201
+    assert client.get(f"/api/users/{response.json['id']}").json['email'] == 'test@example.com'
+    assert client.post('/api/users', json=payload).status_code == 400
+
+
+def test_shutdown_writes_queued_rows_then_rejects(group_app):
+    """Test shutdown stops the writer and later creates fail fast"""
+    user_repository = group_app.extensions['user_repository']
+    user_repository.create_user('first', 'first@example.com', 'password123')
+
+    user_repository.group_commit.shutdown()
+
+    with pytest.raises(RuntimeError):
+        user_repository.create_user('second', 'second@example.com', 'password123')
+
+
+def test_create_times_out_behind_a_stuck_batch(group_app):
+    """Test a caller stops waiting at its deadline and its queued row is never written"""
+    user_repository = group_app.extensions['user_repository']
+    writer = user_repository.group_commit
+    init_admission_control(group_app, {}, registry=create_registry())
+    entered, release = threading.Event(), threading.Event()
+    write = writer._write
+
+    def stuck_write(conn, rows):
+        entered.set()
+        release.wait(5)
+        return write(conn, rows)
+    writer._write = stuck_write
+    outcomes = []
+    first = threading.Thread(target=lambda: outcomes.append(
+        user_repository.create_user('first', 'first@example.com', 'password123')))
+    first.start()
+    entered.wait(5)
+
+    response = group_app.test_client().post('/api/users', headers={'X-Request-Timeout-Ms': '50'}, json={
+        'username': 'second', 'email': 'second@example.com', 'password': 'password123'})
+    assert response.status_code == 503
+    with group_app.test_request_context():
+        g.deadline = time.monotonic() + 0.05
+        with pytest.raises(GroupCommitTimeout):
+            user_repository.create_user('third', 'third@example.com', 'password123')
+        # The fixture's app context, and so g, outlives this request context
+        g.pop('deadline')
+
+    release.set()
+    first.join()
+    assert outcomes[0].username == 'first'
+    user_repository.create_user('fourth', 'fourth@example.com', 'password123')
+    with group_app.app_context():
+        assert sorted(user.username for user in db.session.query(User)) == ['first', 'fourth']
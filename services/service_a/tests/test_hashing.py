@@ -0,0 +1,158 @@
+import pytest
+import threading
+import time
+from services.service_a.src import hashing
+from services.service_a.src.hashing import (
+    DEFAULT_HASH_METHOD, HashingQueueFull, ProcessPoolHasher, SyncHasher, calibrate_hash_method,
+    create_hasher, hash_method_of, resolve_hash_method
+)
+from services.service_a.src.models import UserRepository, db
+
+@pytest.fixture
+def pool_hasher():
+    hasher = ProcessPoolHasher(max_workers=2, max_queue=4)
+    yield hasher
+    hasher.shutdown()
+
+def test_sync_hasher_round_trip():
+    """Test the synchronous fallback hashes and verifies inline"""
+    hasher = SyncHasher()
+    password_hash = hasher.hash_password("password123")
+    assert password_hash != "password123"
+    assert hasher.verify_password(password_hash, "password123") is True
+    assert hasher.verify_password(password_hash, "wrongpassword") is False
+
+def test_process_pool_hasher_round_trip(pool_hasher):
+    """Test hashing and verification in worker processes"""
+    password_hash = pool_hasher.hash_password("password123")
+    assert pool_hasher.verify_password(password_hash, "password123") is True
+    assert pool_hasher.verify_password(password_hash, "wrongpassword") is False
+
+    hashes = pool_hasher.hash_passwords(["a", "b", "c"])
+    assert [pool_hasher.verify_password(h, p) for h, p in zip(hashes, "abc")] == [True] * 3
+
+def test_process_pool_hasher_queue_full():
+    """Test callers are rejected once every queue slot is taken"""
+    hasher = ProcessPoolHasher(max_workers=1, max_queue=1, submit_timeout=0.01)
+    try:
+        hasher._slots.acquire()
+        with pytest.raises(HashingQueueFull):
+            hasher.hash_password("password123")
+    finally:
+        hasher._slots.release()
+        hasher.shutdown()
+
+def _slow_hash(password):
+    time.sleep(0.3)
+    return 'slow$' + password
+
+def test_process_pool_hasher_batch_takes_a_slot_per_password():
+    """Test a batch holds one queue slot per queued password, not one for the whole batch"""
+    hasher = ProcessPoolHasher(max_workers=1, max_queue=2, submit_timeout=5)
+    hasher._generate = _slow_hash
+    results = []
+    try:
+        batch = threading.Thread(target=lambda: results.append(hasher.hash_passwords(['a', 'b', 'c'])))
+        batch.start()
+        time.sleep(0.1)
+        # Both slots belong to the batch while its first hashes run
+        assert hasher._slots.acquire(blocking=False) is False
+        batch.join()
+        assert results == [['slow$a', 'slow$b', 'slow$c']]
+        for _ in range(2):
+            assert hasher._slots.acquire(blocking=False) is True
+    finally:
+        hasher.shutdown()
+
+def test_process_pool_hasher_batch_rejected_when_queue_full():
+    """Test a batch that cannot get a slot fails with HashingQueueFull and frees what it took"""
+    hasher = ProcessPoolHasher(max_workers=1, max_queue=2, submit_timeout=0.01)
+    hasher._generate = _slow_hash
+    try:
+        hasher._slots.acquire()
+        with pytest.raises(HashingQueueFull):
+            hasher.hash_passwords(['a', 'b', 'c'])
+        hasher._slots.release()
+        time.sleep(0.5)
+        for _ in range(2):
+            assert hasher._slots.acquire(blocking=False) is True
+    finally:
+        hasher.shutdown()
+
+def test_process_pool_hasher_shutdown():
+    """Test a shut down pool refuses new work"""
+    hasher = ProcessPoolHasher(max_workers=1)
+    hasher.shutdown()
+    with pytest.raises(RuntimeError):
+        hasher.hash_password("password123")
+
+def test_create_hasher_from_config():
+    """Test backend selection from app config"""
+    assert isinstance(create_hasher({}), SyncHasher)
+    with pytest.raises(ValueError):
+        create_hasher({'PASSWORD_HASHER': 'unknown'})
+
+def test_user_repository_with_pool_hasher(app, pool_hasher):
+    """Test the repository hashes and verifies through the configured backend"""
+    with app.app_context():
+        repository = UserRepository(db, hasher=pool_hasher)
+        user = repository.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="password123"
+        )
+        assert repository.verify_password(user, "password123") is True
+        assert repository.verify_password(user, "wrongpassword") is False
+
+def test_hasher_uses_configured_method():
+    """Test hashes carry the configured method and older ones are flagged for rehash"""
+    hasher = SyncHasher('pbkdf2:sha256:1000')
+    password_hash = hasher.hash_password("password123")
+    assert hash_method_of(password_hash) == 'pbkdf2:sha256:1000'
+    assert hasher.needs_rehash(password_hash) is False
+    assert hasher.needs_rehash(SyncHasher('pbkdf2:sha256:2000').hash_password("password123")) is True
+
+def test_calibrate_hash_method_picks_strongest_within_budget(monkeypatch):
+    """Test calibration stops at the first scrypt setting over budget"""
+    timings = {2 ** 14: 0.05, 2 ** 15: 0.1, 2 ** 16: 0.2, 2 ** 17: 0.4}
+    monkeypatch.setattr(hashing, 'measure_hash_seconds',
+                        lambda method, samples=3: timings[int(method.split(':')[1])])
+    assert calibrate_hash_method(250) == 'scrypt:65536:8:1'
+    assert calibrate_hash_method(10) == 'scrypt:16384:8:1'
+
+def test_calibrate_hash_method_pbkdf2_scales_iterations(monkeypatch):
+    """Test PBKDF2 iterations scale linearly with the budget and respect the floor"""
+    monkeypatch.setattr(hashing, 'measure_hash_seconds', lambda method, samples=3: 0.3)
+    assert calibrate_hash_method(600, 'pbkdf2') == 'pbkdf2:sha256:1200000'
+    assert calibrate_hash_method(50, 'pbkdf2') == 'pbkdf2:sha256:600000'
+    with pytest.raises(ValueError):
+        calibrate_hash_method(100, 'md5')
+
+def test_resolve_hash_method_calibrates_once(monkeypatch):
+    """Test the calibrated method is stored in the config for later workers"""
+    calls = []
+    monkeypatch.setattr(hashing, 'calibrate_hash_method',
+                        lambda budget, algorithm: calls.append(budget) or 'scrypt:16384:8:1')
+    config = {'PASSWORD_HASH_BUDGET_MS': '100'}
+    assert resolve_hash_method(config) == 'scrypt:16384:8:1'
+    assert resolve_hash_method(config) == 'scrypt:16384:8:1'
+    assert calls == [100.0]
+    assert resolve_hash_method({}) == DEFAULT_HASH_METHOD
+    assert create_hasher({'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'}).method == 'pbkdf2:sha256:1000'
+
+def test_user_repository_rehashes_outdated_hash_on_verify(app):
+    """Test a successful verify upgrades an old hash in the background"""
+    with app.app_context():
+        old = UserRepository(db, hasher=SyncHasher('pbkdf2:sha256:1000'))
+        user = old.create_user(username="testuser", email="test@example.com", password="password123")
+        repository = UserRepository(db, hasher=SyncHasher('pbkdf2:sha256:2000'))
+
+        assert repository.verify_password(user, "wrongpassword") is False
+        assert repository._pending_rehashes == {}
+
+        assert repository.verify_password(user, "password123") is True
+        repository.flush_rehashes(timeout=10)
+        db.session.refresh(user)
+        assert hash_method_of(user.password_hash) == 'pbkdf2:sha256:2000'
+        assert repository.verify_password(user, "password123") is True
+        assert repository._pending_rehashes == {}
@@ -0,0 +1,67 @@
+import logging
+import pytest
+from services.service_a.src.logging_setup import (
+    ColorFormatter, DebugSampler, configure_logging, restart_after_fork
+)
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    root.handlers = handlers
+    root.setLevel(level)
+
+def make_record(level, msg="message"):
+    return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+def test_debug_sampler_keeps_one_in_n():
+    """Test DEBUG records are sampled while other levels always pass"""
+    sampler = DebugSampler(0.25)
+    kept = [sampler.filter(make_record(logging.DEBUG)) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert sampler.filter(make_record(logging.INFO)) is True
+
+def test_debug_sampler_zero_rate_drops_debug():
+    """Test a zero sample rate drops every DEBUG record"""
+    sampler = DebugSampler(0)
+    assert sampler.filter(make_record(logging.DEBUG)) is False
+    assert sampler.filter(make_record(logging.WARNING)) is True
+
+def test_color_formatter_reuses_formatters():
+    """Test formatting picks the precomputed formatter for the level"""
+    formatter = ColorFormatter()
+    assert ColorFormatter.green in formatter.format(make_record(logging.INFO))
+    assert ColorFormatter.blue in formatter.format(make_record(logging.ERROR))
+
+def test_configure_logging_uses_queue_listener(restore_root_logger):
+    """Test records reach the handler through the queue and respect the level"""
+    handler = ListHandler()
+    listener = configure_logging(level='INFO', handler=handler)
+    log = logging.getLogger("services.service_a.test")
+    log.debug("hidden %s", "value")
+    log.info("visible %s", "value")
+    listener.stop()
+
+    assert [r.getMessage() for r in handler.records] == ["visible value"]
+
+def test_restart_after_fork_starts_new_listener(restore_root_logger):
+    """Test a fresh queue and listener are installed with the same handler"""
+    handler = ListHandler()
+    first = configure_logging(level='INFO', handler=handler)
+    second = restart_after_fork()
+    first.stop()
+
+    logging.getLogger("services.service_a.test").info("after fork")
+    second.stop()
+
+    assert second is not first
+    assert [r.getMessage() for r in handler.records] == ["after fork"]
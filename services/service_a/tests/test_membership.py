@@ -0,0 +1,21 @@
+from services.service_a.src.membership import UserIdSet
+
+def test_user_id_set_merges_runs():
+    """Test adjacent IDs collapse into runs regardless of insertion order"""
+    ids = UserIdSet()
+    ids.add_many([1, 2, 3, 7, 5, 6, 10])
+    assert ids.runs() == [(1, 3), (5, 7), (10, 10)]
+    ids.add(4)
+    ids.add(4)
+    assert ids.runs() == [(1, 7), (10, 10)]
+    assert len(ids) == 8
+    assert 4 in ids and 8 not in ids
+
+def test_user_id_set_runs_since_and_through():
+    """Test deltas are clipped to the (since, through] window"""
+    ids = UserIdSet()
+    ids.add_many(range(1, 11))
+    ids.add_many([20, 21])
+    assert ids.runs(since=5) == [(6, 10), (20, 21)]
+    assert ids.runs(since=10, through=20) == [(20, 20)]
+    assert ids.runs(since=21) == []
@@ -0,0 +1,51 @@
+import pytest
+from services.service_a.src.metrics import create_registry, init_metrics, REGISTRY
+from services.service_a.src.models import db
+
+@pytest.fixture
+def registry():
+    return create_registry()
+
+@pytest.fixture
+def metrics_client(app, registry, user_repository):
+    init_metrics(app, db.engine, registry=registry, user_repository=user_repository)
+    return app.test_client()
+
+def test_registry_renders_counters_and_histograms(registry):
+    """Test Prometheus text output for both metric kinds"""
+    registry.inc('service_a_http_requests_total', (('route', '/x'),))
+    registry.inc('service_a_http_requests_total', (('route', '/x'),))
+    registry.observe('service_a_http_request_duration_seconds', 0.003, (('route', '/x'),))
+
+    text = registry.render()
+    assert 'service_a_http_requests_total{route="/x"} 2' in text
+    assert 'service_a_http_request_duration_seconds_bucket{route="/x",le="0.0025"} 0' in text
+    assert 'service_a_http_request_duration_seconds_bucket{route="/x",le="0.005"} 1' in text
+    assert 'service_a_http_request_duration_seconds_count{route="/x"} 1' in text
+
+def test_registry_escapes_label_values(registry):
+    """Test quotes and backslashes in label values are escaped"""
+    registry.inc('service_a_http_requests_total', (('route', 'a"b\\c'),))
+    assert 'route="a\\"b\\\\c"' in registry.render()
+
+def test_metrics_endpoint_reports_routes_and_sql(metrics_client, user_repository):
+    """Test /metrics reports per-route request counts, SQL and hashing timings"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+    metrics_client.get(f'/api/users/{user.id}')
+    metrics_client.get('/api/users/999999')
+
+    response = metrics_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode()
+    assert ('service_a_http_requests_total{method="GET",route="/api/users/<int:user_id>",status="200"} 1'
+            in text)
+    assert ('service_a_http_requests_total{method="GET",route="/api/users/<int:user_id>",status="404"} 1'
+            in text)
+    assert 'service_a_sql_statements_total{operation="SELECT"}' in text
+    assert 'service_a_user_cache_misses_total 2' in text
+    assert 'service_a_password_hash_duration_seconds_count' in REGISTRY.render()
@@ -108,4 +108,185 @@ def test_unique_email_constraint(user_repository):
             username="user2",
             email="test@example.com",
             password="password123"
-        )
\ No newline at end of file
+        )
+def test_user_repository_get_users_by_ids(user_repository):
+    """Test batch lookup keeps request order, drops duplicates and reports missing IDs"""
+    user1 = user_repository.create_user(
+        username="user1",
+        email="user1@example.com",
+        password="password123"
+    )
+    user2 = user_repository.create_user(
+        username="user2",
+        email="user2@example.com",
+        password="password123"
+    )
+
+    users, missing_ids = user_repository.get_users_by_ids([user2.id, 999, user1.id, user2.id])
+    assert [u.id for u in users] == [user2.id, user1.id]
+    assert missing_ids == [999]
+
+def test_user_repository_get_users_by_ids_chunks_large_batches(user_repository):
+    """Test batch lookup with more IDs than fit in one IN (...) clause"""
+    user = user_repository.create_user(
+        username="user1",
+        email="user1@example.com",
+        password="password123"
+    )
+
+    requested = list(range(2000, 4000)) + [user.id]
+    users, missing_ids = user_repository.get_users_by_ids(requested)
+    assert [u.id for u in users] == [user.id]
+    assert len(missing_ids) == 2000
+
+def test_user_repository_get_users_page(user_repository):
+    """Test keyset pagination returns a cursor until the last page"""
+    for i in range(3):
+        user_repository.create_user(
+            username=f"user{i}",
+            email=f"user{i}@example.com",
+            password="password123"
+        )
+
+    first_page, cursor = user_repository.get_users_page(limit=2)
+    assert [u.username for u in first_page] == ["user0", "user1"]
+    assert cursor == first_page[-1].id
+
+    second_page, cursor = user_repository.get_users_page(after_id=cursor, limit=2)
+    assert [u.username for u in second_page] == ["user2"]
+    assert cursor is None
+
+def test_user_repository_iter_users(user_repository):
+    """Test streaming iteration yields every user in id order"""
+    for i in range(5):
+        user_repository.create_user(
+            username=f"user{i}",
+            email=f"user{i}@example.com",
+            password="password123"
+        )
+
+    users = list(user_repository.iter_users(chunk_size=2))
+    assert [u.username for u in users] == [f"user{i}" for i in range(5)]
+
+def test_user_repository_create_users(user_repository):
+    """Test bulk creation reports per-row results"""
+    user_repository.create_user(
+        username="existing",
+        email="existing@example.com",
+        password="password123"
+    )
+
+    results = user_repository.create_users([
+        {'username': 'user1', 'email': 'user1@example.com', 'password': 'password123'},
+        {'username': 'existing', 'email': 'other@example.com', 'password': 'password123'},
+        {'username': 'user2', 'email': 'existing@example.com', 'password': 'password123'},
+        {'username': 'user1', 'email': 'user1b@example.com', 'password': 'password123'},
+        {'username': 'user3', 'email': 'user3@example.com'},
+        {'username': 'user4', 'email': 'user4@example.com', 'password': 'password123'},
+    ])
+
+    assert [r['status'] for r in results] == [
+        'created', 'conflict', 'conflict', 'conflict', 'invalid', 'created'
+    ]
+    created = user_repository.get_user(results[0]['id'])
+    assert created.username == 'user1'
+    assert created.verify_password('password123') is True
+    assert user_repository.get_user(results[5]['id']).username == 'user4'
+    assert len(user_repository.get_users()) == 3
+
+def test_user_repository_create_users_chunk_conflict_falls_back_per_row(user_repository, monkeypatch):
+    """Test rows that slip past the up-front check are reported individually"""
+    user_repository.create_user(
+        username="existing",
+        email="existing@example.com",
+        password="password123"
+    )
+    # Simulate a concurrent writer by hiding existing rows from the pre-check
+    monkeypatch.setattr(user_repository, '_find_existing', lambda usernames, emails: (set(), set()))
+
+    results = user_repository.create_users([
+        {'username': 'user1', 'email': 'user1@example.com', 'password': 'password123'},
+        {'username': 'existing', 'email': 'other@example.com', 'password': 'password123'},
+    ])
+
+    assert [r['status'] for r in results] == ['created', 'conflict']
+    assert len(user_repository.get_users()) == 2
+
+def test_user_repository_lookup_user_cached(user_repository):
+    """Test repeated lookups are served from the cache"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    first = user_repository.lookup_user(user.id)
+    second = user_repository.lookup_user(user.id)
+    assert first == second
+    assert first.username == "testuser"
+    stats = user_repository.cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_user_repository_lookup_user_misses_not_cached_by_default(user_repository):
+    """Test an unknown ID is looked up again each time unless negative caching is enabled"""
+    assert user_repository.lookup_user(1) is None
+    assert user_repository.lookup_user(1) is None
+    stats = user_repository.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (0, 2, 0)
+
+def test_user_repository_lookup_user_negative_cache_invalidated_on_create(user_repository):
+    """Test an unknown ID is cached as missing until a user with that ID is created"""
+    from services.service_a.src.cache import TTLCache
+    user_repository.cache = TTLCache(negative_ttl=5)
+    assert user_repository.lookup_user(1) is None
+    assert user_repository.lookup_user(1) is None
+    assert user_repository.cache.stats()['hits'] == 1
+
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+    assert user.id == 1
+    assert user_repository.lookup_user(1).username == "testuser"
+
+def test_user_repository_get_users_by_ids_never_reads_password_hash(user_repository, query_budget):
+    """Test the default batch read selects the public columns only"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    with query_budget(1) as log:
+        users, _ = user_repository.get_users_by_ids([user.id])
+    assert users[0]._fields == ('id', 'username', 'email')
+    assert not any('password_hash' in statement for statement in log.statements)
+
+def test_user_repository_get_users_by_ids_projection(user_repository):
+    """Test projected batch reads return rows with only the requested columns"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    users, missing = user_repository.get_users_by_ids([user.id, 999], fields=('id', 'email'))
+    assert missing == [999]
+    assert users[0]._fields == ('id', 'email')
+    assert users[0].email == "test@example.com"
+
+def test_user_repository_id_snapshot_picks_up_other_writers(app, user_repository):
+    """Test IDs written by another process are synced without rescanning known ones"""
+    from services.service_a.src.models import db
+    user = user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+    assert user.id in user_repository.user_ids
+    assert user_repository.id_snapshot() == (1, [(1, 1)])
+
+    db.session.execute(db.text(
+        "INSERT INTO users (username, email, password_hash) VALUES ('other', 'other@example.com', 'x')"))
+    db.session.commit()
+    assert 2 not in user_repository.user_ids
+    assert user_repository.id_snapshot(since=1) == (2, [(2, 2)])
+    assert user_repository.user_ids.synced_through == 2
@@ -0,0 +1,78 @@
+import logging
+import pstats
+from services.service_a.src.models import db
+from services.service_a.src.profiling import (
+    MAX_TRACED_STATEMENTS, RequestTrace, format_slow_request, init_profiling, init_slow_request_log
+)
+
+INTERNAL_HEADERS = {'X-Internal-API-Key': 'dev_internal_key_123'}
+
+
+def test_slow_request_log_lists_sql_statements(app, client, user_repository, caplog):
+    """Test a request over the threshold logs its route, time and SQL statements"""
+    init_slow_request_log(app, [db.engine], threshold_ms=0)
+    user = user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+
+    with caplog.at_level(logging.WARNING, logger='services.service_a.src.profiling'):
+        assert client.get(f'/api/users/{user.id}').status_code == 200
+    messages = [record.getMessage() for record in caplog.records if 'Slow request' in record.getMessage()]
+    assert len(messages) == 1
+    assert messages[0].startswith('Slow request: GET /api/users/<int:user_id> -> 200 took')
+    assert '(2 SQL statements' in messages[0]
+    assert 'SELECT users.id, users.username, users.email FROM users' in messages[0]
+
+
+def test_fast_requests_are_not_logged(app, client, caplog):
+    """Test requests under the threshold log nothing and SQL outside requests is not traced"""
+    init_slow_request_log(app, [db.engine], threshold_ms=60000)
+
+    with caplog.at_level(logging.WARNING, logger='services.service_a.src.profiling'):
+        assert client.get('/api/users').status_code == 200
+        db.session.execute(db.text('SELECT 1'))
+    assert not [record for record in caplog.records if 'Slow request' in record.getMessage()]
+
+
+def test_slow_request_trace_is_bounded():
+    """Test statements past the cap are counted rather than kept"""
+    trace = RequestTrace()
+    for _ in range(MAX_TRACED_STATEMENTS + 5):
+        trace.add('SELECT 1', 0.001)
+    message = format_slow_request('GET', '/api/users', 200, trace, 1.0)
+    assert f'({MAX_TRACED_STATEMENTS + 5} SQL statements' in message
+    assert '5 more statements not recorded' in message
+
+
+def test_profiling_disabled_installs_nothing(app):
+    """Test the profiling hook leaves the app untouched without a directory"""
+    init_profiling(app, None, sample_rate=1.0)
+    assert 'wsgi_app' not in vars(app)
+
+
+def test_profile_header_requires_internal_key(app, client, tmp_path):
+    """Test X-Profile only profiles requests carrying the internal API key"""
+    init_profiling(app, str(tmp_path), api_key='dev_internal_key_123')
+
+    assert client.get('/api/users', headers={'X-Profile': '1'}).status_code == 200
+    assert client.get('/api/users', headers=INTERNAL_HEADERS).status_code == 200
+    assert list(tmp_path.iterdir()) == []
+
+    assert client.get('/api/users', headers={'X-Profile': '1', **INTERNAL_HEADERS}).status_code == 200
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert profiles[0].name.endswith('.prof') and '-GET-api_users-' in profiles[0].name
+    stats = pstats.Stats(str(profiles[0]))
+    assert any(function == 'get_users' for _, _, function in stats.stats)
+
+
+def test_sampled_profiling_covers_streamed_bodies(app, client, user_repository, tmp_path):
+    """Test sampling profiles requests, including the body of streamed responses"""
+    init_profiling(app, str(tmp_path), sample_rate=1.0)
+    user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+
+    response = client.get('/api/users?stream=1')
+    assert response.status_code == 200
+    assert b'testuser' in response.data
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    stats = pstats.Stats(str(profiles[0]))
+    assert any(function == 'iter_users' for _, _, function in stats.stats)
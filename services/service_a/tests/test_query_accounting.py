@@ -0,0 +1,105 @@
+import pytest
+from services.service_a.src.metrics import create_registry
+from services.service_a.src.models import db
+from services.service_a.src.query_accounting import (
+    QUERY_COUNT_HEADER, QUERY_METHODS_HEADER, QUERY_REPEATED_HEADER, QueryBudgetExceeded,
+    init_query_accounting, normalize_statement
+)
+from services.service_a.src.routes import INTERNAL_API_KEY
+
+INTERNAL_HEADERS = {'X-Internal-API-Key': INTERNAL_API_KEY}
+
+
+@pytest.fixture
+def users(user_repository):
+    results = user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(3)])
+    return [result['id'] for result in results]
+
+
+def test_normalize_statement_groups_parameter_lists():
+    """Test statements differing only in IN-list or VALUES length normalise alike"""
+    assert normalize_statement('SELECT * FROM users\n  WHERE id IN (?, ?, ?)') == \
+        normalize_statement('SELECT * FROM users WHERE id IN (?)')
+    assert normalize_statement('INSERT INTO users (a, b) VALUES (?, ?), (?, ?)') == \
+        'INSERT INTO users (a, b) VALUES (?)'
+
+
+def test_query_budget_flags_n_plus_one(app, query_budget, users, user_repository):
+    """Test a per-id lookup loop fails a repeat budget that one batched query passes"""
+    with query_budget(1) as log:
+        user_repository.get_users_by_ids(users)
+    assert log.methods == {'get_users_by_ids': 1}
+
+    user_repository.cache.clear()
+    with pytest.raises(QueryBudgetExceeded, match='ran more than 1 times'):
+        with query_budget(10, max_repeats=1):
+            for user_id in users:
+                user_repository.lookup_user(user_id)
+
+    @query_budget(0)
+    def uncached_lookup():
+        user_repository.lookup_user(users[0])
+    user_repository.cache.clear()
+    with pytest.raises(QueryBudgetExceeded, match='budget of 0 exceeded'):
+        uncached_lookup()
+
+
+def test_query_headers_in_debug_mode(app, client, users, user_repository):
+    """Test responses carry per-request counts and repeated statements are flagged"""
+    app.debug = True
+    init_query_accounting(app, [db.engine], user_repository, headers=app.debug, repeat_threshold=2,
+                          registry=create_registry())
+
+    @app.route('/test/n-plus-one')
+    def n_plus_one():
+        user_repository.cache.clear()
+        return {'users': [user_repository.lookup_user(user_id).username for user_id in users]}
+
+    response = client.post('/internal/api/users/batch', json={'user_ids': users}, headers=INTERNAL_HEADERS)
+    assert response.headers[QUERY_COUNT_HEADER] == '1'
+    assert response.headers[QUERY_METHODS_HEADER] == 'get_users_by_ids=1'
+    assert QUERY_REPEATED_HEADER not in response.headers
+
+    response = client.get('/test/n-plus-one')
+    assert response.headers[QUERY_COUNT_HEADER] == '3'
+    assert response.headers[QUERY_METHODS_HEADER] == 'lookup_user=3'
+    assert response.headers[QUERY_REPEATED_HEADER] == '3'
+
+
+# Per-route query budgets: raise one only together with the change that needs it.
+# ETag-versioned routes read the newest change log row first.
+@pytest.mark.parametrize('method, path, kwargs, budget', [
+    ('get', '/api/users/{id}', {}, 2),
+    ('get', '/api/users?limit=2', {}, 2),
+    ('get', '/api/users/search?q=us', {}, 2),
+    ('get', '/internal/api/users/verify/{id}', {'headers': INTERNAL_HEADERS}, 1),
+    # Reads the change log head too, to pick up IDs other processes imported
+    ('get', '/internal/api/users/ids', {'headers': INTERNAL_HEADERS}, 2),
+    ('get', '/internal/api/users/changes', {'headers': INTERNAL_HEADERS}, 1),
+    # INSERT, then a refresh of the expired instance for the response
+    ('post', '/api/users', {'json': {'username': 'new', 'email': 'new@example.com', 'password': 'pw'}}, 2),
+])
+def test_route_query_budget(client, query_budget, users, method, path, kwargs, budget):
+    """Test each route stays within its SQL statement budget"""
+    with query_budget(budget, max_repeats=1):
+        response = getattr(client, method)(path.format(id=users[0]), **kwargs)
+    assert response.status_code < 300
+
+
+def test_batch_route_query_budget_scales_with_chunks(client, query_budget, users):
+    """Test the internal batch lookup costs one query per IN-list chunk, not per id"""
+    with query_budget(1):
+        client.post('/internal/api/users/batch', json={'user_ids': users}, headers=INTERNAL_HEADERS)
+    with query_budget(2):
+        client.post('/internal/api/users/batch', json={'user_ids': list(range(1, 1001))},
+                    headers=INTERNAL_HEADERS)
+
+
+def test_bulk_create_query_budget(client, query_budget):
+    """Test a bulk create is one existence check and one savepointed INSERT per chunk"""
+    rows = [{'username': f'bulk{i}', 'email': f'bulk{i}@example.com', 'password': 'pw'} for i in range(5)]
+    with query_budget(4, max_repeats=1) as log:
+        assert client.post('/api/users/bulk', json={'users': rows}).json['created'] == 5
+    assert log.methods == {'create_users': 4}
@@ -1,5 +1,6 @@
 import json
 import pytest
+from urllib.parse import quote
 from flask import Flask
 from src.models import User
 
@@ -130,3 +131,395 @@ def test_internal_verify_user_unauthorized(client, user_repository):
         headers={'X-Internal-API-Key': 'invalid_key'}
     )
     assert response.status_code == 401
+
+def test_internal_users_batch(client, user_repository):
+    """Test internal batch endpoint returns users in request order and missing IDs"""
+    user1 = user_repository.create_user(
+        username="testuser1",
+        email="test1@example.com",
+        password="password123"
+    )
+    user2 = user_repository.create_user(
+        username="testuser2",
+        email="test2@example.com",
+        password="password123"
+    )
+
+    response = client.post(
+        '/internal/api/users/batch',
+        data=json.dumps({'user_ids': [user2.id, 999, user1.id, user2.id]}),
+        content_type='application/json',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123'}
+    )
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json['users']] == ['testuser2', 'testuser1']
+    assert response.json['missing_ids'] == [999]
+
+def test_internal_users_batch_invalid_ids(client):
+    """Test internal batch endpoint rejects non-integer IDs"""
+    response = client.post(
+        '/internal/api/users/batch',
+        data=json.dumps({'user_ids': ['1', 2]}),
+        content_type='application/json',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123'}
+    )
+    assert response.status_code == 400
+
+def test_get_users_paginated(client, user_repository):
+    """Test GET /api/users with keyset pagination parameters"""
+    for i in range(3):
+        user_repository.create_user(
+            username=f"testuser{i}",
+            email=f"test{i}@example.com",
+            password="password123"
+        )
+
+    response = client.get('/api/users?limit=2')
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json['users']] == ['testuser0', 'testuser1']
+    cursor = response.json['next_cursor']
+
+    response = client.get(f'/api/users?after_id={cursor}&limit=2')
+    assert [u['username'] for u in response.json['users']] == ['testuser2']
+    assert response.json['next_cursor'] is None
+
+def test_get_users_paginated_invalid_limit(client):
+    """Test GET /api/users rejects out-of-range page sizes"""
+    assert client.get('/api/users?limit=0').status_code == 400
+    assert client.get('/api/users?limit=abc').status_code == 400
+
+def test_get_users_stream(client, user_repository):
+    """Test GET /api/users?stream=true returns the full collection as a JSON array"""
+    for i in range(3):
+        user_repository.create_user(
+            username=f"testuser{i}",
+            email=f"test{i}@example.com",
+            password="password123"
+        )
+
+    response = client.get('/api/users?stream=true')
+    assert response.status_code == 200
+    assert [u['username'] for u in json.loads(response.data)] == ['testuser0', 'testuser1', 'testuser2']
+    assert 'password_hash' not in response.data.decode()
+
+def test_get_users_stream_empty(client):
+    """Test streaming an empty users table yields an empty JSON array"""
+    response = client.get('/api/users?stream=true')
+    assert json.loads(response.data) == []
+
+def test_create_users_bulk(client, user_repository):
+    """Test POST /api/users/bulk returns per-row results"""
+    user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    data = {'users': [
+        {'username': 'newuser1', 'email': 'new1@example.com', 'password': 'password123'},
+        {'username': 'testuser', 'email': 'new2@example.com', 'password': 'password123'},
+    ]}
+    response = client.post(
+        '/api/users/bulk',
+        data=json.dumps(data),
+        content_type='application/json'
+    )
+    assert response.status_code == 200
+    assert response.json['created'] == 1
+    assert response.json['failed'] == 1
+    assert [r['status'] for r in response.json['results']] == ['created', 'conflict']
+
+def test_create_users_bulk_invalid_body(client):
+    """Test POST /api/users/bulk without a users list"""
+    response = client.post(
+        '/api/users/bulk',
+        data=json.dumps({'users': 'nope'}),
+        content_type='application/json'
+    )
+    assert response.status_code == 400
+
+def test_internal_user_cache_stats(client, user_repository):
+    """Test cache counters are exposed on the internal API"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+    headers = {'X-Internal-API-Key': 'dev_internal_key_123'}
+    client.get(f'/internal/api/users/verify/{user.id}', headers=headers)
+    client.get(f'/internal/api/users/verify/{user.id}', headers=headers)
+
+    response = client.get('/internal/api/users/cache', headers=headers)
+    assert response.status_code == 200
+    assert response.json['hits'] == 1
+    assert response.json['misses'] == 1
+
+def test_get_users_etag_not_modified(client, user_repository):
+    """Test GET /api/users answers a matching If-None-Match with 304"""
+    user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    response = client.get('/api/users')
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    response = client.get('/api/users', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_get_user_etag_changes_after_write(client, user_repository):
+    """Test the ETag changes once the users table is written"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+    etag = client.get(f'/api/users/{user.id}').headers['ETag']
+
+    user_repository.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="password123"
+    )
+    response = client.get(f'/api/users/{user.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_etag_follows_writes_from_other_processes(client, user_repository):
+    """Test a write that bypasses this repository still changes the ETag"""
+    from services.service_a.src.models import db
+    user = user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+    etag = client.get(f'/api/users/{user.id}').headers['ETag']
+    assert client.get(f'/api/users/{user.id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # As another worker or the import CLI would, with no in-process notification
+    db.session.execute(db.text("UPDATE users SET email = 'new@example.com' WHERE id = :id"), {'id': user.id})
+    db.session.commit()
+    response = client.get(f'/api/users/{user.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_get_user_not_found_has_no_etag(client):
+    """Test error responses are not tagged"""
+    response = client.get('/api/users/999')
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+
+def test_internal_verify_user_fields(client, user_repository):
+    """Test internal verify returns only the requested fields"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    response = client.get(
+        f'/internal/api/users/verify/{user.id}?fields=id',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123'}
+    )
+    assert response.status_code == 200
+    assert response.json == {'id': user.id, 'verified': True}
+
+    response = client.get(
+        f'/internal/api/users/verify/{user.id}?fields=id,password_hash',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123'}
+    )
+    assert response.status_code == 400
+
+def test_internal_users_batch_fields(client, user_repository):
+    """Test internal batch projects users onto the requested fields"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    response = client.post(
+        '/internal/api/users/batch?fields=username',
+        data=json.dumps({'user_ids': [user.id, 999]}),
+        content_type='application/json',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123'}
+    )
+    assert response.status_code == 200
+    assert response.json == {'users': [{'username': 'testuser'}], 'missing_ids': [999]}
+
+def test_internal_users_batch_msgpack(client, user_repository):
+    """Test internal batch honours Accept: application/msgpack"""
+    msgpack = pytest.importorskip('msgpack')
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    response = client.post(
+        '/internal/api/users/batch',
+        data=json.dumps({'user_ids': [user.id]}),
+        content_type='application/json',
+        headers={'X-Internal-API-Key': 'dev_internal_key_123', 'Accept': 'application/msgpack'}
+    )
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/msgpack'
+    assert msgpack.unpackb(response.data) == {
+        'users': [{'id': user.id, 'username': 'testuser', 'email': 'test@example.com'}],
+        'missing_ids': []
+    }
+
+def _create_search_users(user_repository):
+    user_repository.create_users([
+        {'username': 'Alice', 'email': 'alice@example.com', 'password': 'password123'},
+        {'username': 'alicia', 'email': 'a.smith@corp.example', 'password': 'password123'},
+        {'username': 'bob', 'email': 'bob.alison@example.com', 'password': 'password123'},
+    ])
+
+def test_search_users_prefix(client, user_repository):
+    """Test prefix search is case-insensitive and ordered by the matched field"""
+    _create_search_users(user_repository)
+
+    response = client.get('/api/users/search?q=ALI')
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json['users']] == ['Alice', 'alicia']
+    assert response.json['next_cursor'] is None
+
+    response = client.get('/api/users/search?q=bob.&field=email')
+    assert [u['username'] for u in response.json['users']] == ['bob']
+
+def test_search_users_prefix_paginated(client, user_repository):
+    """Test prefix search pages with next_cursor"""
+    _create_search_users(user_repository)
+
+    response = client.get('/api/users/search?q=a&field=email&limit=1')
+    assert [u['username'] for u in response.json['users']] == ['alicia']
+    cursor = response.json['next_cursor']
+    response = client.get(f'/api/users/search?q=a&field=email&limit=1&after_id={cursor}')
+    assert [u['username'] for u in response.json['users']] == ['Alice']
+    assert response.json['next_cursor'] is None
+
+def test_search_users_prefix_non_ascii(client, user_repository):
+    """Test prefix search folds ASCII case only, as SQLite's lower() does"""
+    user_repository.create_users([
+        {'username': 'Émile', 'email': 'emile@example.com', 'password': 'password123'},
+        {'username': 'émilie', 'email': 'emilie@example.com', 'password': 'password123'},
+    ])
+
+    response = client.get('/api/users/search?q=ÉMI')
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json['users']] == ['Émile']
+
+    response = client.get('/api/users/search?q=émi')
+    assert [u['username'] for u in response.json['users']] == ['émilie']
+
+def test_search_users_prefix_max_code_point(client, user_repository):
+    """Test a prefix ending in U+10FFFF is searched, not a server error"""
+    top = chr(0x10FFFF)
+    user_repository.create_users([
+        {'username': 'z' + top + 'a', 'email': 'top@example.com', 'password': 'password123'},
+        {'username': top, 'email': 'only@example.com', 'password': 'password123'},
+    ])
+
+    response = client.get('/api/users/search?q=' + quote('z' + top))
+    assert response.status_code == 200
+    assert [u['email'] for u in response.json['users']] == ['top@example.com']
+
+    response = client.get('/api/users/search?q=' + quote(top))
+    assert [u['email'] for u in response.json['users']] == ['only@example.com']
+
+def test_search_users_substring(client, user_repository):
+    """Test substring search matches inside usernames and emails"""
+    _create_search_users(user_repository)
+
+    response = client.get('/api/users/search?q=lis&mode=substring&field=email')
+    assert response.status_code == 200
+    assert [u['username'] for u in response.json['users']] == ['bob']
+
+    response = client.get('/api/users/search?q=lic&mode=substring&limit=1')
+    assert [u['username'] for u in response.json['users']] == ['Alice']
+    cursor = response.json['next_cursor']
+    response = client.get(f'/api/users/search?q=lic&mode=substring&limit=1&after_id={cursor}')
+    assert [u['username'] for u in response.json['users']] == ['alicia']
+
+def test_search_users_invalid_params(client):
+    """Test search rejects missing queries and bad options"""
+    assert client.get('/api/users/search').status_code == 400
+    assert client.get('/api/users/search?q=a&mode=fuzzy').status_code == 400
+    assert client.get('/api/users/search?q=a&field=password_hash').status_code == 400
+    assert client.get('/api/users/search?q=ab&mode=substring').status_code == 400
+    assert client.get('/api/users/search?q=a&limit=0').status_code == 400
+
+def test_internal_user_ids_snapshot_and_delta(client, user_repository):
+    """Test the ID snapshot is run-length encoded and supports deltas"""
+    headers = {'X-Internal-API-Key': 'dev_internal_key_123'}
+    user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(3)
+    ])
+
+    response = client.get('/internal/api/users/ids', headers=headers)
+    assert response.status_code == 200
+    assert response.json == {'version': 3, 'since': 0, 'runs': [[1, 3]]}
+
+    user_repository.create_user(username="late", email="late@example.com", password="password123")
+    response = client.get('/internal/api/users/ids?since=3', headers=headers)
+    assert response.json == {'version': 4, 'since': 3, 'runs': [[4, 4]]}
+
+    response = client.get('/internal/api/users/ids?since=4', headers=headers)
+    assert response.json == {'version': 4, 'since': 4, 'runs': []}
+
+def test_internal_user_ids_requires_auth(client):
+    """Test the ID snapshot is internal only and validates since"""
+    assert client.get('/internal/api/users/ids').status_code == 401
+    response = client.get('/internal/api/users/ids?since=x',
+                          headers={'X-Internal-API-Key': 'dev_internal_key_123'})
+    assert response.status_code == 400
+
+def test_internal_user_changes_feed(client, user_repository):
+    """Test the change feed returns ordered create/update events with a resume cursor"""
+    from services.service_a.src.models import db
+    headers = {'X-Internal-API-Key': 'dev_internal_key_123'}
+    user = user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+    user_repository.create_users([
+        {'username': 'bulkuser', 'email': 'bulk@example.com', 'password': 'password123'}
+    ])
+    db.session.execute(db.text("UPDATE users SET email = 'new@example.com' WHERE id = :id"), {'id': user.id})
+    db.session.commit()
+
+    response = client.get('/internal/api/users/changes?limit=2', headers=headers)
+    assert response.status_code == 200
+    assert [(c['op'], c['user']['username']) for c in response.json['changes']] == [
+        ('create', 'testuser'), ('create', 'bulkuser')]
+    assert response.json['has_more'] is True
+
+    cursor = response.json['cursor']
+    response = client.get(f'/internal/api/users/changes?since={cursor}', headers=headers)
+    assert [(c['op'], c['user']['email']) for c in response.json['changes']] == [('update', 'new@example.com')]
+    assert response.json['has_more'] is False
+
+    cursor = response.json['cursor']
+    response = client.get(f'/internal/api/users/changes?since={cursor}&wait=0.1', headers=headers)
+    assert response.json == {'changes': [], 'cursor': cursor, 'has_more': False}
+
+def test_internal_user_changes_invalid_params(client):
+    """Test the change feed is internal only and validates its parameters"""
+    headers = {'X-Internal-API-Key': 'dev_internal_key_123'}
+    assert client.get('/internal/api/users/changes').status_code == 401
+    assert client.get('/internal/api/users/changes?since=x', headers=headers).status_code == 400
+    assert client.get('/internal/api/users/changes?limit=0', headers=headers).status_code == 400
+    assert client.get('/internal/api/users/changes?wait=600', headers=headers).status_code == 400
+
+def test_internal_users_export(client, user_repository):
+    """Test the export streams gzip NDJSON including password hashes"""
+    import gzip
+    user = user_repository.create_user(username="testuser", email="test@example.com", password="password123")
+
+    assert client.get('/internal/api/users/export').status_code == 401
+    response = client.get('/internal/api/users/export', headers={'X-Internal-API-Key': 'dev_internal_key_123'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/gzip'
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{
+        'id': user.id, 'username': 'testuser', 'email': 'test@example.com',
+        'password_hash': user.password_hash
+    }]
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import text
+from services.service_a.src.models import db, User
+from services.service_a.src.search import (
+    FTS_TABLE, InvalidSearch, create_search_index, parse_search_args, prefix_upper_bound
+)
+
+def test_prefix_upper_bound():
+    """Test the exclusive upper bound sorts after every string with the prefix"""
+    assert prefix_upper_bound('ali') == 'alj'
+    assert 'ali' <= 'alizzz' < prefix_upper_bound('ali')
+
+def test_prefix_upper_bound_at_max_code_point():
+    """Test prefixes ending in U+10FFFF get a valid bound, or none at all"""
+    top = chr(0x10FFFF)
+    assert prefix_upper_bound('al' + top + top) == 'am'
+    assert prefix_upper_bound(top) is None
+    assert prefix_upper_bound('a\ud7ff') == 'a\ue000'
+
+def test_parse_search_args_defaults():
+    """Test defaults for mode, field and limit"""
+    params = parse_search_args({'q': ' ali '})
+    assert params == ('ali', 'prefix', 'username', None, 20)
+
+def test_parse_search_args_rejects_bad_values():
+    """Test malformed parameters raise InvalidSearch"""
+    with pytest.raises(InvalidSearch):
+        parse_search_args({'q': 'ali', 'after_id': 'x'})
+    with pytest.raises(InvalidSearch):
+        parse_search_args({'q': 'ali', 'limit': '1000'})
+
+def test_search_index_tracks_writes(app, user_repository):
+    """Test the FTS table follows inserts, updates and deletes made outside the ORM"""
+    user_repository.create_users([
+        {'username': 'alice', 'email': 'alice@example.com', 'password': 'password123'}
+    ])
+    user_repository.create_user(username="bob", email="bob@example.com", password="password123")
+
+    def substring(query):
+        return [u.username for u in user_repository.search_users(query, mode='substring')[0]]
+
+    assert substring('lic') == ['alice']
+    db.session.execute(text("UPDATE users SET username = 'carol' WHERE username = 'alice'"))
+    db.session.commit()
+    assert substring('lic') == []
+    assert substring('aro') == ['carol']
+    db.session.execute(text("DELETE FROM users WHERE username = 'carol'"))
+    db.session.commit()
+    assert substring('aro') == []
+
+def test_create_search_index_backfills_existing_table(app, user_repository):
+    """Test adding the search index to a populated database indexes existing rows"""
+    user_repository.create_user(username="alice", email="alice@example.com", password="password123")
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+        conn.exec_driver_sql("DROP INDEX ix_users_username_lower")
+        create_search_index(conn, User.__table__)
+        create_search_index(conn, User.__table__)
+
+    assert [u.username for u in user_repository.search_users('lic', mode='substring')[0]] == ['alice']
+    assert [u.username for u in user_repository.search_users('AL')[0]] == ['alice']
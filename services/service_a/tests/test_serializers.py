@@ -0,0 +1,30 @@
+import pytest
+from werkzeug.datastructures import MIMEAccept
+from services.service_a.src.serializers import (
+    JSON_MIMETYPE, MSGPACK_MIMETYPE, USER_FIELDS, InvalidFields, encode, negotiate, parse_fields
+)
+
+def test_parse_fields_defaults_and_canonical_order():
+    """Test a missing fields parameter means all fields and order is normalised"""
+    assert parse_fields(None) == USER_FIELDS
+    assert parse_fields('') == USER_FIELDS
+    assert parse_fields('email, id,email') == ('id', 'email')
+
+def test_parse_fields_rejects_unknown_fields():
+    """Test private or unknown columns cannot be requested"""
+    with pytest.raises(InvalidFields, match='password_hash'):
+        parse_fields('id,password_hash')
+
+def test_negotiate_prefers_json_by_default():
+    """Test JSON is chosen unless the client asks for msgpack"""
+    assert negotiate(MIMEAccept()) == JSON_MIMETYPE
+    assert negotiate(MIMEAccept([('application/json', 1), ('*/*', 0.1)])) == JSON_MIMETYPE
+
+def test_negotiate_and_encode_msgpack():
+    """Test msgpack (and its legacy mimetype) round-trips the payload"""
+    msgpack = pytest.importorskip('msgpack')
+    for accept in ('application/msgpack', 'application/x-msgpack'):
+        assert negotiate(MIMEAccept([(accept, 1)])) == MSGPACK_MIMETYPE
+    payload = {'users': [{'id': 1, 'username': 'testuser'}], 'missing_ids': []}
+    assert msgpack.unpackb(encode(payload, MSGPACK_MIMETYPE)) == payload
+    assert encode(payload, JSON_MIMETYPE) == b'{"users":[{"id":1,"username":"testuser"}],"missing_ids":[]}'
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from services.service_a.src.hashing import ProcessPoolHasher
+from services.service_a.src.serve import after_fork, before_exit
+
+def test_after_fork_keeps_app_usable(app, client, user_repository):
+    """Test the post-fork hook resets engines without breaking requests"""
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+
+    after_fork(app)
+
+    response = client.get(f'/api/users/{user.id}')
+    assert response.status_code == 200
+
+def test_after_fork_resets_per_process_state(app, user_repository):
+    """Test a worker starts with an empty user cache and zeroed metrics"""
+    from services.service_a.src.metrics import create_registry
+    user = user_repository.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="password123"
+    )
+    user_repository.lookup_user(user.id)
+    registry = app.extensions['metrics'] = create_registry()
+    registry.inc('service_a_http_requests_total', (('route', '/x'),))
+
+    after_fork(app)
+
+    assert user_repository.cache.stats()['size'] == 0
+    assert user_repository.cache.stats()['misses'] == 0
+    assert 'route="/x"' not in registry.render()
+
+def test_after_fork_replaces_hashing_pool(app, user_repository):
+    """Test each worker gets its own hashing pool and shuts it down on exit"""
+    inherited = ProcessPoolHasher(max_workers=1)
+    user_repository.hasher = inherited
+    app.config['PASSWORD_HASHER'] = 'process'
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+
+    after_fork(app)
+    replacement = user_repository.hasher
+    try:
+        assert isinstance(replacement, ProcessPoolHasher)
+        assert replacement is not inherited
+    finally:
+        before_exit(app)
+        inherited.shutdown()
+    assert replacement._closed
+
+def test_serve_import_does_not_load_sharding():
+    """Test the fork hooks module leaves sharded storage unloaded until it is configured"""
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+    code = 'import sys, services.service_a.src.serve; print("services.service_a.src.sharding" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=repo_root, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.strip() == 'False'
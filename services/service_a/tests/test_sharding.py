@@ -0,0 +1,230 @@
+"""Sharded storage tests.
+
+The route tests are imported from test_routes and collected again here with
+``app`` overridden to serve a ShardedUserRepository over three shard files.
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import select, update
+from services.service_a.src.hashing import SyncHasher
+from services.service_a.src.models import User, db
+from services.service_a.src.routes import register_routes
+from services.service_a.src.sharding import (
+    ShardSet, ShardedUserRepository, rebalance_shards, register_shard_commands, user_directory
+)
+from services.service_a.tests.test_routes import (  # noqa: F401
+    test_get_users_empty, test_get_users, test_get_user, test_get_user_not_found,
+    test_create_user, test_create_user_duplicate_username, test_internal_verify_user,
+    test_internal_verify_user_unauthorized, test_internal_users_batch,
+    test_internal_users_batch_invalid_ids, test_get_users_paginated,
+    test_get_users_paginated_invalid_limit, test_get_users_stream, test_get_users_stream_empty,
+    test_create_users_bulk, test_create_users_bulk_invalid_body, test_internal_user_cache_stats,
+    test_get_users_etag_not_modified, test_get_user_etag_changes_after_write,
+    test_get_user_not_found_has_no_etag, test_internal_verify_user_fields,
+    test_internal_users_batch_fields, test_internal_users_batch_msgpack, test_search_users_prefix,
+    test_search_users_prefix_paginated, test_search_users_prefix_non_ascii,
+    test_search_users_prefix_max_code_point,
+    test_search_users_substring, test_search_users_invalid_params,
+    test_internal_user_ids_snapshot_and_delta, test_internal_user_ids_requires_auth,
+    test_internal_user_changes_invalid_params, test_internal_users_export
+)
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def shards(tmp_path):
+    shards = ShardSet(str(tmp_path / 'shards'), SHARD_COUNT)
+    yield shards
+    shards.dispose()
+
+
+@pytest.fixture
+def app(shards):
+    """Flask app serving the routes from sharded storage."""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    user_repository = ShardedUserRepository(shards, hasher=SyncHasher('pbkdf2:sha256:1000'))
+    app.extensions['user_repository'] = user_repository
+    register_routes(app, user_repository)
+    yield app
+    user_repository.flush_rehashes()
+
+
+def _rows(count, prefix='user'):
+    return [{'username': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com', 'password': 'password123'}
+            for i in range(count)]
+
+
+def _shard_ids(shards):
+    ids = []
+    for engine in shards.engines:
+        with engine.connect() as conn:
+            ids.append(list(conn.scalars(select(User.id).order_by(User.id))))
+    return ids
+
+
+def test_users_are_routed_by_id(shards, user_repository):
+    """Test each user is stored only on the shard its ID maps to"""
+    user_repository.create_users(_rows(7))
+
+    assert _shard_ids(shards) == [[3, 6], [1, 4, 7], [2, 5]]
+    assert [user.id for user in user_repository.get_users()] == list(range(1, 8))
+
+
+def test_uniqueness_is_enforced_across_shards(user_repository):
+    """Test a username or email taken on one shard is rejected for an ID on another"""
+    from sqlalchemy.exc import IntegrityError
+    user_repository.create_user('alice', 'alice@example.com', 'password123')
+
+    with pytest.raises(IntegrityError):
+        user_repository.create_user('alice', 'other@example.com', 'password123')
+    results = user_repository.create_users([
+        {'username': 'bob', 'email': 'alice@example.com', 'password': 'password123'},
+        {'username': 'carol', 'email': 'carol@example.com', 'password': 'password123'},
+    ])
+    assert [result['status'] for result in results] == ['conflict', 'created']
+    assert [user.username for user in user_repository.get_users()] == ['alice', 'carol']
+
+
+def test_racing_claims_report_conflicts(user_repository):
+    """Test a name claimed after the up-front check becomes a per-row conflict"""
+    user_repository._find_existing = lambda usernames, emails: (set(), set())
+    user_repository.create_user('alice', 'alice@example.com', 'password123')
+
+    results = user_repository.create_users(_rows(2) + [
+        {'username': 'alice', 'email': 'new@example.com', 'password': 'password123'}])
+    assert [result['status'] for result in results] == ['created', 'created', 'conflict']
+    assert [result.get('id') for result in results] == [2, 3, None]
+
+
+def test_scatter_gather_reads_merge_in_order(user_repository):
+    """Test pages, batches, streams and searches merge rows from every shard"""
+    user_repository.create_users(_rows(10))
+
+    page, cursor = user_repository.get_users_page(after_id=2, limit=4)
+    assert [user.id for user in page] == [3, 4, 5, 6] and cursor == 6
+    users, missing = user_repository.get_users_by_ids([9, 1, 99, 5, 1], fields=('id', 'username'))
+    assert [tuple(user) for user in users] == [(9, 'user8'), (1, 'user0'), (5, 'user4')]
+    assert missing == [99]
+    assert [user.id for user in user_repository.iter_users(chunk_size=2)] == list(range(1, 11))
+
+    page, cursor = user_repository.search_users('USER', 'prefix', 'username', None, 3)
+    assert [user.username for user in page] == ['user0', 'user1', 'user2']
+    page, cursor = user_repository.search_users('user', 'prefix', 'username', cursor, 3)
+    assert [user.username for user in page] == ['user3', 'user4', 'user5']
+    page, _ = user_repository.search_users('er1', 'substring', 'username', None, 5)
+    assert [user.id for user in page] == [2]
+
+
+def test_id_snapshot_stops_below_pending_claims(shards, user_repository):
+    """Test the snapshot version never passes an ID still being written to its shard"""
+    user_repository.create_users(_rows(3))
+    with shards.directory_engine.begin() as conn:
+        conn.execute(update(user_directory).where(user_directory.c.user_id == 2).values(pending=1))
+
+    assert user_repository.id_snapshot() == (1, [(1, 1)])
+    assert shards.recover_pending() == (1, 0)
+    assert user_repository.id_snapshot() == (3, [(1, 3)])
+
+
+def test_recover_pending_releases_stale_claims(shards, user_repository):
+    """Test claims without a stored user are released once past the grace period"""
+    user_repository._claim([{'username': 'ghost', 'email': 'ghost@example.com'}])
+
+    assert shards.recover_pending() == (0, 0)
+    assert shards.recover_pending(grace=-1) == (0, 1)
+    user = user_repository.create_user('ghost', 'ghost@example.com', 'password123')
+    assert user.id == 2
+
+
+def test_change_feed_merges_shards(shards, client, user_repository):
+    """Test paging the feed with its token returns every shard's changes exactly once"""
+    headers = {'X-Internal-API-Key': 'dev_internal_key_123'}
+    user_repository.create_users(_rows(7))
+    with shards.engine_for(4).begin() as conn:
+        conn.execute(update(User).where(User.id == 4).values(email='new@example.com'))
+
+    seen, cursor, has_more = [], 0, True
+    while has_more:
+        response = client.get(f'/internal/api/users/changes?since={cursor}&limit=3', headers=headers)
+        assert response.status_code == 200
+        seen += [(change['op'], change['user']['id']) for change in response.json['changes']]
+        cursor, has_more = response.json['cursor'], response.json['has_more']
+    assert sorted(seen) == [('create', user_id) for user_id in range(1, 8)] + [('update', 4)]
+    assert seen.index(('create', 4)) < seen.index(('update', 4))
+
+    response = client.get(f'/internal/api/users/changes?since={cursor}&wait=0.1', headers=headers)
+    assert response.json == {'changes': [], 'cursor': cursor, 'has_more': False}
+    user_repository.create_user('late', 'late@example.com', 'password123')
+    changes = client.get(f'/internal/api/users/changes?since={cursor}', headers=headers).json['changes']
+    assert [change['user']['username'] for change in changes] == ['late']
+
+    # A single-database cursor or a token from another shard count is rejected
+    for since in ('7', '1.2', 'x'):
+        assert client.get(f'/internal/api/users/changes?since={since}', headers=headers).status_code == 400
+
+
+def test_workers_drop_cache_entries_for_rows_written_elsewhere(shards):
+    """Test a worker's cached miss is dropped once another worker's create reaches the change log"""
+    from services.service_a.src.cache import TTLCache
+    hasher = SyncHasher('pbkdf2:sha256:1000')
+    worker = ShardedUserRepository(shards, hasher=hasher, cache=TTLCache(negative_ttl=60))
+    other = ShardedUserRepository(shards, hasher=hasher)
+    other.create_users(_rows(2))
+    worker.version_tag()
+    assert worker.lookup_user(3) is None
+
+    other.create_users(_rows(2, prefix='late'))
+    worker.version_tag()
+    assert worker.lookup_user(3).username == 'late0'
+    assert worker.id_snapshot() == (4, [(1, 4)])
+
+
+def test_rebalance_to_new_shard_count(shards, user_repository):
+    """Test rebalancing copies every user to the shard its ID maps to under the new count"""
+    user_repository.create_users(_rows(10))
+    shards.dispose()
+
+    assert rebalance_shards(shards.path, 4, source_count=SHARD_COUNT) == 10
+    with pytest.raises(FileExistsError):
+        rebalance_shards(shards.path, 4, source_count=SHARD_COUNT)
+
+    rebalanced = ShardSet(shards.path, 4)
+    try:
+        assert _shard_ids(rebalanced) == [[4, 8], [1, 5, 9], [2, 6, 10], [3, 7]]
+        repository = ShardedUserRepository(rebalanced, hasher=SyncHasher('pbkdf2:sha256:1000'))
+        assert repository.create_user('new', 'new@example.com', 'password123').id == 11
+        assert repository.verify_password(repository.get_user(3), 'password123') is True
+    finally:
+        rebalanced.dispose()
+
+
+def test_rebalance_command_shards_single_database(tmp_path):
+    """Test the CLI moves an unsharded database into shards and builds the directory"""
+    from services.service_a.src.models import UserRepository
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SERVICE_A_SHARDS'] = 0
+    app.config['SERVICE_A_SHARD_DIR'] = str(tmp_path / 'shards')
+    db.init_app(app)
+    register_shard_commands(app, db)
+
+    with app.app_context():
+        db.create_all()
+        UserRepository(db, hasher=SyncHasher('pbkdf2:sha256:1000')).create_users(_rows(5))
+        result = app.test_cli_runner().invoke(args=['rebalance-shards', '--to', '2'])
+        assert result.exit_code == 0, result.output
+        assert 'Copied 5 users into 2 shards' in result.output
+        db.session.remove()
+        db.drop_all()
+
+    shards = ShardSet(str(tmp_path / 'shards'), 2)
+    try:
+        assert _shard_ids(shards) == [[2, 4], [1, 3, 5]]
+        repository = ShardedUserRepository(shards)
+        assert repository.id_snapshot() == (5, [(1, 5)])
+        with pytest.raises(Exception):
+            repository.create_user('user0', 'fresh@example.com', 'password123')
+    finally:
+        shards.dispose()
@@ -0,0 +1,117 @@
+import gzip
+import json
+from services.service_a.src.models import db, UserRepository
+from services.service_a.src.transfer import gzip_stream, register_commands
+
+def _export(user_repository, chunk_size=2):
+    return b''.join(gzip_stream(user_repository.export_users(chunk_size)))
+
+def test_export_users_chunks_by_primary_key(user_repository):
+    """Test every user is exported once across keyset chunks"""
+    user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(5)
+    ])
+    rows = [json.loads(line) for line in gzip.decompress(_export(user_repository)).splitlines()]
+    assert [row['id'] for row in rows] == [1, 2, 3, 4, 5]
+    assert all(row['password_hash'].startswith(('scrypt:', 'pbkdf2:')) for row in rows)
+
+def test_import_users_command_restores_export(app, runner, user_repository, tmp_path):
+    """Test importing an export keeps IDs and hashes and skips existing users"""
+    user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(3)
+    ])
+    backup = tmp_path / 'users.ndjson.gz'
+    backup.write_bytes(_export(user_repository))
+    hashes = {user.id: user.password_hash for user in user_repository.get_users()}
+
+    db.session.execute(db.text("DELETE FROM users WHERE id IN (1, 3)"))
+    db.session.commit()
+    register_commands(app, db)
+    result = runner.invoke(args=['import-users', str(backup), '--chunk-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 users, skipped 1' in result.output
+
+    db.session.expire_all()
+    restored = UserRepository(db).get_users()
+    assert {user.id: user.password_hash for user in restored} == hashes
+    assert restored[0].verify_password('password123')
+
+def test_import_users_reaches_running_repository(app, runner, user_repository, tmp_path):
+    """Test a running repository drops cached misses and adds IDs the import wrote below its sync point"""
+    from services.service_a.src.cache import TTLCache
+    user_repository.create_users([
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123'}
+        for i in range(2)
+    ])
+    backup = tmp_path / 'users.ndjson.gz'
+    backup.write_bytes(_export(user_repository))
+    db.session.execute(db.text("DELETE FROM users WHERE id = 1"))
+    db.session.commit()
+
+    service = UserRepository(db, cache=TTLCache(negative_ttl=60))
+    assert service.id_snapshot() == (2, [(2, 2)])
+    assert service.lookup_user(1) is None
+
+    register_commands(app, db)
+    result = runner.invoke(args=['import-users', str(backup)])
+    assert 'Imported 1 users, skipped 1' in result.output
+
+    assert service.id_snapshot() == (2, [(1, 2)])
+    assert service.lookup_user(1).username == 'user0'
+
+def test_import_users_command_accepts_plain_ndjson(app, runner, tmp_path):
+    """Test uncompressed NDJSON is accepted and malformed input is reported"""
+    register_commands(app, db)
+    source = tmp_path / 'users.ndjson'
+    source.write_text(json.dumps({'id': 7, 'username': 'alice', 'email': 'alice@example.com',
+                                  'password_hash': 'scrypt:x'}) + '\n\n')
+    result = runner.invoke(args=['import-users', str(source)])
+    assert 'Imported 1 users, skipped 0' in result.output
+
+    source.write_text('{"id": 8,\n')
+    result = runner.invoke(args=['import-users', str(source)])
+    assert result.exit_code != 0
+    assert 'Import failed' in result.output
+
+def test_import_users_command_into_shards(tmp_path):
+    """Test a sharded app imports through the directory and serves the rows afterwards"""
+    from services.service_a.src.app import create_app
+    from services.service_a.src.sharding import user_directory
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'users.sqlite'}",
+        'PASSWORD_HASHER': 'sync',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'SERVICE_A_SHARDS': 2,
+        'SERVICE_A_SHARD_DIR': str(tmp_path / 'shards'),
+        'TESTING': True,
+    })
+    shards = app.extensions['user_repository'].shards
+    try:
+        source = tmp_path / 'users.ndjson'
+        source.write_text('\n'.join(json.dumps({'id': user_id, 'username': name, 'email': f'{name}@example.com',
+                                                'password_hash': 'scrypt:x'})
+                                    for user_id, name in ((7, 'alice'), (8, 'bob'), (9, 'alice'))))
+        result = app.test_cli_runner().invoke(args=['import-users', str(source)])
+        assert 'Imported 2 users, skipped 1' in result.output
+
+        client = app.test_client()
+        assert client.get('/api/users/7').json['username'] == 'alice'
+        assert client.get('/api/users/8').json['username'] == 'bob'
+        with shards.directory_engine.connect() as conn:
+            assert conn.execute(user_directory.select().with_only_columns(
+                user_directory.c.user_id, user_directory.c.pending)).all() == [(7, 0), (8, 0)]
+        created = client.post('/api/users', json={
+            'username': 'carol', 'email': 'carol@example.com', 'password': 'password123'})
+        # The directory's ID allocator moved past the imported IDs
+        assert created.status_code == 201 and created.json['id'] > 8
+        assert client.post('/api/users', json={
+            'username': 'alice', 'email': 'other@example.com', 'password': 'password123'}).status_code == 400
+
+        result = app.test_cli_runner().invoke(args=['import-users', str(source)])
+        assert 'Imported 0 users, skipped 3' in result.output
+    finally:
+        shards.dispose()
+        with app.app_context():
+            db.engine.dispose()